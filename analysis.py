@@ -1,136 +1,237 @@
-import streamlit as st
+from concurrent.futures.process import BrokenProcessPool
 import pandas as pd
 import numpy as np
-from utils import calculate_atr
+from metrics import MetricContext, compute_metrics
+from screening import ScreeningIndex
+from parallel import map_shards, configured_workers
+import instrumentation
+import reporting
+
+SUMMARY_COLUMNS = [
+    'Ticker', 'Company Name', 'Sector', 'Price ($)', 'Avg Price ($)', 'Gap ($)',
+    'Gap (%)', 'Volume', 'Avg Volume', 'ATR',
+]
+
+# computes the summary metrics for every ticker at once (no per ticker loop), bars of a ticker
+# are expected in time order like yfinance returns them. company_info is the lookup table from
+# download_index_data, older frames that still carry the company columns on every bar work too.
+# the registered indicators (see metrics.py) are added after the fixed columns, pass metrics to pick
+# which ones (an empty list for none). period_sums carries whole period sums for bars no longer in raw_data,
+# ctx is the MetricContext of raw_data when the caller already built one (see incremental.py)
+def summarise_ohlcv(raw_data, company_info=None, atr_period=14, metrics=None, period_sums=None, ctx=None):
+    # prices may be stored as float32, the maths is done in float64 like before. every grouping below
+    # works on integer ticker codes in sorted ticker order
+    ctx = ctx if ctx is not None else MetricContext(raw_data, period_sums)
+    prices = ctx.prices
+    codes, ticker_names = ctx.codes, ctx.ticker_names
+    bar_count = ctx.bar_count
+    bars_from_end = ctx.bars_from_end
+    prev_close = ctx.get('prev_close')
+
+    # ATR is the mean true range over the last atr_period bars of each ticker
+    atr = ctx.window_mean('true_range', atr_period)
+
+    # tickers with less than 2 bars are skipped since there is no previous close. the rows come out in ticker
+    # order whatever order the bars are in
+    latest_rows = np.flatnonzero((bars_from_end == 0) & (bar_count >= 2))
+    latest_rows = latest_rows[np.argsort(codes[latest_rows], kind='stable')]
+    latest = prices.iloc[latest_rows]
+    latest_codes = codes[latest_rows]
+    tickers = np.asarray(ticker_names, dtype=object)[latest_codes]
+    volume_sum, volume_count = ctx.window_sum('volume')
+
+    summary = pd.DataFrame({'Ticker': tickers})
+    for column in ['Company Name', 'Sector']:
+        if company_info is not None and column in company_info.columns:
+            summary[column] = company_info[column].reindex(tickers).astype(object).fillna('N/A').to_numpy()
+        elif column in raw_data.columns:
+            summary[column] = raw_data[column].to_numpy()[latest_rows]
+        else:
+            summary[column] = 'N/A'
+
+    today_open = latest['Open'].to_numpy()
+    today_close = latest['Close'].to_numpy()
+    today_high = latest['High'].to_numpy()
+    today_low = latest['Low'].to_numpy()
+    prev = prev_close[latest_rows]
+
+    # average price (OHLC average for the latest period)
+    avg_price = (today_open + today_high + today_low + today_close) / 4
+
+    # gap calculations
+    gap_abs = today_open - prev
+    with np.errstate(divide='ignore', invalid='ignore'):
+        gap_pct = np.where(prev != 0, (gap_abs / prev) * 100, 0)
+
+    # simple range in case not enough data for ATR
+    atr_values = np.where(
+        bar_count[latest_rows] >= atr_period,
+        atr[latest_codes],
+        today_high - today_low,
+    )
+
+    summary['Price ($)'] = np.round(today_close, 2)
+    summary['Avg Price ($)'] = np.round(avg_price, 2)
+    summary['Gap ($)'] = np.round(gap_abs, 2)
+    summary['Gap (%)'] = np.round(gap_pct, 2)
+    summary['Volume'] = volume_sum[latest_codes].astype('int64')
+    summary['Avg Volume'] = (volume_sum[latest_codes] / volume_count[latest_codes]).astype('int64')
+    summary['ATR'] = np.round(atr_values, 2)
+
+    metric_values = compute_metrics(ctx, metrics)
+    for name, values in metric_values.items():
+        summary[name] = np.round(values[latest_codes], 2)
+    return summary[SUMMARY_COLUMNS + list(metric_values)]
+
+# summarise_ohlcv over shards of the tickers in worker processes (see parallel.py), rows come out in ticker
+# order. the workers only get the prices and volume, the company columns are filled in here
+def parallel_summarise(raw_data, company_info=None, workers=2, atr_period=14, metrics=None):
+    summary = map_shards(raw_data, summarise_ohlcv, workers, atr_period=atr_period, metrics=metrics)
+    info_columns = [column for column in ['Company Name', 'Sector'] if column in raw_data.columns]
+    if company_info is None and info_columns:
+        company_info = raw_data.drop_duplicates('Ticker', keep='last').set_index('Ticker')[info_columns]
+    if company_info is not None:
+        tickers = summary['Ticker'].to_numpy()
+        for column in ['Company Name', 'Sector']:
+            if column in company_info.columns:
+                summary[column] = company_info[column].reindex(tickers).astype(object).fillna('N/A').to_numpy()
+    return summary
+
+# below this many bars a summary is computed in the calling process even with workers, starting the shards
+# costs more than it saves
+PARALLEL_MIN_ROWS = 500_000
 
 # summarises the raw data retrieved from yfinance by calculating average price, gap, and more.
-def create_summary_data(raw_data):
+# workers > 1 summarises in that many processes (SCREENER_SUMMARY_WORKERS by default), the rows are in ticker
+# order either way
+def create_summary_data(raw_data, company_info=None, workers=None):
     if raw_data is None or raw_data.empty:
         return None
-    
-    summary_results = []
-    grouped = raw_data.groupby('Ticker')
-    
-    progress_bar = st.progress(0)
-    status_text = st.empty()
-    
-    total_tickers = len(grouped) 
-    
-    for idx, (ticker, df) in enumerate(grouped):
-        status_text.text(f"Processing {ticker} ({idx + 1}/{total_tickers})...")
-        progress_bar.progress((idx + 1) / total_tickers)
-        
-        try:
-            df = df.sort_index()
-            if len(df) < 2:
-                continue
-            
-            # get the latest data points
-            latest_data = df.iloc[-1]
-            prev_close = df['Close'].iloc[-2] if len(df) > 1 else df['Close'].iloc[-1]
-            
-            # calculate metrics
-            today_open = latest_data['Open']
-            today_close = latest_data['Close']
-            today_high = latest_data['High']
-            today_low = latest_data['Low']
-            
-            # average price (OHLC average for the latest period)
-            avg_price = (today_open + today_high + today_low + today_close) / 4
-            
-            # gap calculations
-            gap_abs = today_open - prev_close
-            gap_pct = (gap_abs / prev_close) * 100 if prev_close != 0 else 0
-            
-            total_volume = df['Volume'].sum()  
-            avg_volume = df['Volume'].mean()   
-            
-            # ATR calculation
-            if len(df) >= 14:
-                atr = calculate_atr(df).iloc[-1]
-            else:
-                atr = (today_high - today_low)  # simple range in case not enough data for ATR
-            
-            company_name = df['Company Name'].iloc[-1] if 'Company Name' in df.columns else 'N/A'
-            sector = df['Sector'].iloc[-1] if 'Sector' in df.columns else 'N/A'
-
-            
-            summary_results.append({
-                'Ticker': ticker,
-                'Company Name': company_name,
-                'Sector': sector,
-                'Price ($)': round(today_close, 2),
-                'Avg Price ($)': round(avg_price, 2),
-                'Gap ($)': round(gap_abs, 2),
-                'Gap (%)': round(gap_pct, 2),
-                'Volume': int(total_volume),  
-                'Avg Volume': int(avg_volume),      
-                'ATR': round(atr, 2),
-                # 'Data Points': len(df), 
-            })
-            
-        except Exception as e:
-            continue
-    
-    progress_bar.empty()
-    status_text.empty()
-    
-    if summary_results:
-        df_summary = pd.DataFrame(summary_results)
-        
-        st.success(f"Successfully processed {len(df_summary)} stocks")
+
+    workers = configured_workers() if workers is None else workers
+    df_summary = None
+    with instrumentation.stage('summary'):
+        if workers > 1 and len(raw_data) >= PARALLEL_MIN_ROWS:
+            try:
+                df_summary = parallel_summarise(raw_data, company_info, workers)
+            except (BrokenProcessPool, OSError) as e:
+                reporting.warning(f"Parallel summary failed ({e}), summarising in this process")
+        if df_summary is None:
+            df_summary = summarise_ohlcv(raw_data, company_info)
+
+    if not df_summary.empty:
+        reporting.success(f"Successfully processed {len(df_summary)} stocks")
         return df_summary
     else:
-        st.error("No summary data created")
+        reporting.error("No summary data created")
         return None
 
-# applies the chosen filters to the stocks and retrieves those that meet them
+# the filter values the screening interface starts with (also the command line defaults)
+DEFAULT_FILTERS = {
+    'price_min': 0.1,
+    'price_max': 1000.0,
+    'gap_pct_threshold': 0.01,
+    'min_volume': 1000,
+    'min_avg_volume': 1000,
+    'min_atr': 0.01,
+    'selected_sectors': None,
+}
+
+# applies the chosen filters to the stocks and retrieves those that meet them (highest absolute gap first).
+# metric_ranges filters on the registered metric columns too, e.g. {'RSI 14': (None, 30)}. pass the
+# ScreeningIndex of df when screening the same summary repeatedly, otherwise one is built here
 def screen_stocks(df, price_min, price_max, gap_pct_threshold,
-                 min_volume, min_avg_volume, min_atr, selected_sectors=None):
-    
-    df_copy = df.copy()
-    
-    screened = df_copy[
-        (df_copy['Price ($)'] >= price_min) &
-        (df_copy['Price ($)'] <= price_max) &
-        (df_copy['Gap (%)'].abs() >= gap_pct_threshold) &
-        (df_copy['Volume'] >= min_volume) &
-        (df_copy['Avg Volume'] >= min_avg_volume) &
-        (df_copy['ATR'] >= min_atr)
-    ]
+                 min_volume, min_avg_volume, min_atr, selected_sectors=None, metric_ranges=None, index=None):
     
-    # apply sector filter
-    if selected_sectors and len(selected_sectors) > 0:
-        screened = screened[screened['Sector'].isin(selected_sectors)]
-    
-    # sort by absolute gap percentage (highest gaps first)
-    screened_sorted = screened.sort_values(by='Gap (%)', key=abs, ascending=False)
-    return screened_sorted
+    index = index if index is not None else ScreeningIndex(df)
+    return index.screen_frame(
+        price_min, price_max, gap_pct_threshold, min_volume, min_avg_volume, min_atr, selected_sectors,
+        metric_ranges
+    )
+
+# summary columns the anomaly detector scores and its defaults (the screening interface starts with these too)
+ANOMALY_COLUMNS = ['Price ($)', 'Gap (%)', 'Volume', 'ATR']
+ANOMALY_METHODS = ['zscore', 'robust']
+DEFAULT_ANOMALY_THRESHOLD = 2.5
+DEFAULT_ANOMALY_TOP_N = 10
+
+# sectors with fewer stocks than this are scored against the whole market when by_sector is on, a handful
+# of rows gives no usable baseline
+MIN_SECTOR_SIZE = 20
+
+# scale that makes the median absolute deviation estimate the standard deviation of normal data
+MAD_SCALE = 1.4826
+
+# centre and scale of every column (one row of each per stock): mean and sample std for 'zscore', median
+# and scaled MAD for 'robust', which the heavy tails of volume and price barely move
+def _baseline(values, method, codes=None):
+    if codes is None:
+        if method == 'robust':
+            center = np.nanmedian(values, axis=0)
+            scale = np.nanmedian(np.abs(values - center), axis=0) * MAD_SCALE
+        else:
+            center = np.nanmean(values, axis=0)
+            scale = np.nanstd(values, axis=0, ddof=1)
+        return np.broadcast_to(center, values.shape), np.broadcast_to(scale, values.shape)
+
+    # per group baselines, every row gets its group's centre and scale
+    grouped = pd.DataFrame(values).groupby(codes)
+    if method == 'robust':
+        center = grouped.transform('median').to_numpy()
+        deviation = pd.DataFrame(np.abs(values - center)).groupby(codes)
+        scale = deviation.transform('median').to_numpy() * MAD_SCALE
+    else:
+        center = grouped.transform('mean').to_numpy()
+        scale = grouped.transform('std').to_numpy()
+    return center, scale
+
+# absolute z-scores of every stock (rows) in every column, NaN where a column has no spread to measure against
+def anomaly_scores(df, columns=None, method='zscore', by_sector=False):
+    if method not in ANOMALY_METHODS:
+        raise ValueError(f"Unknown anomaly method {method!r}, expected one of {ANOMALY_METHODS}")
+    columns = [column for column in (columns or ANOMALY_COLUMNS) if column in df.columns]
+    values = df[columns].to_numpy(dtype='float64')
+    center, scale = _baseline(values, method)
 
-# detects stocks with abnormally high price, gap, volume and atr in comparison to others stocks in that column
-def detect_anomalies(df):
-    if df.empty:
+    if by_sector and 'Sector' in df.columns:
+        sector_codes, _ = pd.factorize(df['Sector'].astype(object))
+        sector_size = np.bincount(sector_codes[sector_codes >= 0])
+        in_large_sector = (sector_codes >= 0) & (sector_size[sector_codes] >= MIN_SECTOR_SIZE)
+        if in_large_sector.any():
+            sector_center, sector_scale = _baseline(values, method, sector_codes)
+            center = np.where(in_large_sector[:, None], sector_center, center)
+            scale = np.where(in_large_sector[:, None], sector_scale, scale)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scores = np.abs(values - center) / scale
+    scores[~(scale > 0)] = np.nan
+    return pd.DataFrame(scores, index=df.index, columns=columns)
+
+# detects stocks with abnormally high (or low) price, gap, volume and atr compared to the other stocks, or
+# to the other stocks of their sector with by_sector. every column is scored in one pass (see anomaly_scores),
+# each stock is reported once under the column it stands out most in, the top_n highest scores above
+# threshold first. returns None when nothing stands out
+def detect_anomalies(df, threshold=DEFAULT_ANOMALY_THRESHOLD, top_n=DEFAULT_ANOMALY_TOP_N, method='zscore',
+                     by_sector=False, columns=None):
+    if df is None or df.empty:
         return None
-    
-    anomalies = []
-    
-    # z-score based anomaly detection
-    for column in ['Price ($)', 'Gap (%)', 'Volume', 'ATR']:
-        if column in df.columns:
-            z_scores = np.abs((df[column] - df[column].mean()) / df[column].std())
-            anomaly_mask = z_scores > 2.5  #  more than 2.5 standard deviations
-            
-            for idx in df[anomaly_mask].index:
-                anomalies.append({
-                    'Ticker': df.loc[idx, 'Ticker'],
-                    'Anomaly Type': f'{column}',
-                    'Value': df.loc[idx, column],
-                    'Z Score': z_scores.loc[idx],
-                })
-    
-    if anomalies:
-        anomaly_df = pd.DataFrame(anomalies)
-        anomaly_df = anomaly_df.sort_values('Z Score', ascending=False).drop_duplicates('Ticker')
-        return anomaly_df.head(10)  #
-    
-    return None
+
+    scores = anomaly_scores(df, columns, method, by_sector)
+    score_values = scores.to_numpy()
+    filled = np.where(np.isnan(score_values), -np.inf, score_values)
+    strongest = filled.argmax(axis=1)
+    best = filled[np.arange(len(filled)), strongest]
+
+    rows = np.flatnonzero(best > threshold)
+    if len(rows) == 0:
+        return None
+    rows = rows[np.argsort(-best[rows], kind='stable')][:top_n]
+    column_of_row = strongest[rows]
+
+    anomaly_columns = np.asarray(scores.columns, dtype=object)
+    return pd.DataFrame({
+        'Ticker': df['Ticker'].to_numpy()[rows],
+        'Anomaly Type': anomaly_columns[column_of_row],
+        'Value': df[list(scores.columns)].to_numpy()[rows, column_of_row],
+        'Z Score': best[rows],
+    })
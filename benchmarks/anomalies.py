@@ -0,0 +1,60 @@
+import argparse
+import numpy as np
+import pandas as pd
+from benchmarks.common import make_raw_data, best_of, quiet_streamlit
+from analysis import summarise_ohlcv, detect_anomalies, anomaly_scores, DEFAULT_ANOMALY_THRESHOLD
+
+SECTORS = ['Technology', 'Energy', 'Healthcare', 'Financials', 'Utilities', 'Industrials', 'Materials', 'N/A']
+
+# the detector before the z-score matrix: a pass per column, then a dict per flagged row
+def legacy_detect_anomalies(df):
+    anomalies = []
+    for column in ['Price ($)', 'Gap (%)', 'Volume', 'ATR']:
+        if column in df.columns:
+            z_scores = np.abs((df[column] - df[column].mean()) / df[column].std())
+            anomaly_mask = z_scores > 2.5
+            for idx in df[anomaly_mask].index:
+                anomalies.append({
+                    'Ticker': df.loc[idx, 'Ticker'],
+                    'Anomaly Type': f'{column}',
+                    'Value': df.loc[idx, column],
+                    'Z Score': z_scores.loc[idx],
+                })
+    if anomalies:
+        anomaly_df = pd.DataFrame(anomalies)
+        anomaly_df = anomaly_df.sort_values('Z Score', ascending=False).drop_duplicates('Ticker')
+        return anomaly_df.head(10)
+    return None
+
+def main():
+    parser = argparse.ArgumentParser(description="Legacy anomaly loop vs the vectorised detector and its modes")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 50000])
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+    quiet_streamlit()
+
+    modes = {
+        'z-score': dict(),
+        'robust': dict(method='robust'),
+        'z-score/sector': dict(by_sector=True),
+        'robust/sector': dict(method='robust', by_sector=True),
+    }
+    for n_tickers in args.sizes:
+        summary = summarise_ohlcv(make_raw_data(n_tickers, 30))
+        summary['Sector'] = np.random.default_rng(0).choice(SECTORS, len(summary))
+        legacy_time, expected = best_of(lambda: legacy_detect_anomalies(summary), args.repeat)
+        print(f"{n_tickers} tickers, legacy loop {legacy_time * 1000:.2f} ms")
+        print(f"  {'mode':<16} {'time (ms)':>10} {'speedup':>8} {'flagged':>8}")
+        for name, options in modes.items():
+            elapsed, anomalies = best_of(lambda: detect_anomalies(summary, **options), args.repeat)
+            if not options:
+                # same tickers, types and scores as the loop it replaces
+                assert list(anomalies['Ticker']) == list(expected['Ticker'])
+                assert list(anomalies['Anomaly Type']) == list(expected['Anomaly Type'])
+                assert np.allclose(anomalies['Z Score'], expected['Z Score'])
+            # stocks above the threshold before the top 10 cut
+            flagged = int((anomaly_scores(summary, **options).max(axis=1) > DEFAULT_ANOMALY_THRESHOLD).sum())
+            print(f"  {name:<16} {elapsed * 1000:>10.2f} {legacy_time / elapsed:>7.1f}x {flagged:>8}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+# benchmarks are run from the repo root (python -m benchmarks.<name>), make the app modules importable
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SECTORS = [
+    'Technology', 'Healthcare', 'Financial Services', 'Industrials', 'Consumer Cyclical',
+    'Energy', 'Utilities', 'Real Estate', 'Basic Materials', 'Communication Services',
+]
+
+# builds a long OHLCV frame shaped like the one download_index_data returns, using a random walk per ticker
+def make_raw_data(n_tickers, n_bars=20, seed=0):
+    rng = np.random.default_rng(seed)
+    tickers = np.array([f"T{i:05d}" for i in range(n_tickers)])
+
+    # a few tickers get short histories to exercise the < 2 and < 14 bar paths
+    lengths = np.full(n_tickers, n_bars)
+    lengths[::50] = 1
+    lengths[1::50] = max(2, n_bars // 3)
+
+    start_price = rng.uniform(1, 500, n_tickers)
+    total = lengths.sum()
+    returns = rng.normal(0, 0.02, total)
+    owner = np.repeat(np.arange(n_tickers), lengths)
+    close = start_price[owner] * np.exp(pd.Series(returns).groupby(owner).cumsum().to_numpy())
+    open_ = close * (1 + rng.normal(0, 0.01, total))
+    high = np.maximum(open_, close) * (1 + rng.uniform(0, 0.02, total))
+    low = np.minimum(open_, close) * (1 - rng.uniform(0, 0.02, total))
+
+    # yahoo serves prices with float32 precision
+    open_, high, low, close = (prices.astype('float32').astype('float64') for prices in (open_, high, low, close))
+
+    raw_data = pd.DataFrame({
+        'Open': open_,
+        'High': high,
+        'Low': low,
+        'Close': close,
+        'Adj Close': close,
+        'Volume': rng.integers(1_000, 5_000_000, total).astype('float64'),
+        'Ticker': tickers[owner],
+        'Company Name': np.char.add('Company ', tickers[owner]).astype(object),
+        'Sector': np.array(SECTORS, dtype=object)[owner % len(SECTORS)],
+    })
+
+    # python string columns like yfinance + pandas 2 produce (newer pandas would infer a string dtype)
+    for column in ['Ticker', 'Company Name', 'Sector']:
+        raw_data[column] = raw_data[column].astype(object)
+    return raw_data
+
+# runs fn a few times and returns the best wall time in seconds along with the last result
+def best_of(fn, repeat=3):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+# peak RSS per stage, see instrumentation.py
+from instrumentation import reset_peak_rss, peak_rss_mb
+
+# runs fn once and returns its result with the wall time and peak RSS of the call
+def measure(fn):
+    reset_peak_rss()
+    started = time.perf_counter()
+    result = fn()
+    return result, {'wall_s': round(time.perf_counter() - started, 6), 'peak_rss_mb': round(peak_rss_mb(), 1)}
+
+# the app functions call streamlit outside of a session here, which logs a "missing ScriptRunContext" warning per call
+# (streamlit re-applies its logger.level option when the config is first read, so that is done first)
+def quiet_streamlit():
+    from streamlit import config as streamlit_config, logger as streamlit_logger
+    streamlit_config.get_config_options()
+    streamlit_logger.set_log_level('error')
@@ -0,0 +1,60 @@
+import argparse
+import tempfile
+import time
+import pandas as pd
+from benchmarks.common import make_raw_data, best_of, quiet_streamlit
+from analysis import summarise_ohlcv
+from data_store import DataStore
+from screening import ScreeningIndex
+from utils import compact_ohlcv, memory_footprint, format_bytes
+
+# datasets like a load of the given size: compact raw bars and their summary
+def make_dataset(n_tickers, n_bars, seed):
+    raw_data = make_raw_data(n_tickers, n_bars, seed)
+    raw_data['Date'] = pd.Timestamp('2026-01-02') + pd.to_timedelta(raw_data.groupby('Ticker').cumcount(), 'h')
+    raw_data = compact_ohlcv(raw_data[['Ticker', 'Date', 'Open', 'High', 'Low', 'Close', 'Adj Close', 'Volume']])
+    return {'raw_data': raw_data, 'summary': summarise_ohlcv(raw_data)}
+
+def main():
+    parser = argparse.ArgumentParser(description="Session data held per session vs in the data store with a budget")
+    parser.add_argument('--tickers', type=int, default=7000)
+    parser.add_argument('--bars', type=int, default=130)
+    parser.add_argument('--sessions', type=int, default=8)
+    parser.add_argument('--universes', type=int, default=3, help="distinct loads among the sessions")
+    parser.add_argument('--budget-mb', type=int, default=64)
+    args = parser.parse_args()
+    quiet_streamlit()
+
+    datasets = [make_dataset(args.tickers, args.bars, seed) for seed in range(args.universes)]
+    dataset_bytes = [sum(memory_footprint(frame) for frame in dataset.values()) for dataset in datasets]
+    # before: every session holds its own frames (a refresh or an expired shared result gives it a copy of its
+    # own) plus a filtered copy of the summary
+    summary = datasets[0]['summary']
+    index = ScreeningIndex(summary)
+    rows = index.screen(0, 1e9, 0.5, 0, 0, 0)
+    per_session = sum(dataset_bytes) / args.universes + memory_footprint(summary.iloc[rows])
+    print(f"{args.sessions} sessions over {args.universes} loads of {args.tickers} tickers x {args.bars} bars")
+    print(f"  frames per session: {format_bytes(per_session * args.sessions)} in total")
+
+    store = DataStore(max_bytes=args.budget_mb * 1024 * 1024, spill_dir=tempfile.mkdtemp())
+    started = time.perf_counter()
+    for session in range(args.sessions):
+        key = store.put(('load', session % args.universes), datasets[session % args.universes], label=str(session % args.universes))
+        store.attach(session, key)
+    put_time = time.perf_counter() - started
+    stats = store.stats()
+    print(f"  data store ({args.budget_mb} MB budget): {format_bytes(stats['memory_bytes'])} in memory, "
+          f"{format_bytes(stats['disk_bytes'])} spilled, {stats['spills']} spills in {put_time * 1000:.0f} ms")
+    print(f"  filtered rows kept as positions: {format_bytes(rows.nbytes)} instead of {format_bytes(memory_footprint(summary.iloc[rows]))}")
+
+    # a session coming back to a spilled dataset
+    spilled = next((('load', int(row['Dataset'])) for row in store.status() if row['Where'] == 'disk'), None)
+    if spilled is None:
+        print("  nothing spilled (budget not exceeded), pass a smaller --budget-mb to time a reload")
+        return
+    reload_time, _ = best_of(lambda: store.get(spilled, 'raw_data'), 1)
+    hit_time, _ = best_of(lambda: store.get(spilled, 'raw_data'), 5)
+    print(f"  reload of a spilled dataset: {reload_time * 1000:.0f} ms, in memory: {hit_time * 1000:.3f} ms")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+import argparse
+import os
+import threading
+import time
+import pandas as pd
+from benchmarks.common import make_raw_data
+from download_scheduler import AIMDRateLimiter, RateLimitError, run_batches
+from utils import get_batches
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# stands in for yahoo: each batch takes a fixed latency plus a per ticker cost, and the "server" only
+# accepts so many batches per second (a token bucket), everything above that gets a RateLimitError
+class FakeProvider:
+    def __init__(self, base_latency, per_ticker_latency, allowed_per_second, burst=3):
+        self.base_latency = base_latency
+        self.per_ticker_latency = per_ticker_latency
+        self.allowed_per_second = allowed_per_second
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.rejected = 0
+
+    def fetch(self, batch):
+        with self._lock:
+            self.requests += 1
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.allowed_per_second)
+            self._updated = now
+            throttled = self._tokens < 1
+            if throttled:
+                self.rejected += 1
+            else:
+                self._tokens -= 1
+        if throttled:
+            time.sleep(self.base_latency / 4)
+            raise RateLimitError("Too Many Requests")
+        time.sleep(self.base_latency + self.per_ticker_latency * len(batch))
+        return make_raw_data(len(batch), 5)
+
+# the loop download_index_data used before: one batch at a time with a fixed 1s pause, throttled batches are lost
+def sequential(batches, provider, pause):
+    lost = 0
+    for batch in batches:
+        try:
+            provider.fetch(batch)
+        except RateLimitError:
+            lost += 1
+        time.sleep(pause)
+    return lost
+
+def concurrent(batches, provider, max_workers, limiter):
+    lost = 0
+    for _, _, error in run_batches(batches, provider.fetch, max_workers=max_workers, limiter=limiter):
+        lost += error is not None
+    return lost
+
+def main():
+    parser = argparse.ArgumentParser(description="Sequential vs concurrent batch download against a fake provider")
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[500, 250, 100])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--base-latency', type=float, default=1.5, help="seconds per request")
+    parser.add_argument('--per-ticker-latency', type=float, default=0.002, help="seconds per ticker in a request")
+    parser.add_argument('--allowed-per-second', type=float, default=2.0, help="requests/sec the fake provider accepts")
+    parser.add_argument('--time-scale', type=float, default=0.2, help="shrinks every latency and pause to keep the run short")
+    args = parser.parse_args()
+
+    tickers = pd.read_csv(os.path.join(REPO_DIR, 'nasdaq_tickers.csv'))['Symbol'].dropna().tolist()
+    scale = args.time_scale
+
+    def provider():
+        return FakeProvider(args.base_latency * scale, args.per_ticker_latency * scale, args.allowed_per_second / scale)
+
+    print(f"{len(tickers)} NASDAQ tickers, times scaled by {scale} (divide by it for real seconds)")
+    print(f"{'mode':<28} {'batch':>6} {'time (s)':>9} {'requests':>9} {'throttled':>10} {'lost':>5}")
+
+    baseline = provider()
+    started = time.perf_counter()
+    lost = sequential(list(get_batches(tickers, 500)), baseline, pause=1.0 * scale)
+    print(f"{'sequential + sleep(1)':<28} {500:>6} {time.perf_counter() - started:>9.2f} "
+          f"{baseline.requests:>9} {baseline.rejected:>10} {lost:>5}")
+
+    for batch_size in args.batch_sizes:
+        batches = list(get_batches(tickers, batch_size))
+        for workers in args.workers:
+            fake = provider()
+            limiter = AIMDRateLimiter(rate=1.0 / scale, max_rate=8.0 / scale, increase=0.25 / scale, cooldown=2.0 * scale)
+            started = time.perf_counter()
+            lost = concurrent(batches, fake, workers, limiter)
+            print(f"{f'concurrent, {workers} workers':<28} {batch_size:>6} {time.perf_counter() - started:>9.2f} "
+                  f"{fake.requests:>9} {fake.rejected:>10} {lost:>5}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+import argparse
+import io
+import tracemalloc
+import pandas as pd
+from benchmarks.common import make_raw_data, best_of, quiet_streamlit
+from analysis import summarise_ohlcv
+from export import EXPORT_FORMATS, ExportCache, export_raw_bars, iter_raw_bar_chunks
+from utils import compact_ohlcv
+
+# time of one call and the peak python allocations (tracemalloc, numpy and pandas buffers included) of a second
+# one, tracing slows the call down too much to time it
+def traced(fn):
+    elapsed, result = best_of(fn, 1)
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak / 1024 / 1024, result
+
+# the raw bars export without chunks: select every bar, then convert it in one go
+def whole_raw_bars(raw_data, tickers, file_format):
+    bars = raw_data[raw_data['Ticker'].isin(tickers)]
+    if file_format == 'csv':
+        return bars.to_csv(index=False).encode()
+    buffer = io.BytesIO()
+    bars.to_parquet(buffer, index=False)
+    return buffer.getvalue()
+
+def main():
+    parser = argparse.ArgumentParser(description="Export per rerun vs on demand and cached, raw bars whole vs chunked")
+    parser.add_argument('--tickers', type=int, default=7000)
+    parser.add_argument('--bars', type=int, default=130)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    quiet_streamlit()
+
+    raw_data = make_raw_data(args.tickers, args.bars)
+    raw_data['Date'] = pd.Timestamp('2026-01-02') + pd.to_timedelta(raw_data.groupby('Ticker').cumcount(), 'D')
+    raw_data = compact_ohlcv(raw_data[['Ticker', 'Date', 'Open', 'High', 'Low', 'Close', 'Adj Close', 'Volume']])
+    summary = summarise_ohlcv(raw_data)
+
+    # what every rerun of the screening page paid before the export was built on demand
+    rerun_time, _ = best_of(lambda: summary.to_csv(index=False), args.repeat)
+    print(f"{len(summary)} screened stocks, CSV built on every rerun: {rerun_time * 1000:.1f} ms per rerun (now 0)")
+    print(f"  {'format':<8} {'first click (ms)':>17} {'cached (ms)':>12} {'size (KB)':>10}")
+    for file_format in EXPORT_FORMATS:
+        cache = ExportCache()
+        first_time, data = best_of(lambda: cache.frame(summary, file_format, '1d'), 1)
+        cached_time, _ = best_of(lambda: cache.frame(summary, file_format, '1d'), args.repeat)
+        print(f"  {file_format:<8} {first_time * 1000:>17.1f} {cached_time * 1000:>12.1f} {len(data) / 1024:>10.0f}")
+
+    tickers = list(summary['Ticker'])
+    print(f"raw bars of {len(tickers)} stocks ({len(raw_data):,} bars)")
+    print(f"  {'format':<8} {'whole (ms)':>11} {'peak (MB)':>10} {'chunked (ms)':>13} {'peak (MB)':>10} {'size (MB)':>10}")
+    for file_format in ['parquet', 'csv']:
+        whole_time, whole_peak, _ = traced(lambda: whole_raw_bars(raw_data, tickers, file_format))
+        chunked_time, chunked_peak, data = traced(
+            lambda: export_raw_bars(iter_raw_bar_chunks(tickers, raw_data), file_format)
+        )
+        print(f"  {file_format:<8} {whole_time * 1000:>11.0f} {whole_peak:>10.1f} {chunked_time * 1000:>13.0f} "
+              f"{chunked_peak:>10.1f} {len(data) / 1024 / 1024:>10.1f}")
+
+if __name__ == '__main__':
+    main()
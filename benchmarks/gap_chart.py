@@ -0,0 +1,29 @@
+import argparse
+from benchmarks.common import make_raw_data, best_of, quiet_streamlit
+from analysis import summarise_ohlcv
+from visuals import create_gap_chart, gap_chart_mode, GAP_CHART_MODES
+
+# size of the figure the browser gets and what it has to draw: the JSON payload, and the points (bars or
+# markers) over all traces. building and serialising the figure is the server side part of the render time,
+# the browser side grows with the payload and the points
+def points(fig):
+    return sum(len(trace.y) for trace in fig.data)
+
+def main():
+    parser = argparse.ArgumentParser(description="Gap chart build time and payload, one bar per stock vs the other modes")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 7000, 50000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    quiet_streamlit()
+
+    for n_tickers in args.sizes:
+        summary = summarise_ohlcv(make_raw_data(n_tickers, 5))
+        print(f"{n_tickers} tickers (auto picks {gap_chart_mode(len(summary))})")
+        print(f"  {'mode':<10} {'build+json (ms)':>16} {'payload (KB)':>13} {'points':>8}")
+        for mode in GAP_CHART_MODES:
+            elapsed, payload = best_of(lambda: create_gap_chart(summary, "All Stocks", mode).to_json(), args.repeat)
+            fig = create_gap_chart(summary, "All Stocks", mode)
+            print(f"  {mode:<10} {elapsed * 1000:>16.1f} {len(payload) / 1024:>13.1f} {points(fig):>8}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+import argparse
+import pandas as pd
+from benchmarks.common import make_raw_data, best_of
+from analysis import summarise_ohlcv
+from incremental import SummaryState, merge_summary_rows, append_bars
+from utils import compact_ohlcv
+
+# raw bars with 15 minute timestamps, the newest `held_back` bars of every ticker split off as the next fetch.
+# the bar before those comes back revised too, like a bar that was still forming when it was first fetched
+def split_bars(n_tickers, n_bars, held_back):
+    raw_data = make_raw_data(n_tickers, n_bars).drop(columns=['Company Name', 'Sector'])
+    bars_in = raw_data.groupby('Ticker').cumcount()
+    raw_data['Date'] = pd.Timestamp('2026-01-05 14:30') + pd.to_timedelta(bars_in * 15, unit='min')
+    bars_from_end = raw_data.groupby('Ticker').cumcount(ascending=False)
+    loaded = compact_ohlcv(raw_data[bars_from_end >= held_back].reset_index(drop=True))
+    new_bars = raw_data[bars_from_end <= held_back].reset_index(drop=True)
+    return loaded, new_bars
+
+def main():
+    parser = argparse.ArgumentParser(description="Full re-summary vs incremental summary update after new bars")
+    parser.add_argument('--tickers', type=int, default=7000)
+    parser.add_argument('--bars', type=int, default=130)
+    parser.add_argument('--new-bars', type=int, nargs='+', default=[1, 4])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    for held_back in args.new_bars:
+        loaded, new_bars = split_bars(args.tickers, args.bars, held_back)
+        summary = summarise_ohlcv(loaded)
+        build_time, _ = best_of(lambda: SummaryState.from_bars(loaded), args.repeat)
+
+        # what a refresh used to cost: the bars appended and the whole summary computed again
+        full_time, expected = best_of(lambda: summarise_ohlcv(append_bars(loaded, new_bars)), args.repeat)
+        appended = append_bars(loaded, new_bars)
+        summary_time, _ = best_of(lambda: summarise_ohlcv(appended), args.repeat)
+
+        def incremental():
+            state = SummaryState.from_bars(loaded)
+            started = pd.Timestamp.now()
+            rows, _ = state.update(new_bars)
+            merged = merge_summary_rows(summary, rows)
+            return (pd.Timestamp.now() - started).total_seconds(), merged
+        update_time, updated = min((incremental() for _ in range(args.repeat)), key=lambda result: result[0])
+
+        pd.testing.assert_frame_equal(
+            updated.sort_values('Ticker').reset_index(drop=True),
+            expected.sort_values('Ticker').reset_index(drop=True),
+            check_dtype=False
+        )
+        print(f"{args.tickers} tickers x {args.bars} bars, {held_back} new bar(s) per ticker ({len(new_bars):,} rows incl. revised)")
+        print(f"  full append + summary {full_time * 1000:8.1f} ms (summary alone {summary_time * 1000:.1f} ms)")
+        print(f"  incremental update    {update_time * 1000:8.1f} ms ({full_time / update_time:.1f}x), state built once in {build_time * 1000:.1f} ms")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+import argparse
+import shutil
+import tempfile
+import time
+import ohlcv_cache
+from benchmarks.common import best_of, quiet_streamlit
+from benchmarks.stages import UNIVERSES
+from benchmarks.streaming import batch_load
+from instrumentation import LoadMetrics, MetricsRegistry, record_load, get_metrics_registry
+from providers import SyntheticProvider, set_provider
+
+# what the instrumentation costs: one stage on its own (time and RSS reads, the peak reset) and a whole load
+# recorded vs not, then where the recorded load spent its time
+def main():
+    parser = argparse.ArgumentParser(description="Overhead of the load instrumentation and the stage breakdown of a load")
+    parser.add_argument('--universe', default='NASDAQ', choices=list(UNIVERSES))
+    parser.add_argument('--period', default='5d')
+    parser.add_argument('--interval', default='1h')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    set_provider(SyntheticProvider(seed=0))
+    quiet_streamlit()
+    get_metrics_registry().path = None
+
+    metrics = LoadMetrics('benchmark')
+    calls = 10_000
+    started = time.perf_counter()
+    for _ in range(calls):
+        with metrics.stage('empty'):
+            pass
+    print(f"one stage: {(time.perf_counter() - started) / calls * 1e6:.1f} us")
+
+    indices = UNIVERSES[args.universe]
+    ohlcv_cache.CACHE_DIR = tempfile.mkdtemp()
+    batch_load(indices, args.period, args.interval, True)
+    warm_cache = ohlcv_cache.CACHE_DIR
+
+    def recorded():
+        with record_load('load', log=False) as load:
+            batch_load(indices, args.period, args.interval, True)
+        return load
+
+    plain, _ = best_of(lambda: batch_load(indices, args.period, args.interval, True), args.repeat)
+    instrumented, _ = best_of(recorded, args.repeat)
+    print(f"{args.universe} {args.period}/{args.interval} load from a warm cache: {plain:.3f} s plain, "
+          f"{instrumented:.3f} s recorded ({(instrumented / plain - 1) * 100:+.1f}%)")
+
+    shutil.rmtree(warm_cache)
+
+    # the breakdown of a cold load, every ticker downloaded
+    ohlcv_cache.CACHE_DIR = tempfile.mkdtemp()
+    load = recorded()
+    record = load.as_dict()
+    print(f"cold load: {record['wall_s']:.3f} s (stage times summed over the batches running at once)")
+    print(f"  {'stage':<12} {'wall (s)':>9} {'calls':>6} {'peak RSS (MB)':>14}")
+    for name, stage in record['stages'].items():
+        print(f"  {name:<12} {stage['wall_s']:>9.3f} {stage['calls']:>6} {stage['peak_rss_mb']:>14.1f}")
+    print(f"  counters: {record['counters']}")
+
+    shutil.rmtree(ohlcv_cache.CACHE_DIR)
+
+    registry = MetricsRegistry(path=None)
+    registry.add(load)
+    print(f"metrics file: {len(registry.prometheus_text())} bytes")
+
+if __name__ == '__main__':
+    main()
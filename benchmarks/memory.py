@@ -0,0 +1,36 @@
+import argparse
+import pandas as pd
+from benchmarks.common import make_raw_data
+from analysis import summarise_ohlcv
+from utils import compact_ohlcv, create_company_info_table, memory_footprint, format_bytes
+
+# memory held per session for the combined OHLCV frame: old layout (float64 + company strings on
+# every bar) vs the compact layout (categorical ticker, float32/uint OHLCV, separate company table)
+def main():
+    parser = argparse.ArgumentParser(description="Memory footprint of the combined OHLCV frame")
+    parser.add_argument('--tickers', type=int, default=7_300, help="NYSE + NASDAQ is about 7,300 tickers")
+    parser.add_argument('--bars', type=int, default=150, help="15m bars over 1mo is about 570")
+    args = parser.parse_args()
+
+    legacy = make_raw_data(args.tickers, args.bars)
+    info = legacy.drop_duplicates('Ticker').set_index('Ticker')
+    company_info = create_company_info_table(info[['Company Name', 'Sector']].to_dict('index'))
+    compact = compact_ohlcv(legacy.drop(columns=['Company Name', 'Sector']))
+
+    # the summary must not change because of the smaller dtypes
+    pd.testing.assert_frame_equal(summarise_ohlcv(compact, company_info), summarise_ohlcv(legacy), check_dtype=False)
+
+    # deep counts every python string, shallow only the object pointers (strings shared between rows)
+    before_deep = memory_footprint(legacy)
+    before_shallow = int(legacy.memory_usage(deep=False).sum())
+    after = memory_footprint(compact) + memory_footprint(company_info)
+
+    print(f"rows: {len(legacy):,} ({args.tickers:,} tickers x {args.bars} bars)")
+    print(f"dtypes after: {dict(compact.dtypes.astype(str))}")
+    print(f"before (deep):    {format_bytes(before_deep):>10}")
+    print(f"before (shallow): {format_bytes(before_shallow):>10}")
+    print(f"after:            {format_bytes(after):>10}")
+    print(f"reduction: {before_deep / after:.1f}x deep, {before_shallow / after:.1f}x shallow")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,28 @@
+import argparse
+from benchmarks.common import make_raw_data, best_of
+from analysis import summarise_ohlcv
+from metrics import METRICS
+
+def main():
+    parser = argparse.ArgumentParser(description="Cost of each registered metric on top of the base summary")
+    parser.add_argument('--tickers', type=int, default=10_000)
+    parser.add_argument('--bars', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    raw_data = make_raw_data(args.tickers, args.bars)
+    base_time, _ = best_of(lambda: summarise_ohlcv(raw_data, metrics=[]), args.repeat)
+    print(f"{args.tickers} tickers x {args.bars} bars ({len(raw_data):,} rows), base summary {base_time * 1000:.1f} ms")
+    print(f"{'metric':<12} {'inputs':<34} {'window':>6} {'alone (ms)':>11} {'extra (ms)':>11}")
+    for name, metric in METRICS.items():
+        alone_time, _ = best_of(lambda: summarise_ohlcv(raw_data, metrics=[name]), args.repeat)
+        print(f"{name:<12} {', '.join(metric.inputs):<34} {str(metric.window):>6} "
+              f"{alone_time * 1000:>11.1f} {(alone_time - base_time) * 1000:>11.1f}")
+
+    # intermediates and window sums are shared, so all of them together cost less than the sum of the extras
+    all_time, _ = best_of(lambda: summarise_ohlcv(raw_data), args.repeat)
+    print(f"all {len(METRICS)} metrics {all_time * 1000:.1f} ms, "
+          f"{(all_time - base_time) * 1000 / len(METRICS):.1f} ms extra per metric")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+import argparse
+import numpy as np
+import pandas as pd
+from benchmarks.common import make_raw_data, best_of
+from data_loader import extract_ticker_frames
+from metrics import MetricContext
+from panel import PricePanel
+from providers import bars_to_bulk
+from utils import compact_ohlcv
+
+# the long frame work the panel replaces: groupby shift for the previous close, groupby rolling for the ATR
+def long_rolling_atr(raw_data, period):
+    ctx = MetricContext(raw_data)
+    true_range = pd.Series(ctx.get('true_range'))
+    return true_range.groupby(ctx.codes).rolling(period).mean().to_numpy()
+
+def long_gaps(raw_data):
+    ctx = MetricContext(raw_data)
+    is_latest = ctx.bars_from_end == 0
+    prev_close = ctx.get('prev_close')[is_latest]
+    return ctx.prices['Open'].to_numpy()[is_latest] - prev_close
+
+def main():
+    parser = argparse.ArgumentParser(description="Long frame groupby vs PricePanel array operations")
+    parser.add_argument('--tickers', type=int, default=7000)
+    parser.add_argument('--bars', type=int, default=130)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    raw_data = make_raw_data(args.tickers, args.bars).drop(columns=['Company Name', 'Sector'])
+    raw_data['Date'] = pd.Timestamp('2026-01-05 14:30') + pd.to_timedelta(raw_data.groupby('Ticker').cumcount() * 15, unit='min')
+    raw_data = compact_ohlcv(raw_data)
+    bulk = bars_to_bulk(raw_data.astype({'Ticker': object}))
+    tickers = list(raw_data['Ticker'].cat.categories)
+
+    print(f"{args.tickers} tickers x {args.bars} bars ({len(raw_data):,} rows)")
+    print(f"  {'step':<26} {'long (ms)':>10} {'panel (ms)':>11} {'speedup':>8}")
+
+    def row(name, long_fn, panel_fn):
+        long_time, long_result = best_of(long_fn, args.repeat)
+        panel_time, panel_result = best_of(panel_fn, args.repeat)
+        print(f"  {name:<26} {long_time * 1000:>10.1f} {panel_time * 1000:>11.1f} {long_time / panel_time:>7.1f}x")
+        return long_result, panel_result
+
+    # download batch -> analysis layout: one frame per ticker concatenated vs one reshape
+    row('bulk batch -> layout',
+        lambda: pd.concat(extract_ticker_frames(bulk, tickers), ignore_index=True),
+        lambda: PricePanel.from_bulk(bulk, tickers))
+
+    # converting for the code that still wants the long frame
+    from_long_time, panel = best_of(lambda: PricePanel.from_long(raw_data), args.repeat)
+    to_long_time, back = best_of(panel.to_long, args.repeat)
+    assert np.array_equal(back['Close'].to_numpy(), raw_data['Close'].to_numpy())
+    print(f"  {'long frame -> panel':<26} {'':>10} {from_long_time * 1000:>11.1f}")
+    print(f"  {'panel -> long frame':<26} {'':>10} {to_long_time * 1000:>11.1f}")
+
+
+    expected, got = row('rolling ATR 14 (every bar)', lambda: long_rolling_atr(raw_data, 14), lambda: panel.rolling_mean(panel.true_range(), 14))
+    assert np.allclose(expected, got[panel.valid], equal_nan=True)
+    expected, got = row('gaps (latest bar)', lambda: long_gaps(raw_data), lambda: panel.gaps()[0])
+    assert np.allclose(expected, got, equal_nan=True)
+    print(f"  panel {panel.values.nbytes / 1024 ** 2:.0f} MB for {panel.shape}, long frame {raw_data.memory_usage(deep=True).sum() / 1024 ** 2:.0f} MB")
+
+if __name__ == '__main__':
+    main()
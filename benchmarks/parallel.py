@@ -0,0 +1,36 @@
+import argparse
+import os
+import time
+import pandas as pd
+from benchmarks.common import make_raw_data, best_of, quiet_streamlit
+from analysis import summarise_ohlcv, parallel_summarise
+from parallel import get_process_pool
+
+# summary in one process vs sharded over a pool of workers. the pools are started (and their imports done)
+# before timing, like they are after the first load of a long running app. efficiency is the speedup over one
+# process divided by the workers, it can only reach 1 with at least that many free cores
+def main():
+    parser = argparse.ArgumentParser(description="Single process summary vs sharded over worker processes")
+    parser.add_argument('--tickers', type=int, default=7000)
+    parser.add_argument('--bars', type=int, default=1000)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    quiet_streamlit()
+
+    raw_data = make_raw_data(args.tickers, args.bars)
+    print(f"{len(raw_data):,} bars of {args.tickers} tickers, {os.cpu_count()} cores")
+    single_time, expected = best_of(lambda: summarise_ohlcv(raw_data), args.repeat)
+    print(f"  {'workers':>7} {'time (s)':>9} {'speedup':>8} {'efficiency':>11}")
+    print(f"  {'single':>7} {single_time:>9.2f} {1:>7.2f}x {'':>11}")
+    for workers in args.workers:
+        pool = get_process_pool(workers)
+        list(pool.map(time.sleep, [0.1] * workers))
+        elapsed, summary = best_of(lambda: parallel_summarise(raw_data, workers=workers), args.repeat)
+        # the shards merge into the same summary, in ticker order
+        pd.testing.assert_frame_equal(summary, expected)
+        speedup = single_time / elapsed
+        print(f"  {workers:>7} {elapsed:>9.2f} {speedup:>7.2f}x {speedup / workers:>10.0%}")
+
+if __name__ == '__main__':
+    main()
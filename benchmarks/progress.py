@@ -0,0 +1,56 @@
+import argparse
+import time
+from benchmarks.common import quiet_streamlit
+
+# the script each mode runs inside a real streamlit script run (AppTest), so every progress bar and status
+# text update becomes a forward message like it does for a browser session
+def progress_script(mode, n_tickers, work_us):
+    import time
+    import streamlit as st
+    from reporting import ThrottledProgress
+    from streamlit_reporter import StreamlitProgress, StreamlitReporter
+    from reporting import LoggingReporter, Reporter
+
+    if mode == 'streamlit, every update':
+        progress = StreamlitProgress()
+    elif mode == 'streamlit, 10 Hz':
+        progress = StreamlitReporter().progress()
+    elif mode == 'logging, every 5s':
+        progress = LoggingReporter().progress()
+    else:
+        progress = Reporter().progress()
+
+    for i in range(n_tickers):
+        deadline = time.perf_counter() + work_us / 1e6
+        while time.perf_counter() < deadline:
+            pass
+        progress.update((i + 1) / n_tickers, f"Processing: {i + 1}/{n_tickers} stocks")
+    progress.close()
+
+    # updates that reached the page (or the log), each streamlit one is a bar and a status text message
+    st.session_state.shown = progress.emitted if isinstance(progress, ThrottledProgress) else n_tickers
+    if mode == 'no-op':
+        st.session_state.shown = 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Cost of per-ticker progress reporting, direct vs throttled")
+    parser.add_argument('--tickers', type=int, default=7000)
+    parser.add_argument('--work-us', type=float, default=50.0, help="simulated work per ticker in microseconds")
+    args = parser.parse_args()
+    quiet_streamlit()
+
+    from streamlit.testing.v1 import AppTest
+
+    modes = ['no-op', 'logging, every 5s', 'streamlit, 10 Hz', 'streamlit, every update']
+    baseline = args.tickers * args.work_us / 1e6
+    print(f"{args.tickers} tickers, {args.work_us:.0f} us of work each ({baseline:.2f} s without any reporting)")
+    print(f"{'mode':<26} {'time (s)':>9} {'overhead (s)':>13} {'updates shown':>14}")
+    for mode in modes:
+        app = AppTest.from_function(progress_script, args=(mode, args.tickers, args.work_us), default_timeout=600)
+        started = time.perf_counter()
+        app.run()
+        elapsed = time.perf_counter() - started
+        print(f"{mode:<26} {elapsed:>9.2f} {elapsed - baseline:>13.2f} {app.session_state.shown:>14}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+import argparse
+import numpy as np
+from benchmarks.common import make_raw_data, best_of, quiet_streamlit
+from analysis import summarise_ohlcv
+from screening import ScreeningIndex
+
+# filter settings from loose to tight, the first one is the screening_interface defaults
+FILTER_SETS = {
+    'defaults': dict(price_min=0.1, price_max=1000.0, gap_pct_threshold=0.01, min_volume=1000,
+                     min_avg_volume=1000, min_atr=0.01, selected_sectors=None),
+    'mid caps': dict(price_min=20.0, price_max=200.0, gap_pct_threshold=0.5, min_volume=500_000,
+                     min_avg_volume=100_000, min_atr=0.5, selected_sectors=None),
+    'two sectors': dict(price_min=5.0, price_max=50.0, gap_pct_threshold=1.0, min_volume=10_000,
+                        min_avg_volume=10_000, min_atr=0.1, selected_sectors=['Technology', 'Energy']),
+    'nothing': dict(price_min=900.0, price_max=901.0, gap_pct_threshold=50.0, min_volume=0,
+                    min_avg_volume=0, min_atr=0.0, selected_sectors=None),
+}
+
+# the screen before the index: copy the summary, compare every column, sort the survivors
+def legacy_screen(df, price_min, price_max, gap_pct_threshold, min_volume, min_avg_volume, min_atr, selected_sectors=None):
+    df_copy = df.copy()
+    screened = df_copy[
+        (df_copy['Price ($)'] >= price_min) &
+        (df_copy['Price ($)'] <= price_max) &
+        (df_copy['Gap (%)'].abs() >= gap_pct_threshold) &
+        (df_copy['Volume'] >= min_volume) &
+        (df_copy['Avg Volume'] >= min_avg_volume) &
+        (df_copy['ATR'] >= min_atr)
+    ]
+    if selected_sectors and len(selected_sectors) > 0:
+        screened = screened[screened['Sector'].isin(selected_sectors)]
+    return screened.sort_values(by='Gap (%)', key=abs, ascending=False)
+
+def main():
+    parser = argparse.ArgumentParser(description="Full-frame screening vs the screening index")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 50000])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+    quiet_streamlit()
+
+    for n_tickers in args.sizes:
+        summary = summarise_ohlcv(make_raw_data(n_tickers))
+        build_time, index = best_of(lambda: ScreeningIndex(summary), args.repeat)
+        print(f"{n_tickers} tickers, index built in {build_time * 1000:.2f} ms")
+        print(f"  {'filters':<12} {'legacy (ms)':>12} {'index (ms)':>11} {'+ frame (ms)':>13} {'speedup':>8} {'rows':>6}")
+        for name, filters in FILTER_SETS.items():
+            legacy_time, expected = best_of(lambda: legacy_screen(summary, **filters), args.repeat)
+            index_time, rows = best_of(lambda: index.screen(**filters), args.repeat)
+            frame_time, screened = best_of(lambda: index.screen_frame(**filters), args.repeat)
+            assert sorted(screened['Ticker']) == sorted(expected['Ticker'])
+            assert np.array_equal(screened['Gap (%)'].abs().to_numpy(), expected['Gap (%)'].abs().to_numpy())
+            print(f"  {name:<12} {legacy_time * 1000:>12.2f} {index_time * 1000:>11.3f} {frame_time * 1000:>13.2f} "
+                  f"{legacy_time / index_time:>7.0f}x {len(rows):>6}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+import argparse
+import random
+import numpy as np
+from benchmarks.common import make_raw_data, best_of, quiet_streamlit
+from analysis import DEFAULT_FILTERS, summarise_ohlcv, screen_stocks
+from screening import ScreeningIndex
+from screens import DEFAULT_SCREENS, evaluate_screens, screen_rows
+
+# the values saved screens pick their thresholds from: a desk's screens reuse a few price bands, volume floors
+# and metric ranges in different combinations rather than all distinct numbers
+PRICE_BANDS = [(1.0, 20.0), (5.0, 50.0), (20.0, 200.0), (50.0, 1000.0), (0.1, 1000.0)]
+GAP_THRESHOLDS = [0.01, 0.5, 1.0, 2.0]
+AVG_VOLUME_FLOORS = [1000, 200_000, 500_000, 2_000_000]
+METRIC_RANGES = [
+    {}, {'RSI 14': [None, 30.0]}, {'RSI 14': [70.0, None]}, {'Rel Volume': [1.5, None]},
+    {'Rel Volume': [3.0, None]}, {'ATR 20': [0.5, None]}, {'Gap (%)': [2.0, None]}, {'Gap (%)': [None, -2.0]},
+]
+SECTOR_CHOICES = [None, None, None, ['Technology'], ['Energy', 'Utilities']]
+
+# n screens, the presets first and random combinations of the shared values after them
+def make_screens(n, seed=0):
+    rng = random.Random(seed)
+    screens = dict(list(DEFAULT_SCREENS.items())[:n])
+    while len(screens) < n:
+        price_min, price_max = rng.choice(PRICE_BANDS)
+        screens[f"screen {len(screens)}"] = {
+            'price_min': price_min, 'price_max': price_max,
+            'gap_pct_threshold': rng.choice(GAP_THRESHOLDS),
+            'min_avg_volume': rng.choice(AVG_VOLUME_FLOORS),
+            'selected_sectors': rng.choice(SECTOR_CHOICES),
+            'metric_ranges': {**rng.choice(METRIC_RANGES), **rng.choice(METRIC_RANGES)},
+        }
+    return screens
+
+# screen_stocks arguments of a saved screen
+def screen_arguments(filters):
+    return {**DEFAULT_FILTERS, **filters}
+
+def main():
+    parser = argparse.ArgumentParser(description="Saved screens one by one vs evaluated together with shared predicates")
+    parser.add_argument('--tickers', type=int, default=10000)
+    parser.add_argument('--screens', type=int, nargs='+', default=[1, 3, 10, 50])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    quiet_streamlit()
+
+    summary = summarise_ohlcv(make_raw_data(args.tickers))
+    build_time, index = best_of(lambda: ScreeningIndex(summary), args.repeat)
+    print(f"{args.tickers} tickers, index built in {build_time * 1000:.2f} ms")
+    print(f"  {'screens':>7} {'screen_stocks (ms)':>19} {'index.screen (ms)':>18} {'batch (ms)':>11} "
+          f"{'batch vs one screen':>20}")
+    single_time, one_screen = best_of(lambda: index.screen(**screen_arguments(DEFAULT_SCREENS['Gap-up momentum'])), args.repeat)
+    for n_screens in args.screens:
+        screens = make_screens(n_screens)
+        # a fresh index per screen, what calling screen_stocks for each screen costs
+        frames_time, _ = best_of(
+            lambda: [screen_stocks(summary, **screen_arguments(filters)) for filters in screens.values()], args.repeat
+        )
+        loop_time, expected = best_of(
+            lambda: [index.screen(**screen_arguments(filters)) for filters in screens.values()], args.repeat
+        )
+        batch_time, membership = best_of(lambda: evaluate_screens(index, screens), args.repeat)
+        for name, rows in zip(screens, expected):
+            assert np.array_equal(screen_rows(index, membership, name), rows), name
+        print(f"  {n_screens:>7} {frames_time * 1000:>19.2f} {loop_time * 1000:>18.2f} {batch_time * 1000:>11.2f} "
+              f"{batch_time / single_time:>19.1f}x")
+    print(f"  one screen on the index: {single_time * 1000:.3f} ms ({len(one_screen)} rows)")
+
+if __name__ == '__main__':
+    main()
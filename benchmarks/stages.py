@@ -0,0 +1,98 @@
+import argparse
+import json
+import platform
+import sys
+from datetime import datetime, timezone
+import pandas as pd
+from benchmarks.common import measure, quiet_streamlit
+from data_loader import get_tickers_and_company_info, download_index_data
+from analysis import DEFAULT_FILTERS, create_summary_data, screen_stocks, detect_anomalies
+from visuals import create_gap_chart, create_top_movers_tables
+from utils import apply_gap_styling
+from providers import SyntheticProvider, set_provider
+from download_scheduler import AIMDRateLimiter
+
+UNIVERSES = {
+    'DOWJONES': ['DOWJONES'],
+    'NYSE': ['NYSE'],
+    'NASDAQ': ['NASDAQ'],
+    'ALL': ['NASDAQ', 'NYSE', 'DOWJONES'],
+}
+
+PERIOD_INTERVALS = ['5d/1d', '1mo/1d', '5d/15m', '1mo/1h']
+
+# times every stage of one load -> screen -> render pass for a universe and period/interval
+def run_pipeline(indices, period, interval):
+    stages = {}
+
+    (tickers, _), stages['load_tickers'] = measure(lambda: get_tickers_and_company_info(indices))
+    # a limiter of its own so every download starts from the same rate
+    (raw_data, company_info), stages['download'] = measure(
+        lambda: download_index_data(indices, period, interval, use_cache=False, limiter=AIMDRateLimiter())
+    )
+    summary, stages['summary'] = measure(lambda: create_summary_data(raw_data, company_info))
+    _, stages['screen'] = measure(lambda: screen_stocks(summary, **DEFAULT_FILTERS))
+    _, stages['anomalies'] = measure(lambda: detect_anomalies(summary))
+    _, stages['gap_chart'] = measure(lambda: create_gap_chart(summary, "All Stocks").to_json())
+    _, stages['top_movers'] = measure(lambda: create_top_movers_tables(summary))
+    # the first page of the results table as the screening page draws it (the styler is lazy, rendering it is
+    # what st.dataframe pays for)
+    _, stages['results_table'] = measure(lambda: apply_gap_styling(summary.iloc[:50]).to_html())
+
+    return {'tickers': len(tickers), 'rows': len(raw_data), 'summary_rows': len(summary), 'stages': stages}
+
+# stages whose wall time grew by more than tolerance (relative) compared to a previous results file
+def find_regressions(results, baseline, tolerance):
+    previous = {(r['universe'], r['period'], r['interval']): r['stages'] for r in baseline['results']}
+    regressions = []
+    for result in results:
+        before = previous.get((result['universe'], result['period'], result['interval']), {})
+        for stage, timing in result['stages'].items():
+            if stage in before and timing['wall_s'] > before[stage]['wall_s'] * (1 + tolerance) + 0.005:
+                regressions.append(f"{result['universe']} {result['period']}/{result['interval']} {stage}: "
+                                   f"{before[stage]['wall_s']:.3f}s -> {timing['wall_s']:.3f}s")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Per stage benchmark of the screener pipeline on synthetic data")
+    parser.add_argument('--universes', nargs='+', default=list(UNIVERSES), choices=list(UNIVERSES))
+    parser.add_argument('--combos', nargs='+', default=PERIOD_INTERVALS, help="period/interval pairs")
+    parser.add_argument('--output', default=None, help="write the JSON results here (stdout otherwise)")
+    parser.add_argument('--baseline', default=None, help="earlier JSON results to check for regressions")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="allowed slowdown before a stage counts as regressed")
+    args = parser.parse_args()
+
+    # no network and no streamlit session: synthetic bars, and silence the "no script run context" warnings
+    set_provider(SyntheticProvider(seed=0))
+    quiet_streamlit()
+
+    results = []
+    for universe in args.universes:
+        for combo in args.combos:
+            period, interval = combo.split('/')
+            result = run_pipeline(UNIVERSES[universe], period, interval)
+            results.append({'universe': universe, 'period': period, 'interval': interval, **result})
+            timings = ', '.join(f"{stage} {timing['wall_s']:.3f}s" for stage, timing in result['stages'].items())
+            print(f"{universe} {combo} ({result['rows']:,} rows): {timings}", file=sys.stderr)
+
+    report = {
+        'created': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            regressions = find_regressions(results, json.load(baseline_file), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        sys.exit(1 if regressions else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+import argparse
+import multiprocessing
+import shutil
+import tempfile
+import time
+import ohlcv_cache
+from benchmarks.common import measure, quiet_streamlit
+from benchmarks.stages import UNIVERSES
+from data_loader import download_index_data
+from analysis import create_summary_data
+from pipeline import stream_summary_data, combine_summary_chunks
+from providers import SyntheticProvider, set_provider
+
+# the load before streaming: download everything, keep the combined bars, then summarise
+def batch_load(indices, period, interval, use_cache):
+    raw_data, company_info = download_index_data(indices, period, interval, use_cache=use_cache)
+    return create_summary_data(raw_data, company_info)
+
+# streamed load, notes when the first rows of the summary were available
+def streaming_load(indices, period, interval, use_cache, started, first_result):
+    chunks = []
+    for chunk in stream_summary_data(indices, period, interval, use_cache=use_cache):
+        if not first_result and not chunk.summary.empty:
+            first_result.append(time.perf_counter() - started)
+        chunks.append(chunk)
+    return combine_summary_chunks(chunks)
+
+# one measured load, run in a fresh process so the heap left behind by an earlier run does not count
+def run_mode(mode, indices, period, interval, latency, use_cache):
+    set_provider(SyntheticProvider(seed=0, latency=latency))
+    quiet_streamlit()
+
+    # every run starts from an empty cache in a scratch directory
+    ohlcv_cache.CACHE_DIR = tempfile.mkdtemp()
+    started = time.perf_counter()
+    first_result = []
+    if mode == 'batch':
+        summary, timing = measure(lambda: batch_load(indices, period, interval, use_cache))
+        first_result.append(timing['wall_s'])
+    else:
+        summary, timing = measure(lambda: streaming_load(indices, period, interval, use_cache, started, first_result))
+    shutil.rmtree(ohlcv_cache.CACHE_DIR)
+    return first_result[0], timing, len(summary)
+
+def main():
+    parser = argparse.ArgumentParser(description="Time to first result and peak memory of batch vs streamed loads")
+    parser.add_argument('--universes', nargs='+', default=['NASDAQ', 'ALL'], choices=list(UNIVERSES))
+    parser.add_argument('--period', default='1mo')
+    parser.add_argument('--interval', default='1h')
+    parser.add_argument('--latency', type=float, default=0.5, help="seconds per provider request")
+    parser.add_argument('--no-cache', action='store_true', help="stream straight from the download, nothing spilled to disk")
+    args = parser.parse_args()
+    use_cache = not args.no_cache
+
+    print(f"{args.period}/{args.interval}, {args.latency}s per request, " + ("cold cache" if use_cache else "no cache"))
+    print(f"{'universe':<10} {'mode':<10} {'first result (s)':>17} {'total (s)':>10} {'peak RSS (MB)':>14} {'stocks':>7}")
+    context = multiprocessing.get_context('spawn')
+    for universe in args.universes:
+        for mode in ['batch', 'streaming']:
+            with context.Pool(1) as pool:
+                first_result, timing, stocks = pool.apply(
+                    run_mode, (mode, UNIVERSES[universe], args.period, args.interval, args.latency, use_cache)
+                )
+            print(f"{universe:<10} {mode:<10} {first_result:>17.2f} {timing['wall_s']:>10.2f} "
+                  f"{timing['peak_rss_mb']:>14.1f} {stocks:>7}")
+
+if __name__ == '__main__':
+    main()
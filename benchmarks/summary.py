@@ -0,0 +1,58 @@
+import argparse
+import pandas as pd
+from benchmarks.common import make_raw_data, best_of
+from analysis import summarise_ohlcv
+from utils import calculate_atr
+
+# the per ticker groupby loop create_summary_data used before it was vectorised (without the progress bar),
+# kept here as the reference for both the timings and the equality check
+def legacy_summary(raw_data):
+    summary_results = []
+    for ticker, df in raw_data.groupby('Ticker'):
+        df = df.sort_index()
+        if len(df) < 2:
+            continue
+        latest_data = df.iloc[-1]
+        prev_close = df['Close'].iloc[-2]
+        today_open = latest_data['Open']
+        today_close = latest_data['Close']
+        today_high = latest_data['High']
+        today_low = latest_data['Low']
+        avg_price = (today_open + today_high + today_low + today_close) / 4
+        gap_abs = today_open - prev_close
+        gap_pct = (gap_abs / prev_close) * 100 if prev_close != 0 else 0
+        if len(df) >= 14:
+            atr = calculate_atr(df).iloc[-1]
+        else:
+            atr = (today_high - today_low)
+        summary_results.append({
+            'Ticker': ticker,
+            'Company Name': df['Company Name'].iloc[-1],
+            'Sector': df['Sector'].iloc[-1],
+            'Price ($)': round(today_close, 2),
+            'Avg Price ($)': round(avg_price, 2),
+            'Gap ($)': round(gap_abs, 2),
+            'Gap (%)': round(gap_pct, 2),
+            'Volume': int(df['Volume'].sum()),
+            'Avg Volume': int(df['Volume'].mean()),
+            'ATR': round(atr, 2),
+        })
+    return pd.DataFrame(summary_results)
+
+def main():
+    parser = argparse.ArgumentParser(description="Legacy loop vs vectorised create_summary_data")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 5_000, 10_000])
+    parser.add_argument('--bars', type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'tickers':>8} {'rows':>9} {'legacy (s)':>11} {'vectorised (s)':>15} {'speedup':>8}")
+    for size in args.sizes:
+        raw_data = make_raw_data(size, args.bars)
+        legacy_time, expected = best_of(lambda: legacy_summary(raw_data), repeat=1)
+        vector_time, actual = best_of(lambda: summarise_ohlcv(raw_data, metrics=[]))
+
+        pd.testing.assert_frame_equal(actual, expected, check_dtype=False)
+        print(f"{size:>8} {len(raw_data):>9} {legacy_time:>11.3f} {vector_time:>15.4f} {legacy_time / vector_time:>7.0f}x")
+
+if __name__ == '__main__':
+    main()
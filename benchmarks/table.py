@@ -0,0 +1,38 @@
+import argparse
+from benchmarks.common import make_raw_data, best_of, quiet_streamlit
+from analysis import summarise_ohlcv
+from screening import ScreeningIndex
+from utils import apply_gap_styling
+
+# the results table before pagination: copy and style every row (the styler is lazy, rendering it is what
+# st.dataframe pays for)
+def legacy_table(summary):
+    return apply_gap_styling(summary.copy()).to_html()
+
+# one page of the summary sorted by a column on the screening index, styled
+def table_page(index, rows, column, page, page_size=50):
+    rows = index.order(rows, column, ascending=False)
+    start = (page - 1) * page_size
+    return apply_gap_styling(index.summary.iloc[rows[start:start + page_size]]).to_html()
+
+def main():
+    parser = argparse.ArgumentParser(description="Whole styled results table vs one sorted page per rerun")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 50000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    quiet_streamlit()
+
+    print(f"{'tickers':>8} {'whole table (ms)':>17} {'page (ms)':>10} {'last page (ms)':>15}")
+    for n_tickers in args.sizes:
+        summary = summarise_ohlcv(make_raw_data(n_tickers, 5))
+        index = ScreeningIndex(summary)
+        rows = index.screen(0, 1e9, 0, 0, 0, 0)
+        index.sort_key('Volume')
+        legacy_time, _ = best_of(lambda: legacy_table(summary), args.repeat)
+        page_time, _ = best_of(lambda: table_page(index, rows, 'Volume', 1), args.repeat)
+        last_page = -(-len(rows) // 50)
+        last_time, _ = best_of(lambda: table_page(index, rows, 'Volume', last_page), args.repeat)
+        print(f"{n_tickers:>8} {legacy_time * 1000:>17.1f} {page_time * 1000:>10.1f} {last_time * 1000:>15.1f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+import argparse
+import shutil
+import tempfile
+import time
+import ohlcv_cache
+from benchmarks.common import quiet_streamlit
+from benchmarks.stages import UNIVERSES
+from data_loader import download_index_data
+from instrumentation import record_load, get_metrics_registry
+from providers import SyntheticProvider, set_provider
+from ticker_health import get_ticker_health
+
+# counts the requests that reach the provider
+class CountingProvider(SyntheticProvider):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.requests = 0
+
+    def fetch(self, tickers, period, interval, start=None):
+        self.requests += 1
+        return super().fetch(tickers, period, interval, start)
+
+# consecutive loads of a universe where some tickers never have data (delisted) and a few downloads fail, with
+# and without the negative cache. after the first load every live ticker comes from the on-disk cache, so
+# without the negative cache the later loads only request the dead tickers, again and again
+def run(indices, period, interval, loads, negative_cache, provider_options):
+    provider = CountingProvider(seed=0, **provider_options)
+    set_provider(provider)
+    ohlcv_cache.CACHE_DIR = tempfile.mkdtemp()
+    health = get_ticker_health()
+    if not negative_cache:
+        health.empty_limit = health.error_limit = float('inf')
+
+    rows = []
+    for _ in range(loads):
+        requests_before = provider.requests
+        started = time.perf_counter()
+        with record_load('load', log=False) as load:
+            raw_data, _ = download_index_data(indices, period, interval)
+        counters = load.as_dict()['counters']
+        rows.append((time.perf_counter() - started, provider.requests - requests_before, counters,
+                     0 if raw_data is None else raw_data['Ticker'].nunique()))
+    shutil.rmtree(ohlcv_cache.CACHE_DIR)
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Loads with dead tickers requested every time vs kept in the negative cache")
+    parser.add_argument('--universe', default='NASDAQ', choices=list(UNIVERSES))
+    parser.add_argument('--period', default='5d')
+    parser.add_argument('--interval', default='1h')
+    parser.add_argument('--loads', type=int, default=5)
+    parser.add_argument('--missing-rate', type=float, default=0.08, help="share of tickers that never have data")
+    parser.add_argument('--ticker-failure-rate', type=float, default=0.01, help="share of ticker downloads that fail")
+    parser.add_argument('--latency', type=float, default=0.3, help="seconds per provider request")
+    args = parser.parse_args()
+    quiet_streamlit()
+    get_metrics_registry().path = None
+
+    provider_options = {
+        'latency': args.latency, 'per_ticker_latency': 0.0005,
+        'missing_rate': args.missing_rate, 'ticker_failure_rate': args.ticker_failure_rate,
+    }
+    print(f"{args.universe} {args.period}/{args.interval}, {args.missing_rate:.0%} dead tickers, "
+          f"{args.ticker_failure_rate:.0%} failed ticker downloads, {args.latency}s per request")
+    print(f"{'negative cache':<15} {'load':>4} {'time (s)':>9} {'requests':>9} {'requested':>10} {'skipped':>8} "
+          f"{'failed':>7} {'retries':>8} {'stocks':>7}")
+    for negative_cache in [False, True]:
+        rows = run(UNIVERSES[args.universe], args.period, args.interval, args.loads, negative_cache, provider_options)
+        for i, (elapsed, requests, counters, stocks) in enumerate(rows):
+            print(f"{'on' if negative_cache else 'off':<15} {i + 1:>4} {elapsed:>9.2f} {requests:>9} "
+                  f"{counters['tickers_requested']:>10} {counters['tickers_skipped']:>8} {counters['tickers_failed']:>7} "
+                  f"{counters['retries']:>8} {stocks:>7}")
+
+if __name__ == '__main__':
+    main()
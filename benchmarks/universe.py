@@ -0,0 +1,56 @@
+import argparse
+import os
+import tempfile
+import pandas as pd
+import universe
+from benchmarks.common import best_of, quiet_streamlit
+from data_loader import INDEX_CONFIGS
+from universe import UniverseIndex, build_universe, files_fingerprint, load_universe
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# what loading the tickers did before the compiled index: parse every csv, build the info dict row by row
+# with iterrows and merge the dicts of the selected indices
+def legacy_tickers_and_info(index_files, selected_indices):
+    all_tickers = []
+    combined_ticker_info = {}
+    for index_name in selected_indices:
+        df = pd.read_csv(index_files[index_name])
+        ticker_info_dict = {}
+        for _, row in df.iterrows():
+            ticker_info_dict[row['Symbol']] = {'Company Name': row['Company Name'], 'Sector': row['Sector']}
+        all_tickers.extend(df['Symbol'].dropna().tolist())
+        combined_ticker_info.update(ticker_info_dict)
+    return list(dict.fromkeys(all_tickers)), combined_ticker_info
+
+def compiled_tickers_and_info(index_files, selected_indices, cache_path):
+    compiled = load_universe(index_files, cache_path)
+    ids = compiled.ids(selected_indices)
+    return compiled.symbols[ids].tolist(), compiled.company_info(ids)
+
+def main():
+    parser = argparse.ArgumentParser(description="Ticker loading: csv + iterrows vs the compiled universe index")
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    quiet_streamlit()
+
+    index_files = {name: os.path.join(REPO_DIR, config['file_path']) for name, config in INDEX_CONFIGS.items()}
+    cache_path = os.path.join(tempfile.mkdtemp(), 'universe.npz')
+    fingerprint = files_fingerprint(index_files)
+
+    build_time, compiled = best_of(lambda: build_universe(index_files), args.repeat)
+    compiled.save(cache_path, fingerprint)
+    disk_time, _ = best_of(lambda: UniverseIndex.load(cache_path, fingerprint), args.repeat)
+    print(f"{len(compiled)} symbols: build from csv {build_time * 1000:.1f} ms, load from disk {disk_time * 1000:.1f} ms")
+
+    print(f"{'indices':<26} {'legacy (ms)':>12} {'compiled (ms)':>14} {'speedup':>8} {'tickers':>8}")
+    for selected in [['DOWJONES'], ['NASDAQ'], ['NASDAQ', 'NYSE', 'DOWJONES']]:
+        legacy_time, (legacy_tickers, _) = best_of(lambda: legacy_tickers_and_info(index_files, selected), args.repeat)
+        universe._universe = None
+        compiled_time, (tickers, _) = best_of(lambda: compiled_tickers_and_info(index_files, selected, cache_path), args.repeat)
+        assert set(tickers) == set(legacy_tickers)
+        print(f"{'+'.join(selected):<26} {legacy_time * 1000:>12.1f} {compiled_time * 1000:>14.2f} "
+              f"{legacy_time / compiled_time:>7.0f}x {len(tickers):>8}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,184 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from datetime import datetime, timezone
+from analysis import (DEFAULT_FILTERS, ANOMALY_METHODS, DEFAULT_ANOMALY_THRESHOLD, DEFAULT_ANOMALY_TOP_N,
+                      create_summary_data, screen_stocks, detect_anomalies)
+from data_loader import INDEX_CONFIGS, download_index_data
+from export import write_frames
+from instrumentation import record_load
+from pipeline import stream_summary_data, combine_summary_chunks
+from screening import ScreeningIndex
+from screens import load_screens, missing_columns, evaluate_screens
+from utils import validate_period_interval
+
+# headless screening: download -> summary -> screen -> anomalies for the given indices, written to files that
+# can be served without computing anything. does not import streamlit or plotly so it starts fast from cron
+# or a worker, for example
+#   python cli.py --indices NASDAQ NYSE --period 5d --interval 1d --min-gap 2 --output-dir screens
+
+FORMATS = ['parquet', 'csv', 'json', 'arrow']
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run a stock screen without the Streamlit UI and write the results")
+    parser.add_argument('--indices', nargs='+', default=['DOWJONES'], type=str.upper, choices=list(INDEX_CONFIGS))
+    parser.add_argument('--period', default='3d')
+    parser.add_argument('--interval', default='1h')
+    parser.add_argument('--price-min', type=float, default=DEFAULT_FILTERS['price_min'])
+    parser.add_argument('--price-max', type=float, default=DEFAULT_FILTERS['price_max'])
+    parser.add_argument('--min-gap', type=float, default=DEFAULT_FILTERS['gap_pct_threshold'], help="minimum absolute gap (%%)")
+    parser.add_argument('--min-volume', type=int, default=DEFAULT_FILTERS['min_volume'])
+    parser.add_argument('--min-avg-volume', type=int, default=DEFAULT_FILTERS['min_avg_volume'])
+    parser.add_argument('--min-atr', type=float, default=DEFAULT_FILTERS['min_atr'])
+    parser.add_argument('--sectors', nargs='*', default=None, help="only keep these sectors")
+    parser.add_argument('--metric-range', nargs=3, action='append', default=[], metavar=('METRIC', 'LOW', 'HIGH'),
+                        help="range on a metric column, e.g. --metric-range 'RSI 14' none 30 (repeatable)")
+    parser.add_argument('--anomaly-threshold', type=float, default=DEFAULT_ANOMALY_THRESHOLD, help="z-score a stock must exceed")
+    parser.add_argument('--anomaly-top-n', type=int, default=DEFAULT_ANOMALY_TOP_N)
+    parser.add_argument('--anomaly-method', default='zscore', choices=ANOMALY_METHODS,
+                        help="baseline statistics: mean/std (zscore) or median/MAD (robust)")
+    parser.add_argument('--anomaly-by-sector', action='store_true', help="score each stock against its own sector")
+    parser.add_argument('--screens', nargs='?', const='', default=None, metavar='FILE',
+                        help="also evaluate every saved screen (from FILE, default SCREENER_SCREENS_FILE) and write "
+                             "which stocks pass each")
+    parser.add_argument('--output-dir', default='screens')
+    parser.add_argument('--formats', nargs='+', default=['parquet', 'csv', 'json'], choices=FORMATS)
+    parser.add_argument('--no-cache', action='store_true', help="do not use the on-disk OHLCV cache")
+    parser.add_argument('--stream', action='store_true', help="summarise batch by batch instead of holding all raw bars")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="processes to summarise in (default SCREENER_SUMMARY_WORKERS or 1, 0 for every core)")
+    parser.add_argument('--quiet', action='store_true', help="only log warnings and errors")
+    return parser.parse_args(argv)
+
+# writes a frame in every requested format as <output_dir>/<name>.<format>. each file is written next to
+# its final name and renamed into place so a reader never sees a half written file
+def write_frame(frame, output_dir, name, formats):
+    paths = []
+    for file_format in formats:
+        path = os.path.join(output_dir, f"{name}.{file_format}")
+        temp_path = f"{path}.tmp"
+        if file_format == 'parquet':
+            frame.to_parquet(temp_path, index=False)
+        elif file_format == 'csv':
+            frame.to_csv(temp_path, index=False)
+        elif file_format == 'arrow':
+            with open(temp_path, 'wb') as arrow_file:
+                write_frames([frame], arrow_file, 'arrow')
+        else:
+            frame.to_json(temp_path, orient='records', indent=2)
+        os.replace(temp_path, path)
+        paths.append(path)
+    return paths
+
+# prefix of the output files, e.g. NASDAQ_NYSE_5d_1d
+def output_prefix(indices, period, interval):
+    return f"{'_'.join(sorted(indices))}_{period}_{interval}"
+
+# --metric-range triples as {column: (low, high)}, 'none' leaves that end open
+def parse_metric_ranges(metric_ranges):
+    def bound(value):
+        return None if value.lower() == 'none' else float(value)
+    return {metric: (bound(low), bound(high)) for metric, low, high in metric_ranges}
+
+def load_summary(args):
+    use_cache = not args.no_cache
+    if args.stream:
+        return combine_summary_chunks(stream_summary_data(args.indices, args.period, args.interval, use_cache=use_cache))
+    raw_data, company_info = download_index_data(args.indices, args.period, args.interval, use_cache=use_cache)
+    workers = args.workers if args.workers is None or args.workers > 0 else os.cpu_count()
+    return create_summary_data(raw_data, company_info, workers=workers)
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(
+        level=logging.WARNING if args.quiet else logging.INFO,
+        format='%(asctime)s %(levelname)s %(message)s'
+    )
+    logger = logging.getLogger('screener')
+
+    is_valid_combination, validation_error = validate_period_interval(args.period, args.interval)
+    if not is_valid_combination:
+        logger.error(f"Invalid configuration: {validation_error}")
+        return 2
+
+    started = time.perf_counter()
+    with record_load('cli', indices=sorted(args.indices), period=args.period, interval=args.interval,
+                     stream=args.stream) as metrics:
+        summary = load_summary(args)
+        metrics.label('stocks', 0 if summary is None else len(summary))
+    if summary is None or summary.empty:
+        logger.error("No data to screen")
+        return 1
+    loaded = time.perf_counter()
+
+    filters = {
+        'price_min': args.price_min,
+        'price_max': args.price_max,
+        'gap_pct_threshold': args.min_gap,
+        'min_volume': args.min_volume,
+        'min_avg_volume': args.min_avg_volume,
+        'min_atr': args.min_atr,
+        'selected_sectors': args.sectors,
+        'metric_ranges': parse_metric_ranges(args.metric_range),
+    }
+    unknown_metrics = [metric for metric in filters['metric_ranges'] if metric not in summary.columns]
+    if unknown_metrics:
+        logger.error(f"Unknown metric columns: {', '.join(unknown_metrics)}")
+        return 2
+    screened = screen_stocks(summary, **filters)
+    anomaly_options = {
+        'threshold': args.anomaly_threshold,
+        'top_n': args.anomaly_top_n,
+        'method': args.anomaly_method,
+        'by_sector': args.anomaly_by_sector,
+    }
+    anomalies = detect_anomalies(summary, **anomaly_options)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    prefix = output_prefix(args.indices, args.period, args.interval)
+    files = {
+        'summary': write_frame(summary, args.output_dir, f"{prefix}_summary", args.formats),
+        'screened': write_frame(screened, args.output_dir, f"{prefix}_screened", args.formats),
+    }
+    if anomalies is not None:
+        files['anomalies'] = write_frame(anomalies, args.output_dir, f"{prefix}_anomalies", args.formats)
+    screen_counts = None
+    if args.screens is not None:
+        saved_screens = load_screens(args.screens or None)
+        screens = {name: filters for name, filters in saved_screens.items() if not missing_columns(filters, summary)}
+        for name in [name for name in saved_screens if name not in screens]:
+            logger.warning(f"Screen {name!r} skipped, the summary lacks {', '.join(missing_columns(saved_screens[name], summary))}")
+        # one row per stock, one bool column per screen
+        membership = evaluate_screens(ScreeningIndex(summary), screens)
+        screen_counts = {name: int(count) for name, count in membership.sum().items()}
+        files['screens'] = write_frame(membership.reset_index(), args.output_dir, f"{prefix}_screens", args.formats)
+
+    # what was run and when, for whoever serves the files
+    manifest = {
+        'created': datetime.now(timezone.utc).isoformat(),
+        'indices': sorted(args.indices),
+        'period': args.period,
+        'interval': args.interval,
+        'filters': filters,
+        'anomaly_options': anomaly_options,
+        'stocks': len(summary),
+        'screened': len(screened),
+        'anomalies': 0 if anomalies is None else len(anomalies),
+        'screens': screen_counts,
+        'load_seconds': round(loaded - started, 3),
+        'total_seconds': round(time.perf_counter() - started, 3),
+        'files': files,
+    }
+    manifest_path = os.path.join(args.output_dir, f"{prefix}_manifest.json")
+    with open(f"{manifest_path}.tmp", 'w') as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+    os.replace(f"{manifest_path}.tmp", manifest_path)
+
+    logger.info(f"{len(screened)} of {len(summary)} stocks passed the screen, results in {args.output_dir}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,8 +1,16 @@
-import streamlit as st
-import pandas as pd
-import yfinance as yf
+import os
+import threading
 import time
-from utils import get_batches
+import pandas as pd
+import numpy as np
+from utils import get_batches, compact_ohlcv
+from ohlcv_cache import OHLCVCache, CachePlan, bucket_of, order_by_bucket
+from download_scheduler import AIMDRateLimiter, RateLimitError, get_shared_limiter, run_batches
+from providers import get_provider
+from universe import load_universe
+from ticker_health import get_ticker_health
+import instrumentation
+import reporting
 
 # different stock indexes 
 INDEX_CONFIGS = {
@@ -23,160 +31,305 @@ INDEX_CONFIGS = {
     }
 }
 
-def download_batch(tickers, period, interval, ticker_info_dict):
-    try:
-        all_frames = []
-        company_info_dict = {}
-        
-        # getting the data in bulk (for the whole batch) 
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# tickers per yf.download call and how many of those calls may run at the same time
+BATCH_SIZE = 500
+MAX_CONCURRENT_BATCHES = 4
+
+# follow up requests for the tickers of a batch whose download failed (the whole request or single tickers),
+# each one after a backoff that doubles every attempt
+TRANSIENT_RETRIES = 2
+RETRY_BACKOFF_SECONDS = 1.0
+
+# fetches one batch in bulk from the configured data provider (yahoo finance unless SCREENER_DATA_PROVIDER
+# says otherwise), when start is given only the bars from start onwards are fetched instead of the whole
+# period. raises RateLimitError when the provider throttled the request
+def fetch_batch(tickers, period, interval, start=None):
+    return get_provider().fetch(tickers, period, interval, start)
+
+# splits a bulk download into one frame per ticker (bars with a Date and Ticker column). returns the frames
+# together with the tickers that came back without bars and the ones whose download failed (listed by the
+# provider in attrs['failed'], or that could not be split out). on_ticker(i) is called after each ticker for
+# progress reporting
+def split_ticker_frames(bulk_data, tickers, on_ticker=None):
+    with instrumentation.stage('extract'):
+        return _split_ticker_frames(bulk_data, tickers, on_ticker)
+
+def _split_ticker_frames(bulk_data, tickers, on_ticker):
+    all_frames, empty, failed = [], [], []
+    failed_downloads = set(bulk_data.attrs.get('failed', ()))
+    is_bulk = isinstance(bulk_data.columns, pd.MultiIndex)
+    bulk_tickers = set(bulk_data.columns.get_level_values(0)) if is_bulk else None
+    for i, ticker in enumerate(tickers):
         try:
-            bulk_data = yf.download(
-                tickers=tickers,
-                period=period,
-                interval=interval,
-                group_by='ticker',
-                auto_adjust=False,
-                threads=True,
-                progress=False
-            )
-            
-            # process each ticker
-            progress_bar = st.progress(0)
-            status_text = st.empty()
+            if ticker in failed_downloads:
+                failed.append(ticker)
+                continue
+            if is_bulk and ticker not in bulk_tickers:
+                empty.append(ticker)
+                continue
+
+            # extract the ticker data from bulk download
+            ticker_data = bulk_data.xs(ticker, axis=1, level=0) if is_bulk else bulk_data
             
-            for i, ticker in enumerate(tickers):
-                try:
-                    # get ticker info from the pre-loaded data
-                    ticker_info = ticker_info_dict.get(ticker, {
-                        'Company Name': 'N/A',
-                        'Sector': 'N/A'
-                    })
-                    
-                    company_info = {
-                        'Ticker': ticker,
-                        'Company Name': ticker_info.get('Company Name', 'N/A'),
-                        'Sector': ticker_info.get('Sector', 'N/A')
-                    }
-                    company_info_dict[ticker] = company_info
-                    
-                    # extract the ticker data from bulk download
-                    if isinstance(bulk_data.columns, pd.MultiIndex):
-                        ticker_data = bulk_data.xs(ticker, axis=1, level=0)
-                    else:
-                        ticker_data = bulk_data
-                    
-                    ticker_data = ticker_data.dropna()
-                    if not ticker_data.empty:
-                        ticker_data['Ticker'] = ticker
-                        ticker_data['Company Name'] = company_info['Company Name']
-                        ticker_data['Sector'] = company_info['Sector']
-                        all_frames.append(ticker_data)
-                        
-                except Exception as e:
-                    continue
+            # company name and sector are kept in the company info table, not repeated on every bar
+            ticker_data = ticker_data.dropna()
+            if not ticker_data.empty:
+                ticker_data = ticker_data.rename_axis('Date').reset_index()
+                ticker_data['Ticker'] = ticker
+                all_frames.append(ticker_data)
+            else:
+                empty.append(ticker)
                 
-                progress_bar.progress((i + 1) / len(tickers))
-                status_text.text(f"Processing: {i + 1}/{len(tickers)} stocks")
-            
-            progress_bar.empty()
-            status_text.empty()
-            
-        except Exception as e:
-            st.error("Download Failed :(")
-            
-        return all_frames, company_info_dict
-        
-    except Exception as e:
-        st.error(f"Batch download failed: {e}")
-        return [], {}
+        except Exception:
+            failed.append(ticker)
+        finally:
+            if on_ticker:
+                on_ticker(i)
+    return all_frames, empty, failed
+
+# the frames of the tickers that have bars in a bulk download, see split_ticker_frames
+def extract_ticker_frames(bulk_data, tickers, on_ticker=None):
+    all_frames, empty, failed = split_ticker_frames(bulk_data, tickers, on_ticker)
+    instrumentation.count('tickers_returned', len(all_frames))
+    instrumentation.count('tickers_empty', len(empty))
+    instrumentation.count('tickers_failed', len(failed))
+    return all_frames
 
-def download_index_data(selected_indices, period, interval):
-    tickers, ticker_info_dict = get_combined_tickers_and_info(selected_indices)
+# resolves the tickers of the selected indices and works out what the on-disk cache can serve, showing the
+# usual notes on the way. returns (tickers, company_info, cache, plan) or None when there is nothing to load
+def prepare_download(selected_indices, period, interval, use_cache=True):
+    tickers, company_info = get_tickers_and_company_info(selected_indices)
     
     if not tickers:
-        st.error(f"No tickers found for selected indices: {', '.join(selected_indices)}")
+        reporting.error(f"No tickers found for selected indices: {', '.join(selected_indices)}")
         return None
     
     if(len(selected_indices) > 1):
-        st.warning("**Note:** For multiple indices, duplicates are removed.")
-    st.warning("**Note:** Few stocks may have been delisted, or have no data (in the selected period) to be fetched.")
-    st.info(f"Downloading data for {len(tickers)} stocks...")
-    
-    batch_size = 500
-    batches = list(get_batches(tickers, batch_size))
+        reporting.warning("**Note:** For multiple indices, duplicates are removed.")
+    reporting.warning("**Note:** Few stocks may have been delisted, or have no data (in the selected period) to be fetched.")
+
+    provider = get_provider()
+    if provider.name != 'yfinance':
+        reporting.info(f"**Note:** Using the {provider.name} data provider, not live market data.")
+
+    cache = OHLCVCache()
+    with instrumentation.stage('cache_plan'):
+        plan = cache.plan(tickers, period, interval) if use_cache else CachePlan([], {}, tickers)
+    cache_stats = plan.stats()
+    instrumentation.count('cache_hits', cache_stats['hits'])
+
+    # tickers that kept coming back without bars are not requested until their negative cache entry expires
+    skipped = get_ticker_health().skipped(plan.missing) if use_cache else []
+    if skipped:
+        skipped_set = set(skipped)
+        plan = CachePlan(plan.fresh, plan.stale, [ticker for ticker in plan.missing if ticker not in skipped_set])
+        instrumentation.count('tickers_skipped', len(skipped))
+        reporting.info(f"**Note:** Skipping {len(skipped)} stocks that returned no data in their last loads (they are tried again later).")
+    reporting.info(
+        f"Downloading data for {len(plan.missing)} stocks, refreshing {len(plan.stale)} cached stocks "
+        f"(cache: {cache_stats['hits']} hits, {cache_stats['refreshed']} refreshed, {cache_stats['misses']} misses)..."
+    )
+    return tickers, company_info, cache, plan
+
+# the download jobs for a cache plan as (batch, start) pairs: full period downloads for the tickers the cache
+# cannot serve, then the tickers that only need their newest bars (start = earliest last cached bar of the
+# batch). tickers are ordered by cache bucket so storing a batch only touches a few cache files
+def plan_batches(plan, batch_size=BATCH_SIZE):
+    batches = [(batch, None) for batch in get_batches(order_by_bucket(plan.missing), batch_size)]
+    stale_tickers = sorted(plan.stale, key=lambda ticker: (bucket_of(ticker), plan.stale[ticker]))
+    for batch in get_batches(stale_tickers, batch_size):
+        start = min(plan.stale[ticker] for ticker in batch)
+        batches.append((batch, pd.Timestamp(start).tz_localize('UTC')))
+    return batches
+
+# downloads one batch and splits it per ticker, the tickers whose download failed are requested again on their
+# own after an exponential backoff (up to retries times, paced by the limiter). returns (frames, empty, failed)
+# and raises the last error when no request got through. the first request is paced by run_batches, which also
+# retries it when it was throttled
+def fetch_ticker_frames(batch, period, interval, start, limiter, retries=TRANSIENT_RETRIES,
+                        backoff=RETRY_BACKOFF_SECONDS, sleep=time.sleep):
+    frames, empty, pending = [], [], list(batch)
+    fetched, error = False, None
+    for attempt in range(retries + 1):
+        if attempt:
+            sleep(backoff * 2 ** (attempt - 1))
+            limiter.acquire()
+            instrumentation.count('retries')
+        try:
+            with instrumentation.stage('download'):
+                bulk_data = fetch_batch(pending, period, interval, start)
+        except RateLimitError as e:
+            if not attempt:
+                raise
+            limiter.on_throttle()
+            error = e
+            continue
+        except Exception as e:
+            error = e
+            continue
+        if attempt:
+            limiter.on_success()
+        fetched = True
+        batch_frames, batch_empty, pending = split_ticker_frames(bulk_data, pending)
+        frames.extend(batch_frames)
+        empty.extend(batch_empty)
+        if not pending:
+            break
+    if not fetched:
+        raise error
+    return frames, empty, pending
+
+# downloads the batches with several in flight at once (the rate limiter paces them and backs off when the
+# provider throttles), yielding (batch, start, frames, error) in completion order. with a ticker health record
+# the outcome of every ticker is noted in it once the batches are done. tickers without bars only count as empty
+# when other tickers of the load did get bars (from these batches, or from the cache when has_data), a load that
+# got nothing at all says more about the period than about the tickers
+def iter_downloaded_batches(batches, period, interval, max_workers=MAX_CONCURRENT_BATCHES, limiter=None, health=None,
+                            has_data=False):
+    limiter = limiter or AIMDRateLimiter()
+    outcomes = {'returned': [], 'empty': [], 'failed': []}
+    outcomes_lock = threading.Lock()
+
+    def note(returned=(), empty=(), failed=()):
+        with outcomes_lock:
+            outcomes['returned'].extend(returned)
+            outcomes['empty'].extend(empty)
+            outcomes['failed'].extend(failed)
+
+    def fetch(job):
+        batch, start = job
+        try:
+            frames, empty, failed = fetch_ticker_frames(batch, period, interval, start, limiter)
+        except RateLimitError:
+            raise
+        except Exception:
+            note(failed=batch)
+            raise
+        instrumentation.count('tickers_returned', len(frames))
+        instrumentation.count('tickers_empty', len(empty))
+        instrumentation.count('tickers_failed', len(failed))
+        # a refresh that brings no new bars says nothing about the ticker
+        note([frame['Ticker'].iloc[0] for frame in frames], empty if start is None else (), failed)
+        return frames
+
+    for (batch, start), frames, error in run_batches(batches, fetch, max_workers=max_workers, limiter=limiter):
+        instrumentation.count('tickers_requested', len(batch))
+        if error is not None:
+            instrumentation.count('tickers_failed', len(batch))
+        yield batch, start, frames, error
+
+    if health is not None:
+        has_data = has_data or bool(outcomes['returned'])
+        health.record(outcomes['returned'], outcomes['empty'] if has_data else (), outcomes['failed'])
+        health.save()
+
+# downloads the bars for every ticker of the selected indices, returns the compact OHLCV frame
+# together with the company info lookup table (indexed by ticker). bars already in the on-disk cache
+# are reused and only the bars after the last cached one are fetched for those tickers. downloads go through
+# the process wide rate limiter unless a limiter is passed
+def download_index_data(selected_indices, period, interval, use_cache=True,
+                        batch_size=BATCH_SIZE, max_workers=MAX_CONCURRENT_BATCHES, limiter=None):
+    prepared = prepare_download(selected_indices, period, interval, use_cache)
+    if prepared is None:
+        return None, None
+    tickers, company_info, cache, plan = prepared
     
+    batches = plan_batches(plan, batch_size)
     all_frames = []
-    all_company_info = {}
+    failed_batches = 0
     
-    progress_bar = st.progress(0)
-    status_text = st.empty()
-    
-    for batch_num, batch in enumerate(batches):
-        status_text.text(f"Processing batch {batch_num + 1}/{len(batches)} ({len(batch)} stocks)...")
-        
-        batch_frames, batch_info = download_batch(batch, period, interval, ticker_info_dict)
-        
-        all_frames.extend(batch_frames)
-        all_company_info.update(batch_info)
-        
-        progress_bar.progress((batch_num + 1) / len(batches))
+    progress = reporting.progress()
+
+    limiter = limiter or get_shared_limiter()
+    throttled_before = limiter.stats['throttled']
+    health = get_ticker_health() if use_cache else None
+    has_data = bool(plan.fresh or plan.stale)
+    completed = iter_downloaded_batches(batches, period, interval, max_workers, limiter, health, has_data)
+    for batch_num, (batch, _, batch_frames, error) in enumerate(completed):
+        if error is not None:
+            failed_batches += 1
+        else:
+            all_frames.extend(batch_frames)
         
-        time.sleep(1) # to prevent rate limiting :)
+        progress.update((batch_num + 1) / len(batches), f"Processed batch {batch_num + 1}/{len(batches)} ({len(batch)} stocks)...")
+
+    progress.close()
 
-    progress_bar.empty()
-    status_text.empty()
+    if failed_batches:
+        reporting.warning(f"{failed_batches} of {len(batches)} batches failed to download (throttled {limiter.stats['throttled'] - throttled_before} times)")
+
+    with instrumentation.stage('concat'):
+        new_bars = pd.concat(all_frames, ignore_index=True) if all_frames else None
+    if use_cache:
+        with instrumentation.stage('cache_store'):
+            cache.store(new_bars, period, interval, plan.missing, list(plan.stale))
+        with instrumentation.stage('cache_read'):
+            combined_df = cache.read(tickers, period, interval)
+    else:
+        combined_df = new_bars
     
-    if all_frames:
-        combined_df = pd.concat(all_frames, ignore_index=True)
-        st.success(f"Successfully downloaded data for {len(all_frames)} stocks with company information")
-        return combined_df
+    if combined_df is not None and not combined_df.empty:
+        with instrumentation.stage('compact'):
+            combined_df = compact_ohlcv(combined_df)
+        loaded_tickers = combined_df['Ticker'].cat.categories
+        company_info = company_info.reindex(loaded_tickers).rename_axis('Ticker')
+        reporting.success(f"Successfully downloaded data for {len(loaded_tickers)} stocks with company information")
+        return combined_df, company_info
     else:
-        st.error("No data collected")
-        return None
+        reporting.error("No data collected")
+        return None, None
+
+# the compiled index over all the ticker files (built on first use, rebuilt when a file changes). the
+# file paths are relative to this directory so the loader works from any working directory (cron, workers)
+def get_universe():
+    return load_universe({
+        index_name: os.path.join(APP_DIR, config['file_path']) for index_name, config in INDEX_CONFIGS.items()
+    })
+
+# ids (in the compiled universe) of the tickers listed by any of the selected indices, duplicates removed
+def select_universe_ids(selected_indices):
+    known_indices = []
+    for index_name in selected_indices:
+        if index_name.upper() in INDEX_CONFIGS:
+            known_indices.append(index_name)
+        else:
+            reporting.error(f"Index {index_name} not found in configurations")
 
-def load_index_tickers(index_name):
     try:
-        config = INDEX_CONFIGS.get(index_name.upper())
-        if not config:
-            st.error(f"Index {index_name} not found in configurations")
-            return [], {}
-            
-        file_path = config['file_path']
-        
-        df = pd.read_csv(file_path)
-        ticker_info_dict = {}
-        for _, row in df.iterrows():
-            ticker_info_dict[row['Symbol']] = {
-                'Company Name': row['Company Name'],
-                'Sector': row['Sector']
-            }
-        
-        tickers = df['Symbol'].dropna().tolist()
-        st.info(f"Loaded {len(tickers)} tickers from {index_name}")
-        return tickers, ticker_info_dict
-        
+        universe = get_universe()
     except Exception as e:
-        st.error(f"Error loading {index_name} tickers from {file_path}: {e}")
+        reporting.error(f"Error loading tickers for {', '.join(selected_indices)}: {e}")
+        return None, np.array([], dtype=np.int64)
+
+    for index_name in known_indices:
+        reporting.info(f"Loaded {len(universe.ids([index_name]))} tickers from {index_name}")
+    return universe, universe.ids(known_indices)
+
+def load_index_tickers(index_name):
+    universe, ids = select_universe_ids([index_name])
+    if universe is None:
         return [], {}
+    return universe.symbols[ids].tolist(), universe.info_dict(ids)
 
 def get_index_tickers_and_info(index_name):
     try:
         return load_index_tickers(index_name)
         
     except Exception as e:
-        st.error(f"Error fetching {index_name} tickers: {e}")
+        reporting.error(f"Error fetching {index_name} tickers: {e}")
         return [], {}
 
 def get_combined_tickers_and_info(selected_indices):
-    all_tickers = []
-    combined_ticker_info = {}
-    
-    for index_name in selected_indices:
-        tickers, ticker_info = get_index_tickers_and_info(index_name)
-        if tickers:
-            all_tickers.extend(tickers)
-            combined_ticker_info.update(ticker_info)
-    
-    unique_tickers = list(dict.fromkeys(all_tickers))
-    
-    return unique_tickers, combined_ticker_info
+    universe, ids = select_universe_ids(selected_indices)
+    if universe is None:
+        return [], {}
+    return universe.symbols[ids].tolist(), universe.info_dict(ids)
+
+# tickers of the selected indices (duplicates removed) together with their company info lookup table
+def get_tickers_and_company_info(selected_indices):
+    universe, ids = select_universe_ids(selected_indices)
+    if universe is None:
+        return [], None
+    return universe.symbols[ids].tolist(), universe.company_info(ids)
@@ -0,0 +1,215 @@
+import hashlib
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+import pandas as pd
+from utils import memory_footprint
+
+# memory the loaded datasets of every session may take before the least recently used ones are spilled to disk
+DEFAULT_MAX_MB = int(os.environ.get('SCREENER_DATA_STORE_MB', 1024))
+
+# datasets nobody used for this long are dropped (from memory and disk), their sessions have to load again
+IDLE_SECONDS = float(os.environ.get('SCREENER_DATA_STORE_IDLE_HOURS', 6)) * 3600
+
+SPILL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'datasets')
+
+# the frames of one load (raw bars, company info, summary), shared by every session that loaded the same data.
+# the frames are never changed once stored (a refresh stores a new dataset), so a spilled frame is written once
+# and read back as is. derived objects (e.g. the screening index) are rebuilt after a spill
+class Dataset:
+    def __init__(self, key, frames, spill_dir, label=None):
+        self.key = key
+        self.label = label or str(key)
+        self.frames = {name: frame for name, frame in frames.items() if frame is not None}
+        self.nbytes = {name: memory_footprint(frame) for name, frame in self.frames.items()}
+        self.derived = {}
+        self.object_columns = {}
+        self.spilled = False
+        self.path = os.path.join(spill_dir, hashlib.blake2b(repr(key).encode(), digest_size=8).hexdigest())
+        self.last_used = 0.0
+
+    @property
+    def total_bytes(self):
+        return sum(self.nbytes.values())
+
+    def names(self):
+        return list(self.nbytes)
+
+    def _frame_path(self, name):
+        return os.path.join(self.path, f"{name}.parquet")
+
+    # writes the frames to parquet (once) and lets go of them. text columns come back from parquet as the
+    # string dtype, the ones that were python objects are put back as such on reload
+    def spill(self):
+        os.makedirs(self.path, exist_ok=True)
+        for name, frame in self.frames.items():
+            self.object_columns[name] = [column for column, dtype in frame.dtypes.items() if dtype == object]
+            if not os.path.exists(self._frame_path(name)):
+                frame.to_parquet(f"{self._frame_path(name)}.tmp")
+                os.replace(f"{self._frame_path(name)}.tmp", self._frame_path(name))
+        self.frames = {}
+        self.derived = {}
+        self.spilled = True
+
+    def reload(self):
+        self.frames = {
+            name: pd.read_parquet(self._frame_path(name)).astype({column: object for column in self.object_columns[name]})
+            for name in self.nbytes
+        }
+        self.spilled = False
+
+    def remove_files(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+# process wide store of the loaded datasets. sessions keep a dataset's key instead of its frames, so sessions that
+# loaded the same data share one copy and the store alone decides what stays in memory: past max_bytes the least
+# recently used datasets are spilled to disk and read back when a session asks for them again
+class DataStore:
+    def __init__(self, max_bytes=DEFAULT_MAX_MB * 1024 * 1024, spill_dir=SPILL_DIR, idle_seconds=IDLE_SECONDS,
+                 clock=time.time):
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self.idle_seconds = idle_seconds
+        self.clock = clock
+
+        self._datasets = OrderedDict()
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._stats = {'spills': 0, 'reloads': 0, 'dropped': 0, 'shared': 0}
+
+    # stores the frames ({name: frame}, None frames are left out) under key and returns the key. a key that is
+    # already stored keeps its frames, the same load is never held twice. label names the dataset in status()
+    def put(self, key, frames, label=None):
+        with self._lock:
+            if key in self._datasets:
+                self._stats['shared'] += 1
+                self._use(self._datasets[key])
+            else:
+                self._datasets[key] = Dataset(key, frames, self.spill_dir, label)
+                self._use(self._datasets[key])
+                self._drop_idle()
+                self._enforce_budget(keep=key)
+            return key
+
+    def has(self, key):
+        with self._lock:
+            return key in self._datasets
+
+    # bytes the frames of a dataset take (in memory or on disk), 0 for a dataset that was dropped
+    def size_of(self, key):
+        with self._lock:
+            dataset = self._datasets.get(key)
+            return 0 if dataset is None else dataset.total_bytes
+
+    # a frame of a dataset (read back from disk when it was spilled), None for a frame the dataset does not have
+    # or a dataset that was dropped
+    def get(self, key, name):
+        with self._lock:
+            dataset = self._datasets.get(key)
+            if dataset is None:
+                return None
+            if dataset.spilled:
+                dataset.reload()
+                self._stats['reloads'] += 1
+                self._enforce_budget(keep=key)
+            self._use(dataset)
+            return dataset.frames.get(name)
+
+    # an object built from a dataset's frames (build() is called once per dataset and kept until it is spilled)
+    def derived(self, key, name, build):
+        with self._lock:
+            dataset = self._datasets.get(key)
+            if dataset is not None and not dataset.spilled and name in dataset.derived:
+                return dataset.derived[name]
+        value = build()
+        with self._lock:
+            dataset = self._datasets.get(key)
+            if dataset is not None and not dataset.spilled:
+                dataset.derived[name] = value
+        return value
+
+    def _use(self, dataset):
+        dataset.last_used = self.clock()
+        self._datasets.move_to_end(dataset.key)
+
+    def _memory_bytes(self):
+        return sum(dataset.total_bytes for dataset in self._datasets.values() if not dataset.spilled)
+
+    # spills the least recently used datasets until the rest fits in max_bytes. keep (the dataset in use) stays
+    # in memory even when it is bigger than the budget on its own
+    def _enforce_budget(self, keep):
+        memory = self._memory_bytes()
+        for key, dataset in list(self._datasets.items()):
+            if memory <= self.max_bytes:
+                break
+            if key == keep or dataset.spilled:
+                continue
+            memory -= dataset.total_bytes
+            dataset.spill()
+            self._stats['spills'] += 1
+
+    def _drop_idle(self):
+        now = self.clock()
+        for key, dataset in list(self._datasets.items()):
+            if now - dataset.last_used > self.idle_seconds:
+                del self._datasets[key]
+                dataset.remove_files()
+                self._stats['dropped'] += 1
+        self._sessions = {session: key for session, key in self._sessions.items() if key in self._datasets}
+
+    # the dataset a session uses, for the memory shown per session
+    def attach(self, session_id, key):
+        with self._lock:
+            if key is None:
+                self._sessions.pop(session_id, None)
+            else:
+                self._sessions[session_id] = key
+
+    # memory of the session's dataset, the frames it has and how many sessions share it
+    def session_usage(self, session_id):
+        with self._lock:
+            key = self._sessions.get(session_id)
+            dataset = self._datasets.get(key)
+            if dataset is None:
+                return {'bytes': 0, 'in_memory': False, 'frames': [], 'sessions': 0}
+            return {
+                'bytes': dataset.total_bytes,
+                'in_memory': not dataset.spilled,
+                'frames': dataset.names(),
+                'sessions': sum(1 for session_key in self._sessions.values() if session_key == key),
+            }
+
+    def stats(self):
+        with self._lock:
+            memory = self._memory_bytes()
+            return {
+                **self._stats,
+                'datasets': len(self._datasets),
+                'sessions': len(self._sessions),
+                'memory_bytes': memory,
+                'disk_bytes': sum(dataset.total_bytes for dataset in self._datasets.values() if dataset.spilled),
+                'max_bytes': self.max_bytes,
+            }
+
+    # one row per dataset, most recently used first
+    def status(self):
+        with self._lock:
+            now = self.clock()
+            return [
+                {
+                    'Dataset': dataset.label,
+                    'Frames': ', '.join(dataset.names()),
+                    'Size': dataset.total_bytes,
+                    'Where': 'disk' if dataset.spilled else 'memory',
+                    'Sessions': sum(1 for session_key in self._sessions.values() if session_key == key),
+                    'Idle (s)': round(now - dataset.last_used),
+                }
+                for key, dataset in reversed(self._datasets.items())
+            ]
+
+_data_store = DataStore()
+
+def get_data_store():
+    return _data_store
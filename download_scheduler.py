@@ -0,0 +1,99 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import instrumentation
+
+# raised by a batch fetch when the data provider is throttling us
+class RateLimitError(Exception):
+    pass
+
+# token bucket whose refill rate adapts AIMD style: every healthy batch adds `increase` batches/sec,
+# every throttled one multiplies the rate by `decrease` and pauses all workers for `cooldown` seconds
+class AIMDRateLimiter:
+    def __init__(self, rate=1.0, min_rate=0.1, max_rate=8.0, increase=0.25, decrease=0.5, burst=2, cooldown=2.0):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.burst = burst
+        self.cooldown = cooldown
+
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+        self.stats = {'acquired': 0, 'throttled': 0, 'waited': 0.0}
+
+    # blocks until a batch is allowed to start
+    def acquire(self):
+        started = time.monotonic()
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now >= self._paused_until:
+                    self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                    self._updated = now
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        self.stats['acquired'] += 1
+                        self.stats['waited'] += now - started
+                        return
+                    wait = (1 - self._tokens) / self.rate
+                else:
+                    wait = self._paused_until - now
+            time.sleep(wait)
+
+    def on_success(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def on_throttle(self):
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            self._tokens = 0
+            self._paused_until = max(self._paused_until, time.monotonic() + self.cooldown)
+            self.stats['throttled'] += 1
+
+# one limiter for every download of the process (user loads and background refreshes alike), the provider
+# throttles by client so they share its rate and back off together
+_shared_limiter = AIMDRateLimiter()
+
+def get_shared_limiter():
+    return _shared_limiter
+
+# runs fetch(job) for every job on a bounded worker pool, each call going through the rate limiter.
+# throttled jobs are retried (up to max_retries times) after the limiter has backed off. results are
+# yielded in completion order as (job, result, error) so the caller can update its progress as they arrive.
+# the workers record into the load the calling thread is recording
+def run_batches(jobs, fetch, max_workers=4, limiter=None, max_retries=3):
+    limiter = limiter or AIMDRateLimiter()
+    load = instrumentation.current_load()
+
+    def run(job):
+        instrumentation.set_current_load(load)
+        for attempt in range(max_retries + 1):
+            limiter.acquire()
+            try:
+                result = fetch(job)
+            except RateLimitError:
+                limiter.on_throttle()
+                if attempt == max_retries:
+                    raise
+                load.count('retries')
+                continue
+            limiter.on_success()
+            return result
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        futures = {executor.submit(run, job): job for job in jobs}
+        for future in as_completed(futures):
+            # finished futures are dropped right away so a result is freed once the caller is done with it
+            job = futures.pop(future)
+            try:
+                result = future.result()
+            except Exception as e:
+                yield job, None, e
+            else:
+                yield job, result, None
+            del future
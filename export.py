@@ -0,0 +1,108 @@
+import hashlib
+import io
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from shared_cache import SharedResultCache
+
+# formats the results can be exported in: mime type and file extension
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+    'arrow': ('application/vnd.apache.arrow.file', 'arrow'),
+}
+EXPORT_FORMAT_LABELS = {'csv': "CSV", 'parquet': "Parquet", 'arrow': "Arrow IPC"}
+
+# memory the finished export files may take, shared by every session (same expiry per interval as the results)
+EXPORT_CACHE_MB = int(os.environ.get('SCREENER_EXPORT_CACHE_MB', 128))
+
+# tickers whose raw bars are converted and written at a time, so exporting the bars of a big screen only
+# ever holds one chunk of them besides the file being written
+RAW_BARS_CHUNK_TICKERS = 500
+
+# fingerprint of a frame's columns, dtypes and values (not its index), equal frames give equal fingerprints
+def frame_fingerprint(df):
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(repr([(column, str(dtype)) for column, dtype in df.dtypes.items()]).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+# writes frames (all with the same columns) one after the other to a binary file in one of EXPORT_FORMATS.
+# the first frame fixes the arrow schema, the later ones are cast to it
+def write_frames(frames, sink, file_format):
+    if file_format == 'csv':
+        for i, frame in enumerate(frames):
+            sink.write(frame.to_csv(index=False, header=i == 0).encode())
+        return
+
+    writer, schema = None, None
+    try:
+        for frame in frames:
+            table = pa.Table.from_pandas(frame, schema=schema, preserve_index=False)
+            if writer is None:
+                schema = table.schema
+                writer = pq.ParquetWriter(sink, schema) if file_format == 'parquet' else pa.ipc.new_file(sink, schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+
+# the frame as an export file in memory
+def export_frame(df, file_format):
+    buffer = io.BytesIO()
+    write_frames([df], buffer, file_format)
+    return buffer.getvalue()
+
+# the bars of the tickers in chunks of chunk_tickers, from the loaded raw bars or, when the load kept none
+# (a streamed load), from the OHLCV cache (bars_from_cache(tickers) -> frame). the ticker column is plain text
+# so every chunk has the same schema
+def iter_raw_bar_chunks(tickers, raw_data=None, bars_from_cache=None, chunk_tickers=RAW_BARS_CHUNK_TICKERS):
+    if raw_data is not None:
+        # chunk of every bar (-1 for tickers not exported), one stable sort then lines the bars up chunk by chunk
+        chunk_of = pd.Index(tickers).get_indexer(raw_data['Ticker'].astype(object)) // chunk_tickers
+        rows = np.flatnonzero(chunk_of >= 0)
+        rows = rows[np.argsort(chunk_of[rows], kind='stable')]
+        bounds = np.searchsorted(chunk_of[rows], np.arange(-(-len(tickers) // chunk_tickers) + 1))
+    for i, start in enumerate(range(0, len(tickers), chunk_tickers)):
+        if raw_data is not None:
+            bars = raw_data.iloc[rows[bounds[i]:bounds[i + 1]]]
+        else:
+            bars = bars_from_cache(list(tickers[start:start + chunk_tickers]))
+        if not bars.empty:
+            yield bars.astype({'Ticker': object})
+
+# the raw bars export: written chunk by chunk to a temporary file, then read back as the file to download
+def export_raw_bars(chunks, file_format):
+    with tempfile.TemporaryFile() as temp_file:
+        write_frames(chunks, temp_file, file_format)
+        temp_file.seek(0)
+        return temp_file.read()
+
+# builds export files on demand and keeps them by fingerprint, so the same screen is converted once however
+# many sessions or clicks ask for it
+class ExportCache:
+    def __init__(self, max_bytes=EXPORT_CACHE_MB * 1024 * 1024):
+        self.files = SharedResultCache(max_bytes=max_bytes)
+
+    # the screened rows as a file_format export
+    def frame(self, df, file_format, interval=None):
+        key = ('frame', frame_fingerprint(df), file_format)
+        return self.files.get_or_load(key, interval, lambda: export_frame(df, file_format), len)
+
+    # the raw bars of the screened tickers, as_of tells loads of the same tickers apart
+    def raw_bars(self, tickers, file_format, as_of, interval=None, raw_data=None, bars_from_cache=None):
+        tickers = list(tickers)
+        key = ('raw_bars', frame_fingerprint(pd.DataFrame({'Ticker': tickers})), as_of, file_format)
+        load = lambda: export_raw_bars(iter_raw_bar_chunks(tickers, raw_data, bars_from_cache), file_format)
+        return self.files.get_or_load(key, interval, load, len)
+
+    def stats(self):
+        return self.files.stats()
+
+_export_cache = ExportCache()
+
+def get_export_cache():
+    return _export_cache
@@ -0,0 +1,249 @@
+import numpy as np
+import pandas as pd
+import instrumentation
+import reporting
+from analysis import summarise_ohlcv
+from data_loader import plan_batches, iter_downloaded_batches
+from download_scheduler import get_shared_limiter
+from metrics import METRICS, MetricContext, period_sum_inputs
+from ohlcv_cache import OHLCVCache, CachePlan
+from ticker_health import get_ticker_health
+from utils import to_naive_utc, compact_ohlcv
+
+# bars of each ticker kept in the state: enough for the longest window (ATR, the windowed metrics) plus the bar
+# before it, whose close the first bar of the window needs. whole period values are carried as running sums
+def tail_bars(atr_period=14, metrics=None):
+    names = METRICS if metrics is None else metrics
+    windows = [METRICS[name].window for name in names if METRICS[name].window is not None]
+    return max([atr_period] + windows) + 2
+
+# the price and volume columns kept per bar
+STATE_FIELDS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+# what updating a summary needs per ticker after a load, in arrays with a row per ticker: its last few bars
+# (tail, oldest first), the whole period sums of the summary (see period_sum_inputs) and what its last bar added
+# to them (the last bar is replaced when a revised one comes in). update() then works on the few bars of the
+# tickers with new bars instead of every bar of the period. bars are only ever added, the period is extended
+# (not rolled) until the next full load
+class SummaryState:
+    def __init__(self, tickers, fields, dates, length, period_sums, last_values, atr_period=14, metrics=None):
+        self.tickers = tickers              # pd.Index, the ticker of every row
+        self.fields = fields                # {field: (tickers, tail_bars) float64}
+        self.dates = dates                  # (tickers, tail_bars) datetime64, naive UTC
+        self.length = length                # bars in the tail of each ticker
+        self.period_sums = period_sums      # {intermediate: (sums, counts)} per row
+        self.last_values = last_values      # {intermediate: value of the last bar} per row
+        self.atr_period = atr_period
+        self.metrics = metrics
+
+    @classmethod
+    def from_bars(cls, raw_data, atr_period=14, metrics=None):
+        ctx = MetricContext(raw_data)
+        size = tail_bars(atr_period, metrics)
+        length = np.minimum(ctx.bar_count_by_code, size)
+
+        # bar k from the end of a ticker goes to slot length - 1 - k of its row
+        in_tail = np.flatnonzero(ctx.bars_from_end < size)
+        codes = ctx.codes[in_tail]
+        slots = length[codes] - 1 - ctx.bars_from_end[in_tail]
+        fields = {}
+        for field in STATE_FIELDS:
+            values = ctx.volume if field == 'Volume' else ctx.prices[field].to_numpy()
+            fields[field] = np.full((ctx.n_tickers, size), np.nan)
+            fields[field][codes, slots] = values[in_tail]
+        dates = np.full((ctx.n_tickers, size), np.datetime64('NaT'), dtype='datetime64[ns]')
+        dates[codes, slots] = to_naive_utc(raw_data['Date']).to_numpy()[in_tail]
+
+        period_sums = {name: ctx.window_sum(name) for name in period_sum_inputs(metrics)}
+        last_values = {name: ctx.latest(name) for name in period_sums}
+        tickers = pd.Index(np.asarray(ctx.ticker_names, dtype=object))
+        return cls(tickers, fields, dates, length, period_sums, last_values, atr_period, metrics)
+
+    def __len__(self):
+        return len(self.tickers)
+
+    # timestamp of the last bar of every row (NaT for rows without bars)
+    def last_dates(self):
+        last = self.dates[np.arange(len(self)), np.maximum(self.length - 1, 0)]
+        return np.where(self.length > 0, last, np.datetime64('NaT'))
+
+    # {ticker: timestamp of its last bar}, where the next fetch of each ticker starts
+    def last_bar_times(self):
+        last = self.last_dates()
+        has_bars = self.length > 0
+        return dict(zip(self.tickers[has_bars], pd.DatetimeIndex(last[has_bars])))
+
+    # adds rows for tickers the state has not seen yet
+    def _add_tickers(self, tickers):
+        count = len(tickers)
+        self.tickers = self.tickers.append(pd.Index(tickers, dtype=object))
+        for field, values in self.fields.items():
+            self.fields[field] = np.vstack([values, np.full((count, values.shape[1]), np.nan)])
+        self.dates = np.vstack([self.dates, np.full((count, self.dates.shape[1]), np.datetime64('NaT'), dtype=self.dates.dtype)])
+        self.length = np.concatenate([self.length, np.zeros(count, dtype=self.length.dtype)])
+        for name, (sums, counts) in self.period_sums.items():
+            self.period_sums[name] = (np.concatenate([sums, np.zeros(count)]), np.concatenate([counts, np.zeros(count, dtype=counts.dtype)]))
+            self.last_values[name] = np.concatenate([self.last_values[name], np.full(count, np.nan)])
+
+    # folds new bars into the state and returns (summary rows of the tickers that got any, the bars applied).
+    # a bar at the time of a ticker's last bar replaces it (the last bar is usually still forming when it is
+    # fetched), bars older than that are ignored
+    def update(self, new_bars, company_info=None):
+        new_bars = _bar_frame(new_bars)
+        unknown = pd.Index(new_bars['Ticker'].unique()).difference(self.tickers)
+        if len(unknown):
+            self._add_tickers(unknown)
+
+        rows = self.tickers.get_indexer(new_bars['Ticker'])
+        dates = new_bars['Date'].to_numpy()
+        last_dates = self.last_dates()
+        keep = np.isnat(last_dates[rows]) | (dates >= last_dates[rows])
+        new_bars = new_bars[keep]
+        if new_bars.empty:
+            empty = _price_frame({field: np.empty(0) for field in STATE_FIELDS}, np.empty(0, dtype=np.int64), [])
+            return summarise_ohlcv(empty, company_info, self.atr_period, self.metrics), new_bars
+
+        # new bars grouped by row in time order, one bar per timestamp (the last one fetched)
+        order = np.lexsort((new_bars['Date'].to_numpy(), rows[keep]))
+        new_bars = new_bars.iloc[order]
+        bar_rows = rows[keep][order]
+        bar_dates = new_bars['Date'].to_numpy()
+        is_last_of_date = np.r_[(bar_rows[1:] != bar_rows[:-1]) | (bar_dates[1:] != bar_dates[:-1]), True]
+        new_bars, bar_rows, bar_dates = new_bars[is_last_of_date], bar_rows[is_last_of_date], bar_dates[is_last_of_date]
+
+        changed, first_bar, new_count = np.unique(bar_rows, return_index=True, return_counts=True)
+        replaces_last = bar_dates[first_bar] == last_dates[changed]
+
+        # the new tail of every changed row: the old bars it keeps, then its new bars, the last `size` of them
+        size = self.dates.shape[1]
+        kept = self.length[changed] - replaces_last
+        combined = kept + new_count
+        new_length = np.minimum(combined, size)
+        combined_index = (combined - new_length)[:, None] + np.arange(size)[None, :]
+        is_valid = np.arange(size)[None, :] < new_length[:, None]
+        from_old = combined_index < kept[:, None]
+        is_new = is_valid & ~from_old
+        old_slot = np.clip(combined_index, 0, size - 1)
+        new_position = np.clip(first_bar[:, None] + combined_index - kept[:, None], 0, len(new_bars) - 1)
+
+        def gather(old_values, new_values, empty):
+            values = np.where(from_old, old_values[changed[:, None], old_slot], new_values[new_position])
+            return np.where(is_valid, values, empty)
+
+        for field in STATE_FIELDS:
+            self.fields[field][changed] = gather(self.fields[field], new_bars[field].to_numpy(dtype='float64'), np.nan)
+        self.dates[changed] = gather(self.dates, bar_dates, np.datetime64('NaT'))
+        self.length[changed] = new_length
+
+        # the changed tickers in ticker order, as long bars for the summary
+        names = self.tickers[changed].to_numpy()
+        by_name = np.argsort(names, kind='stable')
+        changed, names, is_valid, is_new, replaces_last = (
+            changed[by_name], names[by_name], is_valid[by_name], is_new[by_name], replaces_last[by_name]
+        )
+        bars = _price_frame({field: self.fields[field][changed][is_valid] for field in STATE_FIELDS},
+                            np.repeat(np.arange(len(changed)), is_valid.sum(axis=1)), names)
+        ctx = MetricContext(bars)
+
+        # the period sums lose what a replaced last bar added and gain what the new bars add
+        added = is_new[is_valid]
+        added_codes = ctx.codes[added]
+        period_sums = {}
+        for name, (sums, counts) in self.period_sums.items():
+            values = ctx.get(name)
+            replaced_value = np.where(replaces_last, self.last_values[name][changed], np.nan)
+            has_value = ~np.isnan(values[added])
+            sums[changed] += np.bincount(added_codes[has_value], weights=values[added][has_value], minlength=len(changed))
+            sums[changed] -= np.nan_to_num(replaced_value)
+            counts[changed] += np.bincount(added_codes[has_value], minlength=len(changed))
+            counts[changed] -= ~np.isnan(replaced_value)
+            self.last_values[name][changed] = ctx.latest(name)
+            period_sums[name] = (pd.Series(sums[changed], index=names), pd.Series(counts[changed], index=names))
+
+        ctx.use_period_sums(period_sums)
+        rows = summarise_ohlcv(bars, company_info, self.atr_period, self.metrics, ctx=ctx)
+        return rows, new_bars
+
+# long bars frame (prices, volume and a categorical ticker) for MetricContext, codes index the sorted names
+def _price_frame(fields, codes, names):
+    frame = pd.DataFrame(fields)
+    frame['Ticker'] = pd.Categorical.from_codes(codes, categories=pd.Index(names, dtype=object))
+    return frame
+
+# bars as a plain frame (string tickers, naive UTC dates, float64 prices) the state can take apart freely
+def _bar_frame(bars):
+    columns = [column for column in ['Ticker', 'Date', 'Open', 'High', 'Low', 'Close', 'Adj Close', 'Volume'] if column in bars.columns]
+    bars = bars[columns].copy()
+    bars['Ticker'] = bars['Ticker'].astype(object)
+    bars['Date'] = to_naive_utc(bars['Date'])
+    for column in columns[2:]:
+        bars[column] = bars[column].astype('float64')
+    return bars.reset_index(drop=True)
+
+# the summary with the given rows swapped in (rows of tickers it did not have are appended), as a new frame so
+# anything keyed on the old one (the screening index) is rebuilt
+def merge_summary_rows(summary, rows):
+    if rows.empty:
+        return summary
+    merged = summary.copy()
+    positions = pd.Index(summary['Ticker']).get_indexer(rows['Ticker'])
+    is_known = positions >= 0
+    for column in summary.columns:
+        values = merged[column].to_numpy(copy=True)
+        values[positions[is_known]] = rows[column].to_numpy()[is_known]
+        merged[column] = values
+    if not is_known.all():
+        merged = pd.concat([merged, rows[~is_known]], ignore_index=True)
+    return merged
+
+# the raw bars with the new ones appended (a bar at the time of a ticker's last bar replaces it)
+def append_bars(raw_data, new_bars):
+    if new_bars.empty:
+        return raw_data
+    tickers = raw_data['Ticker'].astype('category')
+    first_new = new_bars.groupby('Ticker')['Date'].min().reindex(tickers.cat.categories).to_numpy()
+    keep = ~(raw_data['Date'].to_numpy() >= first_new[tickers.cat.codes.to_numpy()])
+    combined = pd.concat([raw_data[keep], new_bars.reindex(columns=raw_data.columns)], ignore_index=True)
+    return compact_ohlcv(combined)
+
+# fetches only the bars from each ticker's last known bar on (batched by cache bucket like a load, through the
+# shared rate limiter) and stores them in the on-disk cache. returns the new bars, None when nothing came back
+def fetch_new_bars(state, period, interval, use_cache=True, limiter=None):
+    plan = CachePlan([], state.last_bar_times(), [])
+    batches = plan_batches(plan)
+    frames = []
+    failed_batches = 0
+    progress = reporting.progress()
+    health = get_ticker_health() if use_cache else None
+    completed = iter_downloaded_batches(batches, period, interval, limiter=limiter or get_shared_limiter(), health=health)
+    for batch_num, (batch, _, batch_frames, error) in enumerate(completed):
+        if error is not None:
+            failed_batches += 1
+        else:
+            frames.extend(batch_frames)
+        progress.update((batch_num + 1) / len(batches), f"Refreshed batch {batch_num + 1}/{len(batches)}...")
+    progress.close()
+
+    if failed_batches:
+        reporting.warning(f"{failed_batches} of {len(batches)} batches failed to refresh")
+    if not frames:
+        return None
+    new_bars = pd.concat(frames, ignore_index=True)
+    if use_cache:
+        OHLCVCache().store(new_bars, period, interval, [], list(plan.stale))
+    return new_bars
+
+# brings a loaded summary up to date: fetches the bars after each ticker's last one, folds them into the state
+# and swaps the updated rows in. returns (summary, raw_data, new bar count), raw_data (None when the raw bars
+# are not kept in memory) gets the new bars appended
+def refresh_summary(summary, state, period, interval, company_info=None, raw_data=None, use_cache=True):
+    new_bars = fetch_new_bars(state, period, interval, use_cache)
+    if new_bars is None:
+        return summary, raw_data, 0
+    with instrumentation.stage('summary'):
+        rows, applied = state.update(new_bars, company_info)
+    if raw_data is not None:
+        with instrumentation.stage('concat'):
+            raw_data = append_bars(raw_data, applied)
+    reporting.success(f"Refreshed {len(rows)} stocks with {len(applied)} new bars")
+    return merge_summary_rows(summary, rows), raw_data, len(applied)
@@ -0,0 +1,292 @@
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+logger = logging.getLogger('screener')
+
+# one JSON line per finished load, a child of the screener logger so it goes wherever that is configured to
+load_logger = logging.getLogger('screener.loads')
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# prometheus text file the metrics are written to (for the node exporter's textfile collector or any scraper
+# that reads files), an empty SCREENER_METRICS_FILE turns it off
+METRICS_FILE = os.environ.get('SCREENER_METRICS_FILE', os.path.join(APP_DIR, '.cache', 'metrics', 'screener.prom'))
+
+# finished loads rewrite the metrics file right away, renders (one per rerun) at most this often
+METRICS_WRITE_SECONDS = 15.0
+
+# finished records kept for the debug panel
+RECENT_RECORDS = 20
+
+# the counters every load reports (others can be counted too). tickers requested from the provider end up as
+# returned (with bars), empty (no bars) or failed (still failing after the retries), tickers the on-disk cache
+# served without a request are cache hits and the ones in the negative cache are skipped. retries are requests
+# repeated after the provider throttled or a download failed
+COUNTERS = [
+    'tickers_requested', 'tickers_returned', 'tickers_empty', 'tickers_failed', 'tickers_skipped', 'retries',
+    'cache_hits',
+]
+
+# peak resident set size of the process in MB. on linux the peak can be reset (through /proc/self/clear_refs)
+# so it is the peak since the reset, elsewhere it is the peak since the process started
+def reset_peak_rss():
+    try:
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')
+        return True
+    except OSError:
+        return False
+
+def peak_rss_mb():
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+# stages running in any thread. the peak is process wide, so before a stage resets it the peak so far is
+# handed to every stage still running, nested and concurrent stages then each see the peak over their own run
+_open_stages = []
+_open_stages_lock = threading.Lock()
+
+class _StageRun:
+    def __init__(self):
+        self.peak_mb = 0.0
+
+    def start(self):
+        with _open_stages_lock:
+            peak = peak_rss_mb()
+            for stage in _open_stages:
+                stage.peak_mb = max(stage.peak_mb, peak)
+            reset_peak_rss()
+            _open_stages.append(self)
+
+    def stop(self):
+        with _open_stages_lock:
+            self.peak_mb = max(self.peak_mb, peak_rss_mb())
+            _open_stages.remove(self)
+
+# what one load (or refresh, or render) spent where: per stage the wall time summed over its calls (download
+# and extract run once per batch, several batches at a time), the number of calls and the highest process RSS
+# seen during them, plus the counters. safe to use from the download worker threads
+class LoadMetrics:
+    def __init__(self, kind, clock=time.time, **labels):
+        self.kind = kind
+        self.labels = labels
+        self.clock = clock
+        self.started = clock()
+        self.wall_s = None
+        self.failed = False
+        self.stages = {}
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name):
+        run = _StageRun()
+        run.start()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            run.stop()
+            with self._lock:
+                stage = self.stages.setdefault(name, {'wall_s': 0.0, 'calls': 0, 'peak_rss_mb': 0.0})
+                stage['wall_s'] += elapsed
+                stage['calls'] += 1
+                stage['peak_rss_mb'] = max(stage['peak_rss_mb'], run.peak_mb)
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def label(self, name, value):
+        self.labels[name] = value
+
+    def finish(self, failed=False):
+        self.wall_s = self.clock() - self.started
+        self.failed = failed
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                'event': self.kind,
+                'started': round(self.started, 3),
+                'wall_s': None if self.wall_s is None else round(self.wall_s, 6),
+                'failed': self.failed,
+                **self.labels,
+                'stages': {
+                    name: {'wall_s': round(stage['wall_s'], 6), 'calls': stage['calls'],
+                           'peak_rss_mb': round(stage['peak_rss_mb'], 1)}
+                    for name, stage in self.stages.items()
+                },
+                'counters': dict(self.counters),
+            }
+
+# stands in when no load is being recorded, stages just run
+class NoLoadMetrics:
+    @contextmanager
+    def stage(self, name):
+        yield
+
+    def count(self, name, n=1):
+        pass
+
+    def label(self, name, value):
+        pass
+
+# totals over every finished record of the process, by kind, and the last few records for the debug panel
+class MetricsRegistry:
+    def __init__(self, path=METRICS_FILE, write_interval=METRICS_WRITE_SECONDS, clock=time.time):
+        self.path = path
+        self.write_interval = write_interval
+        self.clock = clock
+        self.recent = deque(maxlen=RECENT_RECORDS)
+        self._totals = {}
+        self._last_written = None
+        self._lock = threading.Lock()
+
+    def add(self, metrics):
+        record = metrics.as_dict()
+        with self._lock:
+            self.recent.append(record)
+            totals = self._totals.setdefault(metrics.kind, {
+                'records': 0, 'failed': 0, 'wall_s': 0.0, 'last_wall_s': 0.0, 'last_finished': 0.0,
+                'stages': {}, 'counters': {},
+            })
+            totals['records'] += 1
+            totals['failed'] += record['failed']
+            totals['wall_s'] += record['wall_s']
+            totals['last_wall_s'] = record['wall_s']
+            totals['last_finished'] = record['started'] + record['wall_s']
+            for name, stage in record['stages'].items():
+                stage_totals = totals['stages'].setdefault(name, {'wall_s': 0.0, 'calls': 0, 'peak_rss_mb': 0.0})
+                stage_totals['wall_s'] += stage['wall_s']
+                stage_totals['calls'] += stage['calls']
+                stage_totals['peak_rss_mb'] = stage['peak_rss_mb']
+            for name, value in record['counters'].items():
+                totals['counters'][name] = totals['counters'].get(name, 0) + value
+
+            now = self.clock()
+            due = metrics.kind != 'render' or self._last_written is None or now - self._last_written >= self.write_interval
+            if self.path and due:
+                self._last_written = now
+                self._write()
+        return record
+
+    def recent_records(self, kind=None):
+        with self._lock:
+            return [record for record in reversed(self.recent) if kind is None or record['event'] == kind]
+
+    # the totals in the prometheus text exposition format
+    def prometheus_text(self):
+        with self._lock:
+            return self._prometheus_text()
+
+    def _prometheus_text(self):
+        families = {}
+
+        def sample(name, kind, help_text, labels, value):
+            family = families.setdefault(name, (kind, help_text, []))
+            label_text = ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items())
+            family[2].append(f"{name}{{{label_text}}} {value}")
+
+        for kind, totals in self._totals.items():
+            sample('screener_loads_total', 'counter', "Finished loads, refreshes and renders", {'kind': kind}, totals['records'])
+            sample('screener_load_failures_total', 'counter', "Loads that raised", {'kind': kind}, totals['failed'])
+            sample('screener_load_seconds_total', 'counter', "Wall time of the loads", {'kind': kind}, totals['wall_s'])
+            sample('screener_last_load_seconds', 'gauge', "Wall time of the last load", {'kind': kind}, totals['last_wall_s'])
+            sample('screener_last_load_timestamp_seconds', 'gauge', "When the last load finished", {'kind': kind},
+                   totals['last_finished'])
+            for stage, stage_totals in totals['stages'].items():
+                labels = {'kind': kind, 'stage': stage}
+                sample('screener_stage_seconds_total', 'counter', "Wall time per stage, summed over its calls", labels,
+                       stage_totals['wall_s'])
+                sample('screener_stage_calls_total', 'counter', "Calls per stage", labels, stage_totals['calls'])
+                sample('screener_stage_peak_rss_bytes', 'gauge', "Peak process RSS during the stage in the last load",
+                       labels, stage_totals['peak_rss_mb'] * 1024 * 1024)
+            for counter, value in totals['counters'].items():
+                sample(f"screener_{counter}_total", 'counter', counter.replace('_', ' ').capitalize(), {'kind': kind}, value)
+
+        lines = []
+        for name, (kind, help_text, samples) in families.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(samples)
+        return '\n'.join(lines) + '\n'
+
+    # written to a temporary file and renamed, a scraper never reads half a file
+    def _write(self):
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with open(f"{self.path}.tmp", 'w') as metrics_file:
+                metrics_file.write(self._prometheus_text())
+            os.replace(f"{self.path}.tmp", self.path)
+        except OSError as e:
+            logger.warning(f"Could not write the metrics file {self.path}: {e}")
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+_registry = MetricsRegistry()
+_no_load = NoLoadMetrics()
+_thread = threading.local()
+
+def get_metrics_registry():
+    return _registry
+
+# the load the calling thread is recording, one that records nothing when there is none
+def current_load():
+    return getattr(_thread, 'load', None) or _no_load
+
+# the load for the calling thread (None for none), worker threads set the load of the thread that started them
+def set_current_load(load):
+    _thread.load = load
+
+# records what runs inside as one load of kind (labels, e.g. the indices, go with it) for the calling thread.
+# when it is done the record goes into the metrics registry and, with log, to the log as one JSON line
+@contextmanager
+def record_load(kind, log=True, **labels):
+    previous = getattr(_thread, 'load', None)
+    load = LoadMetrics(kind, **labels)
+    _thread.load = load
+    failed = False
+    try:
+        yield load
+    except Exception:
+        # streamlit stops and reruns scripts by raising a BaseException, those are no failures
+        failed = True
+        raise
+    finally:
+        _thread.load = previous
+        load.finish(failed)
+        record = _registry.add(load)
+        if log:
+            load_logger.info(json.dumps(record, default=str))
+
+# the app configures no logging, there the load lines go to stderr as bare JSON (once, later calls do nothing)
+def log_loads_to_stderr():
+    if not load_logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        load_logger.addHandler(handler)
+        load_logger.setLevel(logging.INFO)
+        load_logger.propagate = False
+
+def stage(name):
+    return current_load().stage(name)
+
+def count(name, n=1):
+    current_load().count(name, n)
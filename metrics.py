@@ -0,0 +1,188 @@
+import numpy as np
+import pandas as pd
+from utils import calculate_true_range
+
+# per bar values several metrics build on, computed at most once per summary (see MetricContext.get)
+INTERMEDIATES = {}
+
+def intermediate(name):
+    def register(function):
+        INTERMEDIATES[name] = function
+        return function
+    return register
+
+# the registered metrics by summary column name, in the order they are added to the summary
+METRICS = {}
+
+# an indicator computed for every ticker at once. function(ctx, window) returns one value per ticker code,
+# inputs are the intermediates it reads (computed once and shared with the other metrics), window is the
+# number of bars at the end of each ticker's history it looks at (None for the whole period)
+class Metric:
+    def __init__(self, name, function, inputs, window=None, description=''):
+        self.name = name
+        self.function = function
+        self.inputs = tuple(inputs)
+        self.window = window
+        self.description = description
+
+    def compute(self, ctx):
+        return self.function(ctx, self.window)
+
+def register_metric(name, inputs, window=None, description=''):
+    def register(function):
+        METRICS[name] = Metric(name, function, inputs, window, description)
+        return function
+    return register
+
+# the bars of a summary laid out for vectorised metrics: float64 prices, a ticker code per bar (codes follow
+# the sorted ticker names), each bar's distance from the end of its ticker and the bar count per ticker.
+# bars of a ticker are expected in time order. period_sums gives whole period (window None) sums that cover
+# more bars than raw_data holds, as {intermediate: (sums, counts)} series by ticker (see incremental.py)
+class MetricContext:
+    def __init__(self, raw_data, period_sums=None):
+        self.raw_data = raw_data
+        self.prices = raw_data[['Open', 'High', 'Low', 'Close']].astype('float64')
+        self.volume = raw_data['Volume'].to_numpy(dtype='float64')
+        self.codes, ticker_names = pd.factorize(raw_data['Ticker'], sort=True)
+        self.ticker_names = pd.Index(np.asarray(ticker_names, dtype=object))
+        self.n_tickers = len(self.ticker_names)
+
+        self.grouped = self.prices.groupby(self.codes, sort=True)
+        self.bar_count_by_code = np.bincount(self.codes, minlength=self.n_tickers)
+        self.bar_count = self.bar_count_by_code[self.codes]
+        self.bars_from_end = self.grouped.cumcount(ascending=False).to_numpy()
+        self._values = {}
+        self.use_period_sums(period_sums or {})
+
+    # whole period sums to use instead of summing the bars at hand, {intermediate: (sums, counts)} by ticker
+    def use_period_sums(self, period_sums):
+        for name, (sums, counts) in period_sums.items():
+            self._values[('sum', name, None)] = (
+                sums.reindex(self.ticker_names).to_numpy(dtype='float64'),
+                counts.reindex(self.ticker_names).to_numpy(dtype='int64'),
+            )
+
+    # an intermediate by name, computed on first use
+    def get(self, name):
+        if name not in self._values:
+            self._values[name] = INTERMEDIATES[name](self)
+        return self._values[name]
+
+    # positions of the last `window` bars of every ticker (every bar when window is None), shared by all
+    # the metrics that use the same window
+    def window_rows(self, window):
+        key = ('rows', window)
+        if key not in self._values:
+            self._values[key] = None if window is None else np.flatnonzero(self.bars_from_end < window)
+        return self._values[key]
+
+    # per ticker sum and count of the non NaN values among the last `window` bars (all bars when window is None)
+    def window_sum(self, name, window=None):
+        key = ('sum', name, window)
+        if key not in self._values:
+            rows = self.window_rows(window)
+            values = self.get(name) if rows is None else self.get(name)[rows]
+            codes = self.codes if rows is None else self.codes[rows]
+            is_value = ~np.isnan(values)
+            if not is_value.all():
+                values, codes = values[is_value], codes[is_value]
+            sums = np.bincount(codes, weights=values, minlength=self.n_tickers)
+            counts = np.bincount(codes, minlength=self.n_tickers)
+            self._values[key] = (sums, counts)
+        return self._values[key]
+
+    def window_mean(self, name, window=None):
+        sums, counts = self.window_sum(name, window)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(counts > 0, sums / counts, np.nan)
+
+    # per ticker value of the last bar
+    def latest(self, name):
+        values = self.get(name)
+        latest = np.full(self.n_tickers, np.nan)
+        is_latest = self.bars_from_end == 0
+        latest[self.codes[is_latest]] = values[is_latest]
+        return latest
+
+@intermediate('close')
+def _close(ctx):
+    return ctx.prices['Close'].to_numpy()
+
+@intermediate('volume')
+def _volume(ctx):
+    return ctx.volume
+
+@intermediate('prev_close')
+def _prev_close(ctx):
+    return ctx.grouped['Close'].shift().to_numpy()
+
+@intermediate('true_range')
+def _true_range(ctx):
+    return calculate_true_range(ctx.prices, ctx.get('prev_close')).to_numpy()
+
+@intermediate('change')
+def _change(ctx):
+    return ctx.get('close') - ctx.get('prev_close')
+
+@intermediate('gain')
+def _gain(ctx):
+    change = ctx.get('change')
+    return np.where(np.isnan(change), np.nan, np.maximum(change, 0))
+
+@intermediate('loss')
+def _loss(ctx):
+    change = ctx.get('change')
+    return np.where(np.isnan(change), np.nan, np.maximum(-change, 0))
+
+@intermediate('typical_price_volume')
+def _typical_price_volume(ctx):
+    typical_price = (ctx.prices['High'] + ctx.prices['Low'] + ctx.prices['Close']).to_numpy() / 3
+    return typical_price * ctx.volume
+
+@intermediate('prior_volume')
+def _prior_volume(ctx):
+    # volume of every bar but the latest, so a window over it averages the bars before the latest one
+    return np.where(ctx.bars_from_end > 0, ctx.volume, np.nan)
+
+def _atr(ctx, window):
+    atr = ctx.window_mean('true_range', window)
+    return np.where(ctx.bar_count_by_code >= window, atr, np.nan)
+
+register_metric('ATR 5', ['true_range'], 5, "mean true range of the last 5 bars")(_atr)
+register_metric('ATR 20', ['true_range'], 20, "mean true range of the last 20 bars")(_atr)
+
+@register_metric('RSI 14', ['gain', 'loss'], 14, "relative strength index of the last 14 bar to bar changes (simple averages)")
+def _rsi(ctx, window):
+    # the change window ends at the latest bar, `window` changes need window + 1 bars
+    avg_gain = ctx.window_mean('gain', window)
+    avg_loss = ctx.window_mean('loss', window)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rsi = np.where(avg_loss > 0, 100 - 100 / (1 + avg_gain / avg_loss), 100.0)
+    return np.where(ctx.bar_count_by_code > window, rsi, np.nan)
+
+@register_metric('VWAP', ['typical_price_volume', 'volume'], None, "volume weighted typical price over the period")
+def _vwap(ctx, window):
+    price_volume, _ = ctx.window_sum('typical_price_volume', window)
+    volume, _ = ctx.window_sum('volume', window)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(volume > 0, price_volume / volume, np.nan)
+
+@register_metric('Rel Volume', ['volume', 'prior_volume'], 20, "latest bar volume over the mean volume of up to 20 bars before it")
+def _relative_volume(ctx, window):
+    prior_mean = ctx.window_mean('prior_volume', window + 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(prior_mean > 0, ctx.latest('volume') / prior_mean, np.nan)
+
+# intermediates summed over the whole period by the summary (volume) and by the given metrics (all registered
+# ones by default), the sums an incremental update has to carry forward
+def period_sum_inputs(names=None):
+    metrics = [METRICS[name] for name in (METRICS if names is None else names)]
+    return list(dict.fromkeys(['volume'] + [name for metric in metrics if metric.window is None for name in metric.inputs]))
+
+# computes the metrics (all registered ones by default) in one pass over the bars: the intermediates they
+# declare are computed once up front and every windowed sum is shared, returns {name: value per ticker code}
+def compute_metrics(ctx, names=None):
+    metrics = [METRICS[name] for name in (METRICS if names is None else names)]
+    for input_name in dict.fromkeys(name for metric in metrics for name in metric.inputs):
+        ctx.get(input_name)
+    return {metric.name: metric.compute(ctx) for metric in metrics}
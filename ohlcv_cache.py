@@ -0,0 +1,164 @@
+import os
+import tempfile
+import threading
+import zlib
+import pandas as pd
+from utils import INTERVAL_MINUTES, period_offset, to_naive_utc, trim_to_period
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'ohlcv')
+
+# tickers are spread over this many parquet files per interval, so storing one batch only rewrites the few
+# files its tickers live in (batches are ordered by bucket, see order_by_bucket)
+BUCKETS = 32
+
+# bars older than this are dropped from the cache (longest selectable period is 3mo)
+MAX_HISTORY = pd.DateOffset(months=3, days=7)
+
+# bars fetched less than this many minutes ago are served without asking yahoo again
+MAX_FRESH_MINUTES = 15
+
+BAR_COLUMNS = ['Ticker', 'Date', 'Open', 'High', 'Low', 'Close', 'Adj Close', 'Volume']
+COVERAGE_COLUMNS = ['covered_since', 'fetched_at', 'last_bar']
+
+_lock = threading.Lock()
+
+def bucket_of(ticker):
+    return zlib.crc32(ticker.encode()) % BUCKETS
+
+# sorts tickers by cache bucket (keeping their order inside a bucket) so consecutive batches touch few bucket files
+def order_by_bucket(tickers):
+    return sorted(tickers, key=bucket_of)
+
+# result of OHLCVCache.plan: which tickers can be served from disk, which only need the bars after
+# their last cached one, and which have to be downloaded for the whole period
+class CachePlan:
+    def __init__(self, fresh, stale, missing):
+        self.fresh = fresh        # [ticker]
+        self.stale = stale        # {ticker: timestamp of the last cached bar}
+        self.missing = missing    # [ticker]
+
+    def stats(self):
+        return {'hits': len(self.fresh), 'refreshed': len(self.stale), 'misses': len(self.missing)}
+
+# parquet backed store of the bars downloaded so far. per interval the bars are split over BUCKETS files by
+# ticker, and a small coverage file records per ticker since when its bars are complete, when they were
+# fetched and the time of the last bar (so planning a load never has to read the bars themselves)
+class OHLCVCache:
+    def __init__(self, cache_dir=None):
+        self.cache_dir = cache_dir or CACHE_DIR
+
+    def _interval_dir(self, interval):
+        return os.path.join(self.cache_dir, interval)
+
+    def _bucket_path(self, interval, bucket):
+        return os.path.join(self._interval_dir(interval), f"bucket_{bucket:02d}.parquet")
+
+    def _coverage_path(self, interval):
+        return os.path.join(self._interval_dir(interval), "coverage.parquet")
+
+    # parquet file as a frame, or the empty frame when it does not exist yet (or is unreadable)
+    def _read(self, path, empty):
+        if os.path.exists(path):
+            try:
+                return pd.read_parquet(path)
+            except Exception:
+                pass
+        return empty
+
+    def _empty_bars(self):
+        return pd.DataFrame(columns=BAR_COLUMNS).astype({'Ticker': object, 'Date': 'datetime64[ns]'})
+
+    def coverage(self, interval):
+        empty = pd.DataFrame(
+            columns=COVERAGE_COLUMNS, index=pd.Index([], name='Ticker', dtype=object), dtype='datetime64[ns]'
+        )
+        return self._read(self._coverage_path(interval), empty)
+
+    # splits the tickers into fresh / stale / missing for the requested period. a ticker is only usable
+    # when its cached bars reach back to the start of the period, otherwise it is downloaded in full
+    def plan(self, tickers, period, interval, now=None):
+        now = now or pd.Timestamp.now(tz='UTC').tz_localize(None)
+        coverage = self.coverage(interval).reindex(tickers)
+
+        covered = (coverage['covered_since'] <= now - period_offset(period)) & coverage['last_bar'].notna()
+        fresh_for = pd.Timedelta(minutes=min(INTERVAL_MINUTES.get(interval, MAX_FRESH_MINUTES), MAX_FRESH_MINUTES))
+        is_fresh = covered & (coverage['fetched_at'] >= now - fresh_for)
+
+        is_stale = covered & ~is_fresh
+        fresh = is_fresh.index[is_fresh.to_numpy()].tolist()
+        stale = coverage['last_bar'][is_stale.to_numpy()].to_dict()
+        missing = covered.index[~covered.to_numpy()].tolist()
+        return CachePlan(fresh, stale, missing)
+
+    # merges newly downloaded bars into the cache. bars for a timestamp that is already cached replace the
+    # old ones (the last bar of a download is often still forming). full_period_tickers were fetched for the
+    # whole period so their coverage starts at the beginning of it, refreshed_tickers only asked for the bars
+    # after their last cached one (and count as fetched even if nothing new came back)
+    def store(self, new_bars, period, interval, full_period_tickers, refreshed_tickers=(), now=None):
+        now = now or pd.Timestamp.now(tz='UTC').tz_localize(None)
+        if new_bars is None:
+            new_bars = self._empty_bars()
+
+        new_bars = new_bars.reindex(columns=BAR_COLUMNS)
+        new_bars['Ticker'] = new_bars['Ticker'].astype(str)
+        new_bars['Date'] = to_naive_utc(new_bars['Date'])
+
+        with _lock:
+            # only the bucket files holding the new tickers are rewritten
+            buckets = new_bars['Ticker'].map(bucket_of)
+            for bucket, bucket_bars in new_bars.groupby(buckets):
+                path = self._bucket_path(interval, bucket)
+                bars = self._read(path, self._empty_bars())
+                bars = pd.concat([bars, bucket_bars], ignore_index=True) if not bars.empty else bucket_bars
+                bars = bars.drop_duplicates(['Ticker', 'Date'], keep='last')
+                bars = bars[bars['Date'] >= now - MAX_HISTORY]
+                bars = bars.sort_values(['Ticker', 'Date'], kind='stable').reset_index(drop=True)
+                self._write(bars, path)
+
+            coverage = self.coverage(interval)
+            first_bar = new_bars.groupby('Ticker')['Date'].min()
+            last_bar = new_bars.groupby('Ticker')['Date'].max()
+            refreshed = [ticker for ticker in refreshed_tickers if ticker in coverage.index]
+            fetched = pd.Index(first_bar.index).union(refreshed)
+            coverage = coverage.reindex(coverage.index.union(fetched))
+            coverage.index.name = 'Ticker'
+            coverage.loc[fetched, 'fetched_at'] = now
+            coverage.loc[last_bar.index, 'last_bar'] = pd.concat(
+                [last_bar, coverage.loc[last_bar.index, 'last_bar']], axis=1
+            ).max(axis=1)
+
+            full = [ticker for ticker in full_period_tickers if ticker in first_bar.index]
+            coverage.loc[full, 'covered_since'] = first_bar[full].clip(upper=now - period_offset(period))
+
+            coverage = coverage.astype({column: 'datetime64[ns]' for column in COVERAGE_COLUMNS})
+            self._write(coverage, self._coverage_path(interval))
+
+    # cached bars of the tickers trimmed to the requested period, in the same long layout as a download
+    def read(self, tickers, period, interval, now=None):
+        now = now or pd.Timestamp.now(tz='UTC').tz_localize(None)
+        by_bucket = {}
+        for ticker in tickers:
+            by_bucket.setdefault(bucket_of(ticker), []).append(ticker)
+
+        frames = []
+        for bucket, bucket_tickers in sorted(by_bucket.items()):
+            path = self._bucket_path(interval, bucket)
+            if os.path.exists(path):
+                frames.append(pd.read_parquet(path, filters=[('Ticker', 'in', bucket_tickers)]))
+        if not frames:
+            return self._empty_bars()
+        bars = pd.concat(frames, ignore_index=True)
+        return trim_to_period(bars, period, now).reset_index(drop=True)
+
+    # writes to a temporary file first so another session never reads a half written file. the temporary file
+    # is unique, other processes using the same cache directory (the CLI, more servers) write there too
+    def _write(self, frame, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        os.close(fd)
+        try:
+            frame.to_parquet(temp_path)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
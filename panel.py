@@ -0,0 +1,171 @@
+import numpy as np
+import pandas as pd
+from utils import calculate_true_range, compact_ohlcv, to_naive_utc
+
+PANEL_FIELDS = ['Open', 'High', 'Low', 'Close', 'Adj Close', 'Volume']
+
+# bars of many tickers as one contiguous float64 array (tickers x bars x fields) on a shared timestamp axis, the
+# layout yfinance returns a batch in. valid marks the bars a ticker has (a ticker that started trading later or
+# skipped a session has holes), metadata holds the company info by ticker. per ticker work (previous close, true
+# range, rolling means, gaps) runs as array operations over every ticker at once instead of a groupby; windows
+# count a ticker's own bars, skipping its holes, like the groupby over the long frame does
+class PricePanel:
+    def __init__(self, values, timestamps, tickers, valid=None, metadata=None, fields=PANEL_FIELDS):
+        self.values = np.ascontiguousarray(values, dtype='float64')
+        self.timestamps = pd.DatetimeIndex(timestamps)
+        self.tickers = pd.Index(tickers, dtype=object)
+        self.fields = list(fields)
+        self.valid = ~np.isnan(self.values).any(axis=2) if valid is None else np.asarray(valid, dtype=bool)
+        self.metadata = metadata if metadata is not None else pd.DataFrame(index=self.tickers)
+        self._field_index = {field: i for i, field in enumerate(self.fields)}
+        self._order = None
+
+    # long bars (Ticker, Date and the OHLCV columns, like download_index_data returns) to a panel, company_info
+    # becomes the metadata (or the Company Name / Sector columns of the bars when there is none)
+    @classmethod
+    def from_long(cls, raw_data, company_info=None):
+        fields = [field for field in PANEL_FIELDS if field in raw_data.columns]
+        ticker_codes, tickers = pd.factorize(raw_data['Ticker'], sort=True)
+        time_codes, timestamps = pd.factorize(to_naive_utc(raw_data['Date']), sort=True)
+
+        values = np.full((len(tickers), len(timestamps), len(fields)), np.nan)
+        values[ticker_codes, time_codes] = raw_data[fields].to_numpy(dtype='float64')
+        valid = np.zeros((len(tickers), len(timestamps)), dtype=bool)
+        valid[ticker_codes, time_codes] = True
+
+        tickers = pd.Index(np.asarray(tickers, dtype=object))
+        info_columns = [column for column in ['Company Name', 'Sector'] if column in raw_data.columns]
+        if company_info is not None:
+            metadata = company_info.reindex(tickers)
+        elif info_columns:
+            metadata = raw_data[info_columns].groupby(ticker_codes).first().set_axis(tickers)
+        else:
+            metadata = None
+        return cls(values, timestamps, tickers, valid, metadata, fields)
+
+    # a provider batch (bar timestamps x (ticker, field) columns, see providers.py) to a panel with one reshape.
+    # a bar counts when none of its fields is missing and tickers without any bar are left out, like
+    # extract_ticker_frames does
+    @classmethod
+    def from_bulk(cls, bulk_data, tickers=None, metadata=None):
+        if tickers is None:
+            tickers = list(dict.fromkeys(bulk_data.columns.get_level_values(0)))
+        columns = pd.MultiIndex.from_product([tickers, PANEL_FIELDS])
+        flat = bulk_data.reindex(columns=columns).to_numpy(dtype='float64')
+        values = flat.reshape(len(bulk_data), len(tickers), len(PANEL_FIELDS)).transpose(1, 0, 2)
+        valid = ~np.isnan(values).any(axis=2)
+        has_bars = valid.any(axis=1)
+        tickers = pd.Index(tickers, dtype=object)[has_bars]
+        metadata = metadata.reindex(tickers) if metadata is not None else None
+        timestamps = to_naive_utc(pd.Series(bulk_data.index)).to_numpy()
+        return cls(values[has_bars], timestamps, tickers, valid[has_bars], metadata)
+
+    # back to the long frame (ticker then time order, compact dtypes), the bars the panel does not have are skipped
+    def to_long(self):
+        ticker_rows, bar_columns = np.nonzero(self.valid)
+        raw_data = pd.DataFrame({
+            'Ticker': pd.Categorical.from_codes(ticker_rows, categories=self.tickers),
+            'Date': self.timestamps[bar_columns],
+        })
+        values = self.values[ticker_rows, bar_columns]
+        for i, field in enumerate(self.fields):
+            raw_data[field] = values[:, i]
+        return compact_ohlcv(raw_data)
+
+    def __len__(self):
+        return len(self.tickers)
+
+    @property
+    def shape(self):
+        return self.values.shape
+
+    # bars each ticker has
+    @property
+    def lengths(self):
+        return self.valid.sum(axis=1)
+
+    # one field for every ticker and bar, a strided view into the panel (no copy)
+    def __getitem__(self, field):
+        return self.values[:, :, self._field_index[field]]
+
+    # per ticker bar order that moves each ticker's bars to the end of its row (holes first), so "the last n
+    # bars" of every ticker is the same column slice. None when they already are (no holes, late starters only),
+    # the usual case, then packing is only masking
+    def _packing(self):
+        if self._order is None:
+            is_packed = bool((self.valid[:, 1:] >= self.valid[:, :-1]).all())
+            self._order = False if is_packed else np.argsort(self.valid, axis=1, kind='stable')
+        return None if self._order is False else self._order
+
+    # values (tickers x bars) with every ticker's bars packed at the end of its row, NaN in front
+    def pack(self, values):
+        order = self._packing()
+        if order is None:
+            return np.where(self.valid, values, np.nan)
+        packed = np.take_along_axis(values, order, axis=1)
+        is_bar = np.arange(self.valid.shape[1])[None, :] >= (self.valid.shape[1] - self.lengths)[:, None]
+        return np.where(is_bar, packed, np.nan)
+
+    # packed values back on the timestamp axis, NaN where a ticker has no bar
+    def unpack(self, packed):
+        order = self._packing()
+        if order is None:
+            return np.where(self.valid, packed, np.nan)
+        values = np.empty_like(packed)
+        np.put_along_axis(values, order, packed, axis=1)
+        return np.where(self.valid, values, np.nan)
+
+    # value of each ticker's previous bar (NaN for its first one)
+    def previous(self, field):
+        packed = self.pack(self[field])
+        shifted = np.concatenate([np.full((len(self), 1), np.nan), packed[:, :-1]], axis=1)
+        return self.unpack(shifted)
+
+    # true range of every bar, the first bar of a ticker falls back to high - low
+    def true_range(self):
+        return np.where(self.valid, calculate_true_range(self, self.previous('Close')), np.nan)
+
+    # mean of the last `window` bars of each ticker at every bar (NaN until a full window without NaN), the
+    # array version of groupby(...).rolling(window).mean()
+    def rolling_mean(self, values, window):
+        packed = self.pack(values)
+        is_value = ~np.isnan(packed)
+        sums = np.cumsum(np.where(is_value, packed, 0.0), axis=1)
+        counts = np.cumsum(is_value, axis=1)
+        sums[:, window:] = sums[:, window:] - sums[:, :-window]
+        counts[:, window:] = counts[:, window:] - counts[:, :-window]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            means = np.where(counts == window, sums / window, np.nan)
+        return self.unpack(means)
+
+    # per ticker mean of the non NaN values among its last `window` bars (all bars when window is None)
+    def window_mean(self, values, window=None):
+        packed = self.pack(values)
+        if window is not None:
+            packed = packed[:, -window:]
+        is_value = ~np.isnan(packed)
+        sums = np.where(is_value, packed, 0.0).sum(axis=1)
+        counts = is_value.sum(axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(counts > 0, sums / counts, np.nan)
+
+    # value at the last bar of each ticker (a field name or tickers x bars values)
+    def latest(self, values):
+        values = self[values] if isinstance(values, str) else values
+        return self.pack(values)[:, -1]
+
+    # ATR of every ticker as the summary shows it: mean true range of the last `period` bars, the latest bar's
+    # high - low when there are fewer
+    def atr(self, period=14):
+        atr = self.window_mean(self.true_range(), period)
+        high_low = self.latest('High') - self.latest('Low')
+        return np.where(self.lengths >= period, atr, high_low)
+
+    # gap of every ticker between its previous close and latest open, in $ and % (NaN below 2 bars)
+    def gaps(self):
+        close = self.pack(self['Close'])
+        prev_close = close[:, -2] if close.shape[1] > 1 else np.full(len(self), np.nan)
+        gap_abs = self.latest('Open') - prev_close
+        with np.errstate(divide='ignore', invalid='ignore'):
+            gap_pct = np.where(prev_close != 0, gap_abs / prev_close * 100, 0)
+        return gap_abs, np.where(np.isnan(prev_close), np.nan, gap_pct)
@@ -0,0 +1,107 @@
+import atexit
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+import numpy as np
+import pandas as pd
+
+# bar columns handed to the workers, through one shared memory block (never pickled)
+SHARD_FIELDS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+# shards per worker, a few more than one so a slow shard does not hold the others up
+SHARDS_PER_WORKER = 4
+
+# worker processes are spawned (forking a process with streamlit's threads running is not safe) and kept for
+# later calls, one pool per worker count
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_process_pool(workers):
+    with _pools_lock:
+        if workers not in _pools:
+            _pools[workers] = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+        return _pools[workers]
+
+def shutdown_pools():
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.shutdown(cancel_futures=True)
+        _pools.clear()
+
+atexit.register(shutdown_pools)
+
+# contiguous ticker code ranges with about the same number of bars each, as (row_start, row_end, code_start,
+# code_end). rows are sorted by ticker code so a shard is one slice of them
+def shard_bounds(bar_counts, n_shards):
+    row_ends = np.cumsum(bar_counts)
+    targets = row_ends[-1] * np.arange(1, n_shards) / n_shards
+    code_ends = np.unique(np.concatenate([np.searchsorted(row_ends, targets, side='left') + 1, [len(bar_counts)]]))
+    code_starts = np.concatenate([[0], code_ends[:-1]])
+    row_starts = np.concatenate([[0], row_ends])[code_starts]
+    return [
+        (int(row_start), int(row_ends[code_end - 1]), int(code_start), int(code_end))
+        for row_start, code_start, code_end in zip(row_starts, code_starts, code_ends)
+    ]
+
+# runs in a worker: the shard's bars as a long frame on the shared block, then function(frame, **kwargs)
+def _run_shard(function, block_name, n_rows, row_start, row_end, tickers, codes_offset, kwargs):
+    block = shared_memory.SharedMemory(name=block_name)
+    try:
+        values = np.ndarray((len(SHARD_FIELDS), n_rows), dtype='float64', buffer=block.buf)
+        codes = np.ndarray(n_rows, dtype='int64', buffer=block.buf, offset=values.nbytes)
+        frame = pd.DataFrame({field: values[i, row_start:row_end] for i, field in enumerate(SHARD_FIELDS)})
+        frame['Ticker'] = pd.Categorical.from_codes(codes[row_start:row_end] - codes_offset, categories=tickers)
+        del values, codes
+        return function(frame, **kwargs)
+    finally:
+        block.close()
+
+# runs function(bars, **kwargs) -> per ticker frame over shards of the tickers in a pool of worker processes and
+# concatenates the results shard by shard. function has to return its rows in ticker order (summarise_ohlcv does,
+# whatever the order of the bars), the result is then the frame it gives for all the bars at once. the bars
+# (SHARD_FIELDS, float64, bars of a ticker in time order) are copied once into shared memory sorted by ticker,
+# each worker gets the name of the block and its row range. function has to be importable (module level) and
+# only see the columns in SHARD_FIELDS plus Ticker
+def map_shards(raw_data, function, workers, **kwargs):
+    codes, tickers = pd.factorize(raw_data['Ticker'], sort=True)
+    tickers = np.asarray(tickers, dtype=object)
+    n_rows = len(raw_data)
+    order = None if (np.diff(codes) >= 0).all() else np.argsort(codes, kind='stable')
+
+    values_bytes = len(SHARD_FIELDS) * n_rows * 8
+    block = shared_memory.SharedMemory(create=True, size=max(1, values_bytes + n_rows * 8))
+    try:
+        values = np.ndarray((len(SHARD_FIELDS), n_rows), dtype='float64', buffer=block.buf)
+        shared_codes = np.ndarray(n_rows, dtype='int64', buffer=block.buf, offset=values_bytes)
+        for i, field in enumerate(SHARD_FIELDS):
+            column = raw_data[field].to_numpy(dtype='float64')
+            values[i] = column if order is None else column[order]
+        shared_codes[:] = codes if order is None else codes[order]
+
+        bounds = shard_bounds(np.bincount(codes, minlength=len(tickers)), workers * SHARDS_PER_WORKER)
+        pool = get_process_pool(workers)
+        futures = [
+            pool.submit(_run_shard, function, block.name, n_rows, row_start, row_end,
+                        tickers[code_start:code_end], code_start, kwargs)
+            for row_start, row_end, code_start, code_end in bounds
+        ]
+        try:
+            results = [future.result() for future in futures]
+        except BrokenProcessPool:
+            # a worker died, the next call starts a new pool
+            with _pools_lock:
+                _pools.pop(workers, None)
+            raise
+        del values, shared_codes
+    finally:
+        block.close()
+        block.unlink()
+    return pd.concat(results, ignore_index=True)
+
+# worker count from SCREENER_SUMMARY_WORKERS (1, the default, computes in the calling process, 0 uses every core)
+def configured_workers():
+    workers = int(os.environ.get('SCREENER_SUMMARY_WORKERS', 1))
+    return workers if workers > 0 else os.cpu_count() or 1
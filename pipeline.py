@@ -0,0 +1,84 @@
+import pandas as pd
+from analysis import summarise_ohlcv
+from data_loader import (
+    BATCH_SIZE, MAX_CONCURRENT_BATCHES, prepare_download, plan_batches, iter_downloaded_batches
+)
+from download_scheduler import get_shared_limiter
+from ohlcv_cache import order_by_bucket
+from ticker_health import get_ticker_health
+from utils import get_batches
+import instrumentation
+
+# one step of a streamed load: the summary rows of the tickers that just finished and how far along the load is
+class SummaryChunk:
+    def __init__(self, summary, done, total, company_info, failed=False):
+        self.summary = summary              # summary rows (SUMMARY_COLUMNS), may be empty
+        self.done = done                    # tickers processed so far
+        self.total = total                  # tickers in the load
+        self.company_info = company_info    # company info table of the whole load
+        self.failed = failed                # the batch could not be downloaded
+
+# loads the selected indices batch by batch and yields a SummaryChunk as soon as each batch is summarised,
+# so the results can be shown while later batches are still downloading. tickers the cache can serve come
+# first, then the download batches in completion order. the bars of a batch are spilled to the on-disk cache
+# and dropped once summarised (without the cache they are summarised straight from the download), so memory
+# stays around one batch however large the universe is. downloads share the process wide rate limiter unless
+# a limiter is passed
+def stream_summary_data(selected_indices, period, interval, use_cache=True,
+                        batch_size=BATCH_SIZE, max_workers=MAX_CONCURRENT_BATCHES, limiter=None):
+    prepared = prepare_download(selected_indices, period, interval, use_cache)
+    if prepared is None:
+        return
+    tickers, company_info, cache, plan = prepared
+    total = len(tickers)
+    done = 0
+
+    for batch in get_batches(order_by_bucket(plan.fresh), batch_size):
+        with instrumentation.stage('cache_read'):
+            bars = cache.read(batch, period, interval)
+        done += len(batch)
+        yield SummaryChunk(summarise_batch(bars, company_info), done, total, company_info)
+
+    limiter = limiter or get_shared_limiter()
+    health = get_ticker_health() if use_cache else None
+    completed = iter_downloaded_batches(
+        plan_batches(plan, batch_size), period, interval, max_workers, limiter, health, has_data=bool(plan.fresh or plan.stale)
+    )
+    for batch, start, frames, error in completed:
+        done += len(batch)
+        if error is not None:
+            yield SummaryChunk(summarise_ohlcv(empty_bars(), company_info), done, total, company_info, failed=True)
+            continue
+
+        with instrumentation.stage('concat'):
+            new_bars = pd.concat(frames, ignore_index=True) if frames else None
+        if use_cache:
+            full_period_tickers = batch if start is None else []
+            refreshed_tickers = batch if start is not None else []
+            with instrumentation.stage('cache_store'):
+                cache.store(new_bars, period, interval, full_period_tickers, refreshed_tickers)
+            with instrumentation.stage('cache_read'):
+                bars = cache.read(batch, period, interval)
+        else:
+            bars = new_bars if new_bars is not None else empty_bars()
+        yield SummaryChunk(summarise_batch(bars, company_info), done, total, company_info)
+
+def summarise_batch(bars, company_info):
+    with instrumentation.stage('summary'):
+        return summarise_ohlcv(bars, company_info)
+
+# bars frame without rows, summarises to an empty summary
+def empty_bars():
+    return pd.DataFrame({
+        'Ticker': pd.Series(dtype=object), 'Date': pd.Series(dtype='datetime64[ns]'),
+        'Open': pd.Series(dtype='float64'), 'High': pd.Series(dtype='float64'),
+        'Low': pd.Series(dtype='float64'), 'Close': pd.Series(dtype='float64'),
+        'Adj Close': pd.Series(dtype='float64'), 'Volume': pd.Series(dtype='float64'),
+    })
+
+# joins the chunks of a streamed load into one summary, in ticker order (chunks arrive in completion order)
+def combine_summary_chunks(chunks):
+    frames = [chunk.summary for chunk in chunks if not chunk.summary.empty]
+    if not frames:
+        return None
+    return pd.concat(frames, ignore_index=True).sort_values('Ticker', kind='stable').reset_index(drop=True)
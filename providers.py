@@ -0,0 +1,261 @@
+import ast
+import glob
+import logging
+import os
+import re
+import threading
+import time
+import zlib
+import numpy as np
+import pandas as pd
+from download_scheduler import RateLimitError
+from utils import INTERVAL_MINUTES, to_naive_utc, trim_to_period
+
+OHLCV_FIELDS = ['Open', 'High', 'Low', 'Close', 'Adj Close', 'Volume']
+
+# substrings yfinance uses when yahoo rejects requests for being too frequent
+RATE_LIMIT_MARKERS = ('RateLimit', 'Rate limited', 'Too Many Requests')
+
+# substrings of the yfinance errors for tickers that simply have no data (delisted, or nothing in the period),
+# any other error of a ticker is a failed download worth retrying
+NO_DATA_MARKERS = ('delisted', 'No data found', 'no price data', 'no timezone found', 'Quote not found')
+
+# raised by a provider when a batch could not be fetched for any other reason than throttling
+class ProviderError(Exception):
+    pass
+
+# where market data comes from. fetch returns one batch in the layout yf.download(group_by='ticker') uses:
+# a frame indexed by bar timestamp with (ticker, field) columns, tickers without data may be missing or all NaN.
+# tickers whose download failed (timeouts and the like, not the ones without data) are listed in attrs['failed']
+class MarketDataProvider:
+    name = 'base'
+
+    def fetch(self, tickers, period, interval, start=None):
+        raise NotImplementedError
+
+# turns long bars (Ticker, Date, OHLCV columns) into the wide yfinance batch layout
+def bars_to_bulk(bars):
+    if bars.empty:
+        return pd.DataFrame(columns=pd.MultiIndex.from_arrays([[], []], names=['Ticker', 'Price']))
+    bulk = bars.set_index(['Date', 'Ticker'])[OHLCV_FIELDS].unstack('Ticker')
+    bulk.columns = bulk.columns.swaplevel(0, 1).set_names(['Ticker', 'Price'])
+    return bulk.sort_index(axis=1, level=0, sort_remaining=False)
+
+# yahoo throttling shows up as error lines from the yfinance logger rather than an exception, so the
+# error lines logged by the current thread are collected while its download runs
+class _YFinanceErrorLog(logging.Handler):
+    def __init__(self):
+        super().__init__(logging.ERROR)
+        self.thread = threading.get_ident()
+        self.messages = []
+
+    def emit(self, record):
+        if record.thread == self.thread:
+            self.messages.append(record.getMessage())
+
+    # tickers yfinance reported as failed for another reason than having no data. its summary lists them as
+    # "['AAA', 'BBB']: <error>" lines
+    def failed_tickers(self):
+        failed = []
+        for message in self.messages:
+            for tickers, error in re.findall(r"^(\[[^\]]*\]): (.*)$", message, flags=re.MULTILINE):
+                if not any(marker.lower() in error.lower() for marker in NO_DATA_MARKERS):
+                    failed.extend(ast.literal_eval(tickers))
+        return failed
+
+# live data from yahoo finance
+class YFinanceProvider(MarketDataProvider):
+    name = 'yfinance'
+
+    def fetch(self, tickers, period, interval, start=None):
+        # imported on first use, it is the slowest import of the app and headless runs on recorded or
+        # synthetic data never need it
+        import yfinance as yf
+
+        error_log = _YFinanceErrorLog()
+        yf_logger = logging.getLogger('yfinance')
+        yf_logger.addHandler(error_log)
+        try:
+            bulk_data = yf.download(
+                tickers=tickers,
+                period=period if start is None else None,
+                start=start,
+                interval=interval,
+                group_by='ticker',
+                auto_adjust=False,
+                threads=True,
+                progress=False
+            )
+        except Exception as e:
+            if any(marker in repr(e) for marker in RATE_LIMIT_MARKERS):
+                raise RateLimitError(str(e)) from e
+            raise ProviderError(str(e)) from e
+        finally:
+            yf_logger.removeHandler(error_log)
+
+        throttled = [message for message in error_log.messages if any(marker in message for marker in RATE_LIMIT_MARKERS)]
+        if throttled:
+            raise RateLimitError(throttled[0])
+        bulk_data.attrs['failed'] = error_log.failed_tickers()
+        return bulk_data
+
+# plays back bars recorded earlier, e.g. the OHLCV cache (pass the cache directory, its <interval> folder of
+# bucket files is read) or any parquet / csv file with Ticker, Date and OHLCV columns. "now" is the time of the
+# newest recorded bar so the period is counted back from the end of the recording
+class ReplayProvider(MarketDataProvider):
+    name = 'replay'
+
+    def __init__(self, path):
+        self.path = path
+        self._recordings = {}
+
+    def _recording(self, interval):
+        if interval not in self._recordings:
+            path = self.path
+            if os.path.isdir(path):
+                path = os.path.join(path, interval)
+            if not os.path.exists(path):
+                raise ProviderError(f"No recorded {interval} bars at {path}")
+            if os.path.isdir(path):
+                files = sorted(glob.glob(os.path.join(path, 'bucket_*.parquet')))
+                bars = pd.concat([pd.read_parquet(file) for file in files], ignore_index=True)
+            else:
+                bars = pd.read_parquet(path) if path.endswith('.parquet') else pd.read_csv(path)
+            bars['Date'] = to_naive_utc(bars['Date'])
+            self._recordings[interval] = bars
+        return self._recordings[interval]
+
+    def fetch(self, tickers, period, interval, start=None):
+        bars = self._recording(interval)
+        bars = bars[bars['Ticker'].isin(tickers)]
+        if start is not None:
+            bars = bars[bars['Date'] >= to_naive_utc(pd.Series([start])).iloc[0]]
+        else:
+            bars = trim_to_period(bars, period, bars['Date'].max())
+        return bars_to_bulk(bars)
+
+# generates realistic looking bars (random walk prices, lognormal volume, regular trading hours for
+# intraday intervals) for any ticker, reproducible for a given seed. latency and failures can be injected
+# so the download pipeline can be measured without a network connection:
+#   latency / per_ticker_latency  seconds slept per request and per ticker in it
+#   rate_limit_rate               share of requests rejected with RateLimitError
+#   failure_rate                  share of requests failing with ProviderError
+#   ticker_failure_rate           share of tickers per request whose download fails (listed in attrs['failed'])
+#   missing_rate                  share of tickers that never return data (delisted)
+class SyntheticProvider(MarketDataProvider):
+    name = 'synthetic'
+
+    # bars are generated on a fixed grid going back this far so overlapping requests agree on prices
+    HISTORY = pd.DateOffset(months=3, days=7)
+
+    def __init__(self, seed=0, latency=0.0, per_ticker_latency=0.0, rate_limit_rate=0.0,
+                 failure_rate=0.0, ticker_failure_rate=0.0, missing_rate=0.0, now=None):
+        self.seed = seed
+        self.latency = latency
+        self.per_ticker_latency = per_ticker_latency
+        self.rate_limit_rate = rate_limit_rate
+        self.failure_rate = failure_rate
+        self.ticker_failure_rate = ticker_failure_rate
+        self.missing_rate = missing_rate
+        self.now = now
+        self._rng = np.random.default_rng(seed)
+        self._lock = threading.Lock()
+
+    # bar timestamps (naive UTC) from start to now for the interval
+    def _timestamps(self, interval, now):
+        start = now.normalize() - self.HISTORY
+        if interval in ('15m', '30m', '1h'):
+            sessions = pd.bdate_range(start, now.normalize())
+            minutes = INTERVAL_MINUTES[interval]
+            offsets = pd.to_timedelta(np.arange(570, 960, minutes), unit='m')  # 09:30 - 16:00
+            local = (sessions.values[:, None] + offsets.values[None, :]).ravel()
+            stamps = pd.DatetimeIndex(local).tz_localize('America/New_York').tz_convert('UTC').tz_localize(None)
+            return stamps[stamps <= now]
+        freq = {'1d': 'B', '5d': '5B', '1wk': 'W-MON', '1mo': 'MS', '3mo': 'QS'}.get(interval, 'B')
+        return pd.date_range(start, now.normalize(), freq=freq)
+
+    def _ticker_seed(self, ticker):
+        return [self.seed, zlib.crc32(ticker.encode())]
+
+    def _bars(self, tickers, interval, now):
+        stamps = self._timestamps(interval, now)
+        n_bars = len(stamps)
+        frames = []
+        for ticker in tickers:
+            rng = np.random.default_rng(self._ticker_seed(ticker))
+            if rng.random() < self.missing_rate:
+                continue
+            start_price = np.exp(rng.uniform(np.log(2), np.log(500)))
+            volatility = rng.uniform(0.005, 0.04) * np.sqrt(min(INTERVAL_MINUTES.get(interval, 1440), 1440) / 1440)
+            close = start_price * np.exp(np.cumsum(rng.normal(0, volatility, n_bars)))
+            open_ = np.r_[start_price, close[:-1]] * np.exp(rng.normal(0, volatility / 2, n_bars))
+            high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, volatility / 2, n_bars)))
+            low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, volatility / 2, n_bars)))
+            volume = np.round(rng.lognormal(np.log(rng.uniform(1e4, 5e6)), 0.5, n_bars))
+            # yahoo serves prices with float32 precision
+            frames.append(pd.DataFrame({
+                'Ticker': ticker,
+                'Date': stamps,
+                'Open': open_.astype('float32').astype('float64'),
+                'High': high.astype('float32').astype('float64'),
+                'Low': low.astype('float32').astype('float64'),
+                'Close': close.astype('float32').astype('float64'),
+                'Adj Close': close.astype('float32').astype('float64'),
+                'Volume': volume,
+            }))
+        if not frames:
+            return pd.DataFrame({
+                'Ticker': pd.Series(dtype=object), 'Date': pd.Series(dtype='datetime64[ns]'),
+                **{field: pd.Series(dtype='float64') for field in OHLCV_FIELDS},
+            })
+        return pd.concat(frames, ignore_index=True)
+
+    def fetch(self, tickers, period, interval, start=None):
+        with self._lock:
+            roll = self._rng.random()
+            failed = [ticker for ticker in tickers if self._rng.random() < self.ticker_failure_rate]
+        time.sleep(self.latency + self.per_ticker_latency * len(tickers))
+        if roll < self.rate_limit_rate:
+            raise RateLimitError("Too Many Requests (synthetic)")
+        if roll < self.rate_limit_rate + self.failure_rate:
+            raise ProviderError("Injected failure (synthetic)")
+
+        now = self.now or pd.Timestamp.now(tz='UTC').tz_localize(None)
+        failed_set = set(failed)
+        bars = self._bars([ticker for ticker in tickers if ticker not in failed_set], interval, now)
+        if start is not None:
+            bars = bars[bars['Date'] >= to_naive_utc(pd.Series([start])).iloc[0]]
+        else:
+            bars = trim_to_period(bars, period, now)
+
+        # like yfinance: intraday bars carry the exchange timezone, daily and longer bars are naive
+        if interval in ('15m', '30m', '1h'):
+            bars = bars.assign(Date=bars['Date'].dt.tz_localize('UTC').dt.tz_convert('America/New_York'))
+        bulk_data = bars_to_bulk(bars)
+        bulk_data.attrs['failed'] = failed
+        return bulk_data
+
+# builds a provider from a spec string: 'yfinance', 'synthetic', 'synthetic:<seed>' or 'replay:<path>'
+def create_provider(spec):
+    name, _, argument = spec.partition(':')
+    if name == 'yfinance':
+        return YFinanceProvider()
+    if name == 'synthetic':
+        return SyntheticProvider(seed=int(argument or 0))
+    if name == 'replay':
+        return ReplayProvider(argument)
+    raise ValueError(f"Unknown data provider: {spec}")
+
+_provider = None
+
+# the provider the app downloads from, chosen with the SCREENER_DATA_PROVIDER environment variable
+# (defaults to yfinance) unless one was installed with set_provider
+def get_provider():
+    global _provider
+    if _provider is None:
+        _provider = create_provider(os.environ.get('SCREENER_DATA_PROVIDER', 'yfinance'))
+    return _provider
+
+def set_provider(provider):
+    global _provider
+    _provider = provider
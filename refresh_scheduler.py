@@ -0,0 +1,266 @@
+import os
+import threading
+import time
+import reporting
+from data_loader import INDEX_CONFIGS
+from download_scheduler import get_shared_limiter
+from instrumentation import record_load
+from pipeline import stream_summary_data, combine_summary_chunks
+from shared_cache import load_key
+from utils import INTERVAL_MINUTES, validate_period_interval
+
+# a refresh runs once per bar interval (every 15 minutes for 15m bars), daily and longer bars still change
+# while the market is open so they are refreshed at least hourly
+MAX_REFRESH_SECONDS = 3600
+
+# a snapshot is served while it is younger than this many refresh intervals, a late refresh is not a miss
+FRESH_INTERVALS = 1.5
+
+# download workers of a background refresh, fewer than a user load so users keep most of the rate
+REFRESH_WORKERS = 2
+
+# a failed refresh is retried after this long (or its interval if that is shorter)
+RETRY_SECONDS = 60
+
+# universes users load are kept hot too: at most this many of them, each until nobody asked for it this long
+MAX_REQUESTED_JOBS = int(os.environ.get('SCREENER_REFRESH_MAX_REQUESTED', 4))
+REQUEST_IDLE_SECONDS = int(os.environ.get('SCREENER_REFRESH_IDLE_MINUTES', 120)) * 60
+
+def refresh_seconds(interval):
+    return min(INTERVAL_MINUTES.get(interval, 60) * 60, MAX_REFRESH_SECONDS)
+
+# the result of one refresh, never changed once published. raw bars stay in the on-disk cache
+class Snapshot:
+    def __init__(self, key, company_info, summary, created, duration=0.0):
+        self.key = key                      # load_key of the indices, period and interval
+        self.company_info = company_info
+        self.summary = summary
+        self.created = created              # time.time() the data was loaded
+        self.duration = duration            # seconds the load took
+
+    @property
+    def interval(self):
+        return self.key[2]
+
+    def age(self, now=None):
+        return (time.time() if now is None else now) - self.created
+
+    def is_fresh(self, now=None):
+        return self.age(now) < refresh_seconds(self.interval) * FRESH_INTERVALS
+
+# one (indices, period, interval) the scheduler keeps hot. configured jobs stay for good, requested ones are
+# added by request() and dropped once idle
+class RefreshJob:
+    def __init__(self, key, configured, next_due):
+        self.key = key
+        self.configured = configured
+        self.next_due = next_due
+        self.requests = 0
+        self.last_requested = None
+        self.refreshes = 0
+        self.failures = 0
+
+# refreshes snapshots in a background thread, one load at a time through the process wide rate limiter.
+# each refresh replaces the previous snapshot in one assignment, so readers always get a complete one.
+# when several jobs are due the one users asked for most goes first
+class RefreshScheduler:
+    def __init__(self, load=None, limiter=None, clock=time.time,
+                 max_requested=MAX_REQUESTED_JOBS, idle_seconds=REQUEST_IDLE_SECONDS):
+        self.load = load or load_snapshot
+        self.limiter = limiter or get_shared_limiter()
+        self.clock = clock
+        self.max_requested = max_requested
+        self.idle_seconds = idle_seconds
+
+        self._jobs = {}
+        self._snapshots = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._running = None
+
+    # keeps a universe hot for good, its first refresh is due right away
+    def add(self, selected_indices, period, interval):
+        key = load_key(selected_indices, period, interval)
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is None:
+                self._jobs[key] = RefreshJob(key, True, self.clock())
+            else:
+                job.configured = True
+        self._wake.set()
+        return key
+
+    # a user asks for a universe: counts towards its priority (and keeps it hot), returns its latest snapshot
+    # or None. a universe seen for the first time is not refreshed now, the user loads it and can publish it
+    def request(self, selected_indices, period, interval):
+        key = load_key(selected_indices, period, interval)
+        now = self.clock()
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is None:
+                self._make_room()
+                job = self._jobs[key] = RefreshJob(key, False, now + refresh_seconds(interval))
+                self._wake.set()
+            job.requests += 1
+            job.last_requested = now
+            return self._snapshots.get(key)
+
+    # drops the least recently requested of the requested jobs when there is no room for another one
+    def _make_room(self):
+        requested = [job for job in self._jobs.values() if not job.configured]
+        if len(requested) >= self.max_requested:
+            oldest = min(requested, key=lambda job: job.last_requested or 0)
+            del self._jobs[oldest.key]
+
+    # publishes a load the app did itself, so the scheduler serves it and waits a full interval before refreshing
+    def publish(self, key, company_info, summary, created=None, duration=0.0):
+        snapshot = Snapshot(key, company_info, summary, self.clock() if created is None else created, duration)
+        with self._lock:
+            self._snapshots[key] = snapshot
+            job = self._jobs.get(key)
+            if job is not None:
+                job.next_due = max(job.next_due, snapshot.created + refresh_seconds(key[2]))
+        return snapshot
+
+    def latest(self, key):
+        with self._lock:
+            return self._snapshots.get(key)
+
+    # the due job to refresh next (most requested first, then the longest overdue) or None, idle requested
+    # jobs are dropped on the way
+    def _next_due(self, now):
+        with self._lock:
+            for key, job in list(self._jobs.items()):
+                if not job.configured and now - (job.last_requested or 0) > self.idle_seconds:
+                    del self._jobs[key]
+                    self._snapshots.pop(key, None)
+            due = [job for job in self._jobs.values() if job.next_due <= now]
+            if not due:
+                return None
+            return min(due, key=lambda job: (-job.requests, job.next_due))
+
+    def _refresh(self, job):
+        selected_indices, period, interval = job.key
+        started = self.clock()
+        self._running = job.key
+        try:
+            result = self.load(list(selected_indices), period, interval, self.limiter)
+        except Exception as error:
+            reporting.error(f"Refresh of {', '.join(selected_indices)} {period}/{interval} failed: {error}")
+            result = None
+        finally:
+            self._running = None
+
+        with self._lock:
+            if result is None:
+                job.failures += 1
+                job.next_due = started + min(RETRY_SECONDS, refresh_seconds(interval))
+                return False
+            company_info, summary = result
+            self._snapshots[job.key] = Snapshot(job.key, company_info, summary, started, self.clock() - started)
+            job.refreshes += 1
+            job.next_due = started + refresh_seconds(interval)
+            return True
+
+    # refreshes every job that is due now, one after the other, returns how many were refreshed
+    def run_pending(self):
+        refreshed = 0
+        while not self._stopping.is_set():
+            job = self._next_due(self.clock())
+            if job is None:
+                break
+            refreshed += self._refresh(job)
+        return refreshed
+
+    def _seconds_until_next(self):
+        with self._lock:
+            if not self._jobs:
+                return None
+            return max(0.0, min(job.next_due for job in self._jobs.values()) - self.clock())
+
+    def _run(self):
+        # the app thread reports to streamlit, refreshes only log
+        reporting.set_thread_reporter(reporting.LoggingReporter())
+        while not self._stopping.is_set():
+            self._wake.clear()
+            self.run_pending()
+            self._wake.wait(self._seconds_until_next())
+
+    # starts the background thread (once, later calls do nothing)
+    def start(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name='refresh-scheduler', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stopping.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    # one row per job for the status panel
+    def status(self):
+        now = self.clock()
+        with self._lock:
+            rows = []
+            for key, job in self._jobs.items():
+                snapshot = self._snapshots.get(key)
+                rows.append({
+                    'Indices': ', '.join(key[0]),
+                    'Period': key[1],
+                    'Interval': key[2],
+                    'Source': 'configured' if job.configured else 'requested',
+                    'Requests': job.requests,
+                    'Age (s)': None if snapshot is None else round(snapshot.age(now)),
+                    'Next In (s)': 0 if key == self._running else round(max(0.0, job.next_due - now)),
+                    'Refreshes': job.refreshes,
+                    'Failures': job.failures,
+                })
+            return rows
+
+# loads a snapshot the streamed way (only summaries are kept in memory), returns (company_info, summary) or
+# None. a refresh where a batch failed is not published, the previous snapshot stays until the next one
+def load_snapshot(selected_indices, period, interval, limiter=None):
+    with record_load('background', indices=list(selected_indices), period=period, interval=interval):
+        chunks = list(stream_summary_data(selected_indices, period, interval, max_workers=REFRESH_WORKERS, limiter=limiter))
+    summary = combine_summary_chunks(chunks)
+    if summary is None or any(chunk.failed for chunk in chunks):
+        return None
+    return chunks[-1].company_info, summary
+
+# universes to keep hot from SCREENER_REFRESH, e.g. "NASDAQ+NYSE:5d:15m DOWJONES:3d:1h"
+def parse_refresh_config(config):
+    jobs = []
+    for entry in config.replace(';', ' ').split():
+        try:
+            indices, period, interval = entry.split(':')
+        except ValueError:
+            reporting.warning(f"Ignoring refresh entry {entry!r}, expected INDICES:period:interval")
+            continue
+        selected_indices = [index_name.upper() for index_name in indices.split('+')]
+        is_valid, validation_error = validate_period_interval(period, interval)
+        unknown = [index_name for index_name in selected_indices if index_name not in INDEX_CONFIGS]
+        if unknown or not is_valid:
+            reporting.warning(f"Ignoring refresh entry {entry!r}: {validation_error or 'unknown index ' + ', '.join(unknown)}")
+            continue
+        jobs.append((selected_indices, period, interval))
+    return jobs
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+# the process wide scheduler with the SCREENER_REFRESH universes, created and started on first use
+def get_refresh_scheduler():
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = RefreshScheduler()
+            for selected_indices, period, interval in parse_refresh_config(os.environ.get('SCREENER_REFRESH', '')):
+                _scheduler.add(selected_indices, period, interval)
+            _scheduler.start()
+        return _scheduler
@@ -0,0 +1,126 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger('screener')
+
+# where the data and analysis layers send their status messages and progress. they never talk to the UI
+# directly, so they run the same inside a streamlit session, from the command line or in a worker. the
+# base reporter drops everything, LoggingReporter (the default) logs and the app installs a streamlit one
+# (see streamlit_reporter.py) with set_reporter
+class Reporter:
+    def info(self, message):
+        pass
+
+    def success(self, message):
+        pass
+
+    def warning(self, message):
+        pass
+
+    def error(self, message):
+        pass
+
+    # a progress indicator for one task, update it with the completed fraction (0-1) and close it when done
+    def progress(self):
+        return Progress()
+
+# progress of one task, the base one shows nothing
+class Progress:
+    def update(self, fraction, text=None):
+        pass
+
+    def close(self):
+        pass
+
+# passes at most max_rate updates per second on to the wrapped progress, the ones in between are coalesced
+# into the latest. the first and the final (fraction 1) updates always go through, and whatever is still
+# pending is flushed on close. callers can then report after every ticker without flooding the UI
+class ThrottledProgress(Progress):
+    def __init__(self, progress, max_rate=10.0, clock=time.monotonic):
+        self.progress = progress
+        self.min_interval = 1.0 / max_rate
+        self.clock = clock
+        self.updates = 0     # update calls received
+        self.emitted = 0     # updates passed on
+        self._last_emitted = None
+        self._pending = None
+
+    def update(self, fraction, text=None):
+        self.updates += 1
+        now = self.clock()
+        if self._last_emitted is None or fraction >= 1 or now - self._last_emitted >= self.min_interval:
+            self._emit(fraction, text, now)
+        else:
+            pending_text = text if text is not None or self._pending is None else self._pending[1]
+            self._pending = (fraction, pending_text)
+
+    def _emit(self, fraction, text, now):
+        self.progress.update(fraction, text)
+        self.emitted += 1
+        self._last_emitted = now
+        self._pending = None
+
+    def close(self):
+        if self._pending is not None:
+            self._emit(*self._pending, self.clock())
+        self.progress.close()
+
+# logs the messages (without the streamlit markdown) and the progress of long tasks every few seconds
+class LoggingReporter(Reporter):
+    def __init__(self, progress_interval=5.0):
+        self.progress_interval = progress_interval
+
+    def info(self, message):
+        logger.info(_plain(message))
+
+    def success(self, message):
+        logger.info(_plain(message))
+
+    def warning(self, message):
+        logger.warning(_plain(message))
+
+    def error(self, message):
+        logger.error(_plain(message))
+
+    def progress(self):
+        return ThrottledProgress(LoggingProgress(), max_rate=1.0 / self.progress_interval)
+
+class LoggingProgress(Progress):
+    def update(self, fraction, text=None):
+        logger.info(f"{fraction:.0%} {text or ''}".rstrip())
+
+# messages are written with streamlit markdown, logs get them without the bold markers
+def _plain(message):
+    return message.replace('**', '')
+
+_reporter = LoggingReporter()
+_thread = threading.local()
+
+# the reporter of the calling thread if it set one, the process wide one otherwise
+def get_reporter():
+    return getattr(_thread, 'reporter', None) or _reporter
+
+def set_reporter(reporter):
+    global _reporter
+    _reporter = reporter
+
+# reporter for the calling thread only (None goes back to the process wide one), so a background thread can
+# log while the app thread reports to streamlit
+def set_thread_reporter(reporter):
+    _thread.reporter = reporter
+
+def info(message):
+    get_reporter().info(message)
+
+def success(message):
+    get_reporter().success(message)
+
+def warning(message):
+    get_reporter().warning(message)
+
+def error(message):
+    get_reporter().error(message)
+
+def progress():
+    return get_reporter().progress()
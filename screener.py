@@ -1,9 +1,25 @@
+import json
+import os
+import time
 import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 from datetime import datetime
 from utils import *
 from data_loader import *
 from analysis import *
 from visuals import *
+from pipeline import stream_summary_data, combine_summary_chunks
+from screening import ScreeningIndex
+from screens import load_screens, save_screen, delete_screen, missing_columns, evaluate_screens, screen_rows
+from shared_cache import get_shared_cache, load_key
+from refresh_scheduler import get_refresh_scheduler
+from incremental import SummaryState, refresh_summary
+from ohlcv_cache import OHLCVCache
+from export import EXPORT_FORMATS, EXPORT_FORMAT_LABELS, get_export_cache
+from data_store import get_data_store
+from reporting import set_reporter, get_reporter
+from instrumentation import record_load, stage, get_metrics_registry, log_loads_to_stderr
+from streamlit_reporter import StreamlitReporter
 
 # page configuration 
 st.set_page_config(
@@ -119,19 +135,361 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+# messages and progress from the data and analysis layers are shown in the page
+set_reporter(StreamlitReporter())
+
+# a JSON line per load on stderr, for the log collector
+log_loads_to_stderr()
+
+# seconds between redraws of the partial summary table while a streamed load is running
+STREAM_REDRAW_SECONDS = 0.5
+
 default_session_state = {
     'data_loaded': False,
-    'raw_data': None,
-    'summary_data': None,
+    'dataset': None,
     'selected_indices': None, 
-    'filtered_data': None,
-    'filters_applied': False
+    'filtered_rows': None,
+    'filters_applied': False,
+    'live_filters': True,
+    'data_as_of': None,
+    'period': None,
+    'interval': None,
+    'summary_state': None,
+    'gap_chart_mode': 'auto',
+    'table_sort': None,
+    'table_descending': True,
+    'table_page_size': 50,
+    'table_page': 1,
+    'export_format': 'csv',
+    'last_load': None,
+    'last_render': None,
+    'saved_screen': None,
+    'new_screen_name': ''
 }
 
-for key, default_value in default_session_state.items():
+TABLE_PAGE_SIZES = [25, 50, 100, 250]
+
+# filter widget values (by widget key) the screening interface starts with and goes back to on reset
+FILTER_DEFAULTS = {
+    'filter_price_min': DEFAULT_FILTERS['price_min'],
+    'filter_price_max': DEFAULT_FILTERS['price_max'],
+    'filter_min_volume': DEFAULT_FILTERS['min_volume'],
+    'filter_min_avg_volume': DEFAULT_FILTERS['min_avg_volume'],
+    'filter_gap_pct': DEFAULT_FILTERS['gap_pct_threshold'],
+    'filter_min_atr': DEFAULT_FILTERS['min_atr'],
+    'filter_sectors': []
+}
+
+# the screen_stocks argument each filter widget sets, for saving the widgets as a screen and back
+FILTER_ARGUMENTS = {
+    'filter_price_min': 'price_min',
+    'filter_price_max': 'price_max',
+    'filter_min_volume': 'min_volume',
+    'filter_min_avg_volume': 'min_avg_volume',
+    'filter_gap_pct': 'gap_pct_threshold',
+    'filter_min_atr': 'min_atr',
+    'filter_sectors': 'selected_sectors'
+}
+
+# anomaly detector settings (by widget key), kept across filter resets
+ANOMALY_DEFAULTS = {
+    'anomaly_method': 'zscore',
+    'anomaly_by_sector': False,
+    'anomaly_threshold': DEFAULT_ANOMALY_THRESHOLD,
+    'anomaly_top_n': DEFAULT_ANOMALY_TOP_N
+}
+
+ANOMALY_METHOD_LABELS = {'zscore': "Mean / std", 'robust': "Median / MAD"}
+
+# how the gap chart is drawn (see visuals.GAP_CHART_MODES)
+GAP_CHART_MODE_LABELS = {
+    'auto': "Auto",
+    'bars': "Every stock",
+    'top': f"Top {GAP_CHART_TOP_N} each way + rest",
+    'histogram': "Histogram",
+    'webgl': "Every stock (WebGL)"
+}
+
+for key, default_value in {**default_session_state, **FILTER_DEFAULTS, **ANOMALY_DEFAULTS}.items():
     if key not in st.session_state:
         st.session_state[key] = default_value
 
+# puts the filter widgets back to their defaults (called before the widgets are drawn)
+def reset_filters():
+    for key, default_value in FILTER_DEFAULTS.items():
+        st.session_state[key] = default_value
+    st.session_state.filtered_rows = None
+    st.session_state.filters_applied = False
+
+# whether any filter widget is away from its default
+def filters_changed():
+    return any(st.session_state[key] != default_value for key, default_value in FILTER_DEFAULTS.items())
+
+# the loaded frames (raw_data, company_info, summary) live in the data store, shared with every session that
+# loaded the same data and spilled to disk when memory runs short. the session only keeps its dataset's key
+def session_frame(name):
+    return get_data_store().get(st.session_state.dataset, name)
+
+def session_id():
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx is not None else 'local'
+
+def use_dataset(dataset):
+    st.session_state.dataset = dataset
+    get_data_store().attach(session_id(), dataset)
+
+# stores the frames of a load (or refresh) as the dataset of key at loaded_at and returns the dataset's key
+def store_dataset(key, loaded_at, raw_data, company_info, summary_data):
+    indices, period, interval = key
+    return get_data_store().put(
+        (key, loaded_at),
+        {'raw_data': raw_data, 'company_info': company_info, 'summary': summary_data},
+        label=f"{' + '.join(indices)} {period}/{interval}"
+    )
+
+# the screening index of the current summary, built once per dataset (and shared like it)
+def get_screening_index():
+    return get_data_store().derived(
+        st.session_state.dataset, 'screening_index', lambda: ScreeningIndex(session_frame('summary'))
+    )
+
+# one page of the results, sorted on the screening index (only the rows of the page are copied and styled, so
+# a rerun costs the same for a hundred stocks or for thousands). without a sort column the rows come highest
+# absolute gap first, for all stocks as for a screen
+def results_page(current_rows):
+    start = (st.session_state.table_page - 1) * st.session_state.table_page_size
+    end = start + st.session_state.table_page_size
+    index = get_screening_index()
+    if st.session_state.table_sort is None:
+        if current_rows is None:
+            rows = index.gap_order
+        else:
+            rows = current_rows[np.argsort(index.rank_by_gap[current_rows], kind='stable')]
+    else:
+        rows = np.arange(len(index)) if current_rows is None else current_rows
+        rows = index.order(rows, st.session_state.table_sort, ascending=not st.session_state.table_descending)
+    return index.summary.iloc[rows[start:end]]
+
+# the results table with its sort and page controls
+def results_table(current_data, current_rows):
+    page_count = max(1, -(-len(current_data) // st.session_state.table_page_size))
+    st.session_state.table_page = min(st.session_state.table_page, page_count)
+    if st.session_state.table_sort not in current_data.columns:
+        st.session_state.table_sort = None
+
+    col1, col2, col3, col4 = st.columns([2, 1, 1, 1])
+    with col1:
+        st.selectbox(
+            "Sort by",
+            options=[None] + list(current_data.columns),
+            format_func=lambda column: "Gap (largest first)" if column is None else column,
+            key='table_sort'
+        )
+    with col2:
+        st.toggle("Descending", key='table_descending', disabled=st.session_state.table_sort is None)
+    with col3:
+        st.selectbox("Rows per page", options=TABLE_PAGE_SIZES, key='table_page_size')
+    with col4:
+        st.number_input("Page", min_value=1, max_value=page_count, step=1, key='table_page')
+
+    page = results_page(current_rows)
+    first_row = (st.session_state.table_page - 1) * st.session_state.table_page_size
+    st.dataframe(apply_gap_styling(page), use_container_width=True, height=400, hide_index=True)
+    st.caption(f"Rows {first_row + 1:,}-{first_row + len(page):,} of {len(current_data):,}")
+
+# download buttons for the screened stocks and their raw bars. the files are built only when a button is
+# clicked (streamlit runs data callables in a thread of their own, so they only capture plain values) and kept
+# in the export cache by fingerprint, reruns do not convert anything
+def export_panel(current_rows):
+    indices_filename = '_'.join(st.session_state.selected_indices).replace(' ', '_')
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    export_cache, store = get_export_cache(), get_data_store()
+    period, interval = st.session_state.period, st.session_state.interval
+    dataset = st.session_state.dataset
+    as_of = (st.session_state.data_as_of, period, interval)
+
+    # the screened rows of the dataset, read from the store when the file is built
+    def screened_rows():
+        summary = store.get(dataset, 'summary')
+        return summary if current_rows is None else summary.iloc[current_rows]
+
+    col1, col2, col3 = st.columns([1, 2, 2])
+    with col1:
+        st.selectbox(
+            "Format", options=list(EXPORT_FORMATS), format_func=EXPORT_FORMAT_LABELS.get, key='export_format',
+            label_visibility='collapsed'
+        )
+    file_format = st.session_state.export_format
+    mime, extension = EXPORT_FORMATS[file_format]
+
+    def screened_file():
+        return export_cache.frame(screened_rows(), file_format, interval)
+
+    # without raw bars in memory (streamed load) they are read back from the OHLCV cache
+    def raw_bars_file():
+        return export_cache.raw_bars(
+            screened_rows()['Ticker'], file_format, as_of, interval, store.get(dataset, 'raw_data'),
+            bars_from_cache=lambda tickers: OHLCVCache().read(tickers, period, interval)
+        )
+
+    with col2:
+        st.download_button(
+            label=f" Download as {EXPORT_FORMAT_LABELS[file_format]}",
+            type="primary",
+            data=screened_file,
+            file_name=f"screened_stocks_{indices_filename}_{timestamp}.{extension}",
+            mime=mime,
+            use_container_width=True
+        )
+    with col3:
+        st.download_button(
+            label=" Download raw bars",
+            type="secondary",
+            data=raw_bars_file,
+            file_name=f"screened_bars_{indices_filename}_{period}_{interval}_{timestamp}.{extension}",
+            mime=mime,
+            help="Every bar of the screened stocks, written in chunks of tickers",
+            use_container_width=True
+        )
+
+# the debug panel is shown with SCREENER_DEBUG set or ?debug=1 in the url
+def debug_enabled():
+    return bool(os.environ.get('SCREENER_DEBUG')) or st.query_params.get('debug') == '1'
+
+# per stage timings of a load (or render) record, for the debug panel
+def stage_table(record):
+    return pd.DataFrame([
+        {'Stage': name, 'Wall (s)': stage['wall_s'], 'Calls': stage['calls'], 'Peak RSS (MB)': stage['peak_rss_mb']}
+        for name, stage in record['stages'].items()
+    ], columns=['Stage', 'Wall (s)', 'Calls', 'Peak RSS (MB)'])
+
+# where the last load of this session and the last render spent their time, the counters of the load and the
+# metrics of the whole process as they are written for monitoring
+def debug_panel():
+    with st.expander("Debug", expanded=True):
+        last_load = st.session_state.last_load
+        if last_load is None:
+            st.caption("No load recorded in this session yet")
+        else:
+            record = last_load.as_dict()
+            counters = record['counters']
+            st.markdown(
+                f"##### Last {record['event']} ({record['source']}): "
+                f"{record['wall_s'] or 0:.2f} s"
+            )
+            col1, col2, col3, col4, col5, col6, col7 = st.columns(7)
+            with col1:
+                st.metric("Requested", f"{counters['tickers_requested']:,}")
+            with col2:
+                st.metric("Returned", f"{counters['tickers_returned']:,}")
+            with col3:
+                st.metric("Empty", f"{counters['tickers_empty']:,}")
+            with col4:
+                st.metric("Failed", f"{counters['tickers_failed']:,}")
+            with col5:
+                st.metric("Skipped", f"{counters['tickers_skipped']:,}")
+            with col6:
+                st.metric("Retries", f"{counters['retries']:,}")
+            with col7:
+                st.metric("Cache Hits", f"{counters['cache_hits']:,}")
+            st.dataframe(stage_table(record), use_container_width=True, hide_index=True)
+
+        last_render = st.session_state.last_render
+        if last_render is not None:
+            record = last_render.as_dict()
+            st.markdown(f"##### Last render: {record['wall_s'] or 0:.2f} s")
+            st.dataframe(stage_table(record), use_container_width=True, hide_index=True)
+
+        metrics_file = get_metrics_registry().path
+        st.caption(f"Process metrics (written to {metrics_file or 'no file, SCREENER_METRICS_FILE is empty'})")
+        st.code(get_metrics_registry().prometheus_text(), language='text')
+
+# the saved screens the current summary has every column for, and the names of the others
+def usable_screens(summary_data):
+    screens = load_screens()
+    usable = {name: filters for name, filters in screens.items() if not missing_columns(filters, summary_data)}
+    return usable, [name for name in screens if name not in usable]
+
+# which stocks pass each saved screen, evaluated together in one pass and kept with the dataset until the
+# screens change (a refresh is a new dataset, so they are evaluated again on the new rows)
+def get_screen_membership(screens):
+    return get_data_store().derived(
+        st.session_state.dataset, ('screens', json.dumps(screens, sort_keys=True)),
+        lambda: evaluate_screens(get_screening_index(), screens)
+    )
+
+# shows the stocks of the selected saved screen and puts its filters in the filter widgets. the widgets have
+# no metric ranges, so a screen with any turns live filters off to keep its results
+def show_saved_screen():
+    name = st.session_state.saved_screen
+    screens, _ = usable_screens(session_frame('summary'))
+    if name not in screens:
+        return
+    filters = {**DEFAULT_FILTERS, **screens[name]}
+    for key, default_value in FILTER_DEFAULTS.items():
+        value = filters[FILTER_ARGUMENTS[key]]
+        st.session_state[key] = list(value or []) if key == 'filter_sectors' else type(default_value)(value)
+    if filters.get('metric_ranges'):
+        st.session_state.live_filters = False
+    st.session_state.filtered_rows = screen_rows(get_screening_index(), get_screen_membership(screens), name)
+    st.session_state.filters_applied = True
+
+# saves the current filter widget values under the typed name
+def save_current_filters():
+    name = st.session_state.new_screen_name.strip()
+    if name:
+        save_screen(name, {FILTER_ARGUMENTS[key]: st.session_state[key] for key in FILTER_DEFAULTS})
+        st.session_state.saved_screen = name
+        st.session_state.new_screen_name = ''
+
+def delete_saved_screen():
+    if st.session_state.saved_screen is not None:
+        delete_screen(st.session_state.saved_screen)
+        st.session_state.saved_screen = None
+
+# how many stocks pass each saved screen, and the controls to show, save and delete screens
+def saved_screens_panel(summary_data):
+    with st.expander("Saved Screens"):
+        screens, unusable = usable_screens(summary_data)
+        if unusable:
+            st.warning(f"Not evaluated, the summary lacks some of their columns: {', '.join(unusable)}")
+        if screens:
+            membership = get_screen_membership(screens)
+            st.dataframe(
+                pd.DataFrame({'Screen': list(screens), 'Stocks': membership.sum().to_numpy()}),
+                use_container_width=True, hide_index=True
+            )
+        if st.session_state.saved_screen not in screens:
+            st.session_state.saved_screen = None
+
+        col1, col2, col3 = st.columns([2, 1, 1])
+        with col1:
+            st.selectbox("Screen", options=list(screens), key='saved_screen', placeholder="Choose a saved screen")
+        with col2:
+            st.button("Show", use_container_width=True, on_click=show_saved_screen,
+                      disabled=st.session_state.saved_screen is None)
+        with col3:
+            st.button("Delete", use_container_width=True, on_click=delete_saved_screen,
+                      disabled=st.session_state.saved_screen is None)
+        col1, col2 = st.columns([2, 2])
+        with col1:
+            st.text_input("Name", key='new_screen_name', placeholder="Name for the current filters")
+        with col2:
+            st.button("Save Current Filters", use_container_width=True, on_click=save_current_filters,
+                      disabled=not st.session_state.new_screen_name.strip())
+
+# screens the summary with the current filter widget values, returns the positions of the rows that pass
+def screen_with_current_filters():
+    return get_screening_index().screen(
+        st.session_state.filter_price_min,
+        st.session_state.filter_price_max,
+        st.session_state.filter_gap_pct,
+        st.session_state.filter_min_volume,
+        st.session_state.filter_min_avg_volume,
+        st.session_state.filter_min_atr,
+        st.session_state.filter_sectors
+    )
+
 
 # shows the initial screen that prompts the user to choose the index, period and interval 
 def configuration_screen():
@@ -172,6 +530,12 @@ def configuration_screen():
                 help="Data interval (frequency)"
             )        
     
+    stream_results = st.checkbox(
+        "Stream results while downloading",
+        value=True,
+        help="Summarise every batch as soon as it arrives and keep the raw bars on disk instead of in memory"
+    )
+    
     st.markdown('</div>', unsafe_allow_html=True)
     st.markdown('<div class="section-divider">', unsafe_allow_html=True)
     
@@ -196,51 +560,228 @@ def configuration_screen():
     else:
         if st.button("Load Data", type="primary", use_container_width=True):
             st.session_state.selected_indices = selected_indices
+            key = load_key(selected_indices, period, interval)
             
-            with st.spinner(f"Loading data for {', '.join(selected_indices)}..."):
-                raw_data = download_index_data(selected_indices, period, interval)
+            # a fresh snapshot of the background refresh is served as is, otherwise sessions asking for the same
+            # indices, period and interval share one load (and its result until it expires)
+            with record_load('load', indices=list(selected_indices), period=period, interval=interval,
+                             stream=stream_results) as metrics:
+                scheduler = get_refresh_scheduler()
+                snapshot = scheduler.request(selected_indices, period, interval)
+                if snapshot is not None and snapshot.is_fresh():
+                    metrics.label('source', 'snapshot')
+                    dataset = store_dataset(key, snapshot.created, None, snapshot.company_info, snapshot.summary)
+                else:
+                    # the shared cache hands out the key of the load's dataset, the frames stay in the data store
+                    def load():
+                        metrics.label('source', 'download')
+                        result = load_data(selected_indices, period, interval, stream_results)
+                        if result is None:
+                            return None
+                        raw_data, company_info, summary_data, loaded_at = result
+                        scheduler.publish(key, company_info, summary_data, created=loaded_at)
+                        return store_dataset(key, loaded_at, raw_data, company_info, summary_data)
+
+                    metrics.label('source', 'shared_cache')
+                    # the data store holds the frames and enforces the memory budget, the shared cache only keeps
+                    # dataset keys other sessions can reuse. each entry counts the footprint of its dataset, so
+                    # SCREENER_SHARED_CACHE_MB caps how much loaded data stays reusable and its stats stay true
+                    shared_cache = get_shared_cache()
+                    dataset = shared_cache.get_or_load(
+                        key, interval, load, size_of=get_data_store().size_of,
+                        on_wait=lambda: st.info("Another session is loading the same data, waiting for it...")
+                    )
+                    # a dataset nobody used for hours is dropped from the store, load it again
+                    if dataset is not None and not get_data_store().has(dataset):
+                        shared_cache.invalidate(key)
+                        dataset = shared_cache.get_or_load(key, interval, load, size_of=get_data_store().size_of)
+                summary_data = None if dataset is None else get_data_store().get(dataset, 'summary')
+                metrics.label('stocks', 0 if summary_data is None else len(summary_data))
+            st.session_state.last_load = metrics
+            
+            if dataset is not None:
+                use_dataset(dataset)
+                st.session_state.data_as_of = dataset[1]
+                st.session_state.period = period
+                st.session_state.interval = interval
+                st.session_state.summary_state = None
+                st.session_state.data_loaded = True
+                st.session_state.filters_applied = False
+                st.session_state.filtered_rows = None
+                st.rerun()
+
+# downloads and summarises the selected indices, returns (raw_data, company_info, summary_data, loaded_at) or
+# None, loaded_at is the time.time() the download started. streamed loads keep no raw bars in memory (raw_data is None)
+def load_data(selected_indices, period, interval, stream_results):
+    loaded_at = time.time()
+    if stream_results:
+        summary_data, company_info = load_streaming(selected_indices, period, interval)
+        if summary_data is None:
+            return None
+        return None, company_info, summary_data, loaded_at
+    
+    with st.spinner(f"Loading data for {', '.join(selected_indices)}..."):
+        raw_data, company_info = download_index_data(selected_indices, period, interval)
+        
+        if raw_data is not None:
+            with st.spinner("Creating summary data..."):
+                summary_data = create_summary_data(raw_data, company_info)
                 
-                if raw_data is not None:
-                    st.session_state.raw_data = raw_data
-                    
-                    with st.spinner("Creating summary data..."):
-                        summary_data = create_summary_data(raw_data)
-                        
-                        if summary_data is not None:
-                            st.session_state.summary_data = summary_data
-                            st.session_state.data_loaded = True
-                            st.session_state.filters_applied = False
-                            st.session_state.filtered_data = None
-                            st.rerun()
+                if summary_data is not None:
+                    return raw_data, company_info, summary_data, loaded_at
+    return None
+
+# loads the data in streaming mode, the summary table and metrics fill up as the batches come in
+def load_streaming(selected_indices, period, interval):
+    progress = get_reporter().progress()
+    metrics_placeholder = st.empty()
+    table_placeholder = st.empty()
+    
+    chunks = []
+    company_info = None
+    failed_batches = 0
+    last_drawn = None
+    for chunk in stream_summary_data(selected_indices, period, interval):
+        chunks.append(chunk)
+        company_info = chunk.company_info
+        failed_batches += chunk.failed
+        
+        progress.update(chunk.done / chunk.total, f"Processed {chunk.done}/{chunk.total} stocks...")
+        
+        # the table is resent whole on every redraw, so it is redrawn at most every STREAM_REDRAW_SECONDS
+        if last_drawn is not None and time.monotonic() - last_drawn < STREAM_REDRAW_SECONDS:
+            continue
+        summary_so_far = combine_summary_chunks(chunks)
+        if summary_so_far is not None:
+            last_drawn = time.monotonic()
+            with metrics_placeholder.container():
+                col1, col2, col3, col4 = st.columns(4)
+                with col1:
+                    st.metric("Stocks Summarised", f"{len(summary_so_far):,}")
+                with col2:
+                    st.metric("Avg Price", f"${summary_so_far['Price ($)'].mean():.2f}")
+                with col3:
+                    st.metric("Avg Gap", f"{summary_so_far['Gap (%)'].mean():.2f}%")
+                with col4:
+                    st.metric("Total Volume", f"{summary_so_far['Volume'].sum():,.0f}")
+            table_placeholder.dataframe(summary_so_far, use_container_width=True, height=400)
+    
+    progress.close()
+    
+    if failed_batches:
+        st.warning(f"{failed_batches} batches failed to download")
+    
+    summary_data = combine_summary_chunks(chunks)
+    if summary_data is None:
+        st.error("No summary data created")
+        return None, None
+    
+    st.success(f"Successfully processed {len(summary_data)} stocks")
+    return summary_data, company_info
+
+# brings the loaded data up to date: only the bars after each stock's last one are fetched and only the summary
+# rows of the stocks that got new bars are recomputed (see incremental.py). the state this needs is built from the
+# raw bars on the first refresh (read back from the on-disk cache when they are not kept in memory)
+def refresh_data():
+    selected_indices, period, interval = st.session_state.selected_indices, st.session_state.period, st.session_state.interval
+    with record_load('refresh', indices=list(selected_indices), period=period, interval=interval) as metrics:
+        metrics.label('source', 'incremental')
+        st.session_state.last_load = metrics
+        started = time.time()
+        state = st.session_state.summary_state
+        if state is None:
+            with st.spinner("Preparing the incremental refresh..."):
+                raw_data = session_frame('raw_data')
+                if raw_data is None:
+                    raw_data = OHLCVCache().read(list(session_frame('summary')['Ticker']), period, interval)
+                if raw_data is None or raw_data.empty:
+                    st.error("No cached bars to refresh from, load the data again")
+                    return
+                with stage('summary_state'):
+                    state = SummaryState.from_bars(raw_data)
+                st.session_state.summary_state = state
+
+        with st.spinner(f"Fetching new bars for {', '.join(selected_indices)}..."):
+            company_info = session_frame('company_info')
+            summary_data, raw_data, new_bars = refresh_summary(
+                session_frame('summary'), state, period, interval, company_info, session_frame('raw_data')
+            )
+        if not new_bars:
+            st.info("No new bars since the last load")
+            return
+
+        key = load_key(selected_indices, period, interval)
+        use_dataset(store_dataset(key, started, raw_data, company_info, summary_data))
+        st.session_state.data_as_of = started
+        if st.session_state.filters_applied and not st.session_state.live_filters:
+            st.session_state.filtered_rows = screen_with_current_filters()
+        # other sessions get the refreshed summary too
+        get_refresh_scheduler().publish(key, company_info, summary_data, created=started)
+        st.rerun()
 
 # displays the main interface that shocases the stock data and other visuals
 def screening_interface():
     st.markdown('<h1 class="main-header">[: Multi-Index Stock Screener :]</h1>', unsafe_allow_html=True)
     st.markdown('<div class="section-divider">', unsafe_allow_html=True)
     
+    summary_data = session_frame('summary')
+    if summary_data is None:
+        # the dataset was dropped from the store after hours without use
+        use_dataset(None)
+        st.session_state.data_loaded = False
+        st.warning("The loaded data expired, please load it again")
+        st.button("Back to Configuration", type="primary")
+        return
+
     # show the current configuration (index choses and how many stocks loaded)
-    col1, col2 = st.columns([3, 1])
+    col1, col2, col3 = st.columns([3, 1, 1])
     with col1:
         # Format the selected indices for display
         indices_display = ', '.join(st.session_state.selected_indices) if st.session_state.selected_indices else "None"
-        st.info(f"**Current Data:** {indices_display} | {len(st.session_state.summary_data)} stocks loaded")
+        usage = get_data_store().session_usage(session_id())
+        data_memory = f"{format_bytes(usage['bytes'])} {'in memory' if usage['in_memory'] else 'on disk'}"
+        if usage['sessions'] > 1:
+            data_memory += f" (shared by {usage['sessions']} sessions)"
+        if 'raw_data' not in usage['frames']:
+            data_memory += ", raw bars kept on disk"
+        data_age = format_age(time.time() - st.session_state.data_as_of) if st.session_state.data_as_of else "unknown"
+        st.info(
+            f"**Current Data:** {indices_display} | {len(summary_data)} stocks loaded | "
+            f"{data_memory} | loaded {data_age} ago"
+        )
     with col2:
         if st.button("Load New Data", type="primary", use_container_width=True):
             st.session_state.data_loaded = False
-            st.session_state.raw_data = None
-            st.session_state.summary_data = None
+            use_dataset(None)
             st.session_state.selected_indices = None  
-            st.session_state.filtered_data = None
-            st.session_state.filters_applied = False
+            st.session_state.data_as_of = None
+            st.session_state.summary_state = None
+            reset_filters()
             st.rerun()
+    with col3:
+        if st.button("Refresh", use_container_width=True, help="Fetch only the bars after each stock's last one and update their rows"):
+            refresh_data()
+    
+    # with live filters every widget change reruns the screen (a few array lookups on the screening index).
+    # while every filter is at its default all stocks are shown, as before any filter is applied
+    if st.session_state.live_filters:
+        if filters_changed():
+            with stage('screen'):
+                st.session_state.filtered_rows = screen_with_current_filters()
+            st.session_state.filters_applied = True
+        else:
+            st.session_state.filtered_rows = None
+            st.session_state.filters_applied = False
     
     st.markdown('<div class="heading-divider">', unsafe_allow_html=True)
-    # determine which data to display
-    if st.session_state.filters_applied and st.session_state.filtered_data is not None:
-        current_data = st.session_state.filtered_data
+    # determine which data to display, the filtered stocks are kept as row positions into the summary
+    if st.session_state.filters_applied and st.session_state.filtered_rows is not None:
+        current_rows = st.session_state.filtered_rows
+        current_data = summary_data.iloc[current_rows]
         data_type = "Filtered"
     else:
-        current_data = st.session_state.summary_data
+        current_rows = None
+        current_data = summary_data
         data_type = "All"
     
     # display the data summary
@@ -251,12 +792,12 @@ def screening_interface():
     if st.session_state.filters_applied:
         if not current_data.empty:
             st.markdown(
-                f'<div class="success-banner"> Showing {len(current_data)} filtered stocks (out of {len(st.session_state.summary_data)} total)</div>',
+                f'<div class="success-banner"> Showing {len(current_data)} filtered stocks (out of {len(summary_data)} total)</div>',
                 unsafe_allow_html=True
             )
         else:
             st.markdown(
-                f'<div class="error-banner"> No stocks found meeting the current criteria (out of {len(st.session_state.summary_data)} total)</div>',
+                f'<div class="error-banner"> No stocks found meeting the current criteria (out of {len(summary_data)} total)</div>',
                 unsafe_allow_html=True
             )
     
@@ -286,29 +827,29 @@ def screening_interface():
         st.markdown('<div class="heading-divider">', unsafe_allow_html=True)
         price_col1, price_col2 = st.columns(2)
         with price_col1:
-            price_min = st.number_input("Min Price ($)", min_value=0.01, value=0.1, step=0.1, format="%.2f")
+            st.number_input("Min Price ($)", min_value=0.01, step=0.1, format="%.2f", key='filter_price_min')
         with price_col2:
-            price_max = st.number_input("Max Price ($)", min_value=0.01, value=1000.0, step=1.0, format="%.2f")
+            st.number_input("Max Price ($)", min_value=0.01, step=1.0, format="%.2f", key='filter_price_max')
     
     with col2:
         st.markdown("##### Volume Requirements")
         st.markdown('<div class="heading-divider">', unsafe_allow_html=True)
         vol_col1, vol_col2 = st.columns(2)
         with vol_col1:
-            min_volume = st.number_input(
+            st.number_input(
                 "Min Volume", 
                 min_value=0, 
-                value=1000, 
                 step=500,
-                help="Minimum current volume"
+                help="Minimum current volume",
+                key='filter_min_volume'
             )
         with vol_col2:
-            min_avg_volume = st.number_input(
+            st.number_input(
                 "Min Avg Volume", 
                 min_value=0, 
-                value=1000, 
                 step=500,
-                help="Minimum average volume"
+                help="Minimum average volume",
+                key='filter_min_avg_volume'
             )
     
     st.markdown('<div class="heading-divider">', unsafe_allow_html=True)
@@ -318,47 +859,63 @@ def screening_interface():
         st.markdown('<div class="heading-divider">', unsafe_allow_html=True)
         gap_col1, gap_col2 = st.columns(2)
         with gap_col1:
-            gap_pct_threshold = st.number_input(
+            st.number_input(
                 "Min Gap (%)", 
                 min_value=0.0, 
-                value=0.01, 
                 step=0.1, 
                 format="%.2f",
-                help="Minimum gap percentage required"
+                help="Minimum gap percentage required",
+                key='filter_gap_pct'
             )
         with gap_col2:
-            min_atr = st.number_input(
+            st.number_input(
                 "Min ATR", 
                 min_value=0.0, 
-                value=0.01, 
                 step=0.05, 
                 format="%.3f",
-                help="Minimum Average True Range"
+                help="Minimum Average True Range",
+                key='filter_min_atr'
             )
        
     with col2:
         st.markdown("##### Sector Filter")
         st.markdown('<div class="heading-divider">', unsafe_allow_html=True)
         available_sectors = sorted([
-            sector for sector in st.session_state.summary_data['Sector'].unique() 
+            sector for sector in summary_data['Sector'].unique() 
             if sector != 'N/A' and pd.notna(sector)
         ])
         
         if available_sectors:
-            selected_sectors = st.multiselect(
+            # sectors picked for an earlier summary may not exist in this one
+            st.session_state.filter_sectors = [
+                sector for sector in st.session_state.filter_sectors if sector in available_sectors
+            ]
+            st.multiselect(
                 "Select Sectors",
                 options=available_sectors,
-                help="Choose which sectors to include in the screening"
+                help="Choose which sectors to include in the screening",
+                key='filter_sectors'
             )
         else:
-            selected_sectors = []
+            st.session_state.filter_sectors = []
             st.info("No sector data available")
     
+    st.toggle(
+        "Live filters",
+        help="Update the results on every filter change instead of waiting for Apply Filters",
+        key='live_filters'
+    )
+    
     button_col1, button_col2 = st.columns(2)
     with button_col1:
-        run_screen = st.button("Apply Filters", type="secondary", use_container_width=True,)
+        run_screen = st.button(
+            "Apply Filters", type="secondary", use_container_width=True, disabled=st.session_state.live_filters
+        )
     with button_col2:
-        reset_filters = st.button("Reset Filters", type="secondary", use_container_width=True)
+        st.button("Reset Filters", type="secondary", use_container_width=True, on_click=reset_filters)
+
+    with stage('saved_screens'):
+        saved_screens_panel(summary_data)
     
     st.markdown('</div>', unsafe_allow_html=True)
     st.markdown('<div class="section-divider">', unsafe_allow_html=True)
@@ -366,15 +923,15 @@ def screening_interface():
     
     if not current_data.empty:
         # display data table
-        display_df = current_data.copy()
-        styled_df = apply_gap_styling(display_df)
-        st.dataframe(styled_df, use_container_width=True, height=400)
+        with stage('table'):
+            results_table(current_data, current_rows)
 
         st.markdown('<div class="section-divider">', unsafe_allow_html=True)
 
         # top movers tables
         st.markdown("### Top Movers")
-        gainers, losers = create_top_movers_tables(current_data)
+        with stage('top_movers'):
+            gainers, losers = create_top_movers_tables(current_data)
 
         if gainers is not None and losers is not None:
             col1, col2 = st.columns(2)
@@ -395,38 +952,68 @@ def screening_interface():
 
 
 
-        # download button for filtered data
+        # downloads of the filtered data
         if st.session_state.filters_applied and not current_data.empty:
-            csv = current_data.to_csv(index=False)
             st.markdown('<div class="heading-divider">', unsafe_allow_html=True)
-            indices_filename = '_'.join(st.session_state.selected_indices).replace(' ', '_')
-            st.download_button(
-                label=" Download as CSV",
-                type="primary",
-                data=csv,
-                file_name=f"screened_stocks_{indices_filename}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                mime="text/csv",
-                use_container_width=True
-            )
+            export_panel(current_rows)
 
         st.markdown('<div class="section-divider">', unsafe_allow_html=True)
 
         st.markdown("### Gap Distribution")
+        st.selectbox(
+            "Chart",
+            options=GAP_CHART_MODES,
+            format_func=GAP_CHART_MODE_LABELS.get,
+            help=f"Auto shows every stock up to {GAP_CHART_BAR_LIMIT} stocks, the biggest gaps up to "
+                 f"{GAP_CHART_TOP_LIMIT:,} and a histogram beyond",
+            key='gap_chart_mode'
+        )
         # show the gap chart
         chart_title = f"{data_type} Stocks"
-        gap_chart = create_gap_chart(current_data, chart_title)
-        if gap_chart:
-            st.plotly_chart(gap_chart, use_container_width=True)
+        with stage('gap_chart'):
+            gap_chart = create_gap_chart(current_data, chart_title, st.session_state.gap_chart_mode)
+            if gap_chart:
+                chart_mode = gap_chart_mode(len(current_data), st.session_state.gap_chart_mode)
+                if chart_mode != st.session_state.gap_chart_mode:
+                    st.caption(f"{len(current_data):,} stocks, shown as: {GAP_CHART_MODE_LABELS[chart_mode]}")
+                st.plotly_chart(gap_chart, use_container_width=True)
 
 
     st.markdown('<div class="section-divider">', unsafe_allow_html=True)
     # market anomalies
     st.markdown("### Market Anomalies")
-    anomalies = detect_anomalies(current_data)
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.selectbox(
+            "Baseline Statistics",
+            options=list(ANOMALY_METHOD_LABELS),
+            format_func=ANOMALY_METHOD_LABELS.get,
+            help="Median / MAD is not skewed by the few huge volume and price values",
+            key='anomaly_method'
+        )
+    with col2:
+        st.number_input("Threshold (Z)", min_value=0.5, step=0.5, format="%.1f", key='anomaly_threshold')
+    with col3:
+        st.number_input("Top N", min_value=1, max_value=100, step=1, key='anomaly_top_n')
+    with col4:
+        st.checkbox(
+            "Compare within sector",
+            help=f"Score each stock against its own sector (sectors under {MIN_SECTOR_SIZE} stocks use the whole market)",
+            key='anomaly_by_sector'
+        )
+
+    with stage('anomalies'):
+        anomalies = detect_anomalies(
+            current_data,
+            threshold=st.session_state.anomaly_threshold,
+            top_n=st.session_state.anomaly_top_n,
+            method=st.session_state.anomaly_method,
+            by_sector=st.session_state.anomaly_by_sector
+        )
     if anomalies is not None:
         col1, col2 = st.columns([3, 1])
         with col1:
-            anomaly_chart = create_anomaly_chart(anomalies)
+            anomaly_chart = create_anomaly_chart(anomalies, st.session_state.anomaly_threshold)
             if anomaly_chart:
                 st.plotly_chart(anomaly_chart, use_container_width=True)
         with col2:
@@ -436,26 +1023,71 @@ def screening_interface():
     else:
         st.info("No significant anomalies detected in current dataset")
     
+    # shared result cache, for tuning its ttls and memory cap
+    with st.expander("Shared Cache"):
+        cache_stats = get_shared_cache().stats()
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("Hit Rate", f"{cache_stats['hit_rate']:.0%}")
+        with col2:
+            st.metric("Hits / Misses", f"{cache_stats['hits']} / {cache_stats['misses']}")
+        with col3:
+            st.metric("Entries", f"{cache_stats['entries']}")
+        with col4:
+            st.metric("Loading", f"{cache_stats['loading']}")
+        st.caption(
+            f"{format_bytes(cache_stats['bytes'])} of {format_bytes(cache_stats['max_bytes'])} of loaded data reusable, "
+            f"{cache_stats['coalesced']} waits on a load in progress, {cache_stats['evictions']} evictions, "
+            f"{cache_stats['expirations']} expirations"
+        )
+    
+    # the datasets of every session in the data store, for tuning its memory budget
+    with st.expander("Memory"):
+        store_stats = get_data_store().stats()
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("In Memory", f"{format_bytes(store_stats['memory_bytes'])} of {format_bytes(store_stats['max_bytes'])}")
+        with col2:
+            st.metric("Spilled to Disk", format_bytes(store_stats['disk_bytes']))
+        with col3:
+            st.metric("Datasets / Sessions", f"{store_stats['datasets']} / {store_stats['sessions']}")
+        with col4:
+            st.metric("This Session", format_bytes(get_data_store().session_usage(session_id())['bytes']))
+        dataset_status = pd.DataFrame(get_data_store().status())
+        dataset_status['Size'] = dataset_status['Size'].map(format_bytes)
+        st.dataframe(dataset_status, use_container_width=True, hide_index=True)
+        st.caption(
+            f"{store_stats['shared']} loads shared an existing dataset, {store_stats['spills']} spills, "
+            f"{store_stats['reloads']} reloads, {store_stats['dropped']} idle datasets dropped"
+        )
+    
+    # universes the background refresh keeps hot (SCREENER_REFRESH plus the ones users load)
+    with st.expander("Background Refresh"):
+        refresh_status = get_refresh_scheduler().status()
+        if refresh_status:
+            st.dataframe(pd.DataFrame(refresh_status), use_container_width=True, hide_index=True)
+        else:
+            st.caption("No universes are being refreshed, set SCREENER_REFRESH (e.g. NASDAQ+NYSE:5d:15m) to keep some hot")
+    
+    if debug_enabled():
+        debug_panel()
+
     # handle the filter actions
     if run_screen:
         with st.spinner('Applying filters...'):
-            screened_df = screen_stocks(
-                st.session_state.summary_data, price_min, price_max, gap_pct_threshold, min_volume, min_avg_volume, min_atr, selected_sectors
-            )
-            st.session_state.filtered_data = screened_df
+            st.session_state.filtered_rows = screen_with_current_filters()
             st.session_state.filters_applied = True
             st.rerun()
-    
-    if reset_filters:
-        st.session_state.filtered_data = None
-        st.session_state.filters_applied = False
-        st.rerun()
 
 def main():
     if not st.session_state.data_loaded:
         configuration_screen()
     else:
-        screening_interface()
+        with record_load('render', log=False) as render:
+            try:
+                screening_interface()
+            finally:
+                st.session_state.last_render = render
     
     # footer
     st.markdown("---")
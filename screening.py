@@ -0,0 +1,128 @@
+import numpy as np
+import pandas as pd
+
+# summary column each filter works on, gap is screened on its absolute value
+RANGE_COLUMNS = {
+    'price': 'Price ($)',
+    'abs_gap_pct': 'Gap (%)',
+    'volume': 'Volume',
+    'avg_volume': 'Avg Volume',
+    'atr': 'ATR',
+}
+
+# sorted view already built for a summary column (gap is sorted by its signed value, apart from the filter)
+SORTED_NAMES = {column: name for name, column in RANGE_COLUMNS.items() if name != 'abs_gap_pct'}
+
+# one summary column sorted once: the values in ascending order, the row each sorted value came from and
+# how many of them are not NaN (NaN sorts last and never passes a filter)
+class SortedColumn:
+    def __init__(self, values):
+        values = np.asarray(values, dtype='float64')
+        self.values = values
+        self.order = np.argsort(values, kind='stable')
+        self.sorted_values = values[self.order]
+        self.valid = int(np.count_nonzero(~np.isnan(values)))
+
+    # start and end (in sorted order) of the rows with low <= value <= high
+    def bounds(self, low=None, high=None):
+        start = 0 if low is None else int(np.searchsorted(self.sorted_values[:self.valid], low, side='left'))
+        end = self.valid if high is None else int(np.searchsorted(self.sorted_values[:self.valid], high, side='right'))
+        return start, max(start, end)
+
+# built once per summary so each screen is a handful of binary searches and array intersections instead of
+# copying the frame and comparing every column. the summary itself is never copied, screen returns row positions
+class ScreeningIndex:
+    def __init__(self, summary):
+        self.summary = summary
+        self.columns = {
+            name: SortedColumn(summary[column].abs() if name == 'abs_gap_pct' else summary[column])
+            for name, column in RANGE_COLUMNS.items()
+        }
+
+        # one bitmap (boolean row mask) per sector
+        sector_codes, sectors = pd.factorize(summary['Sector'].astype(object))
+        self.sector_masks = {sector: sector_codes == code for code, sector in enumerate(sectors)}
+
+        # screens come out with the highest absolute gap first (ties in row order), rank_by_gap[row] is the
+        # row's place in that order
+        self.gap_order = np.argsort(-self.columns['abs_gap_pct'].values, kind='stable')
+        self.rank_by_gap = np.empty(len(summary), dtype=np.int64)
+        self.rank_by_gap[self.gap_order] = np.arange(len(summary))
+        self.sort_keys = {}
+
+    def __len__(self):
+        return len(self.summary)
+
+    # sorted view of any other numeric summary column (e.g. a registered metric), built on first use
+    def column(self, column):
+        if column not in self.columns:
+            self.columns[column] = SortedColumn(self.summary[column])
+        return self.columns[column]
+
+    # per row sort key of a column (its place in ascending order, NaN rows after every value) and how many rows
+    # have a value. numeric columns reuse the sorted view, text columns are ranked by their sorted categories
+    def sort_key(self, column):
+        if column not in self.sort_keys:
+            values = self.summary[column]
+            if pd.api.types.is_numeric_dtype(values):
+                sorted_column = self.column(SORTED_NAMES.get(column, column))
+                # equal values share the place of the first of them
+                valid = sorted_column.valid
+                key = np.searchsorted(sorted_column.sorted_values[:valid], sorted_column.values, side='left')
+                key[np.isnan(sorted_column.values)] = valid
+                self.sort_keys[column] = (key, valid)
+            else:
+                codes, categories = pd.factorize(values.astype(object), sort=True)
+                self.sort_keys[column] = (np.where(codes < 0, len(categories), codes), len(categories))
+        return self.sort_keys[column]
+
+    # rows (positions, e.g. a screen) ordered by a column, NaN last either way and ties kept in the given order
+    def order(self, rows, column, ascending=True):
+        key, valid = self.sort_key(column)
+        key = key[rows]
+        if not ascending:
+            key = np.where(key < valid, valid - 1 - key, key)
+        return rows[np.argsort(key, kind='stable')]
+
+    # positions of the rows that pass every filter, highest absolute gap first. metric_ranges adds
+    # {column: (low, high)} ranges on other summary columns, either end may be None
+    def screen(self, price_min, price_max, gap_pct_threshold, min_volume, min_avg_volume, min_atr,
+               selected_sectors=None, metric_ranges=None):
+        ranges = {
+            'price': (price_min, price_max),
+            'abs_gap_pct': (gap_pct_threshold, None),
+            'volume': (min_volume, None),
+            'avg_volume': (min_avg_volume, None),
+            'atr': (min_atr, None),
+            **(metric_ranges or {}),
+        }
+        bounds = {name: self.column(name).bounds(*limits) for name, limits in ranges.items()}
+
+        # start from the most selective range, the other ranges are then only checked for its rows
+        narrowest = min(bounds, key=lambda name: bounds[name][1] - bounds[name][0])
+        start, end = bounds[narrowest]
+        rows = self.columns[narrowest].order[start:end]
+
+        for name, (low, high) in ranges.items():
+            if name == narrowest or len(rows) == 0:
+                continue
+            values = self.columns[name].values[rows]
+            keep = ~np.isnan(values)
+            if low is not None:
+                keep &= values >= low
+            if high is not None:
+                keep &= values <= high
+            rows = rows[keep]
+
+        if selected_sectors:
+            sector_mask = np.zeros(len(self.summary), dtype=bool)
+            for sector in selected_sectors:
+                if sector in self.sector_masks:
+                    sector_mask |= self.sector_masks[sector]
+            rows = rows[sector_mask[rows]]
+
+        return rows[np.argsort(self.rank_by_gap[rows], kind='stable')]
+
+    # the screened rows as a frame (only those rows are copied)
+    def screen_frame(self, *args, **kwargs):
+        return self.summary.iloc[self.screen(*args, **kwargs)]
@@ -0,0 +1,154 @@
+import json
+import os
+import tempfile
+import threading
+import numpy as np
+import pandas as pd
+from analysis import DEFAULT_FILTERS
+from screening import RANGE_COLUMNS
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# the saved screens, {name: filters} in the screen_stocks argument names (missing ones as in DEFAULT_FILTERS,
+# metric_ranges as {column: [low, high]})
+SCREENS_FILE = os.environ.get('SCREENER_SCREENS_FILE', os.path.join(APP_DIR, 'screens.json'))
+
+# the screens to start from while nothing was saved
+DEFAULT_SCREENS = {
+    'Gap-up momentum': {
+        'gap_pct_threshold': 2.0, 'min_avg_volume': 500_000,
+        'metric_ranges': {'Gap (%)': [2.0, None], 'Rel Volume': [1.5, None]},
+    },
+    'Gap-down reversal': {
+        'gap_pct_threshold': 2.0, 'min_avg_volume': 500_000,
+        'metric_ranges': {'Gap (%)': [None, -2.0], 'RSI 14': [None, 35.0]},
+    },
+    'High-ATR small caps': {
+        'price_min': 1.0, 'price_max': 20.0, 'min_avg_volume': 200_000, 'metric_ranges': {'ATR 20': [0.5, None]},
+    },
+    'Liquid large caps': {'price_min': 50.0, 'price_max': 1000.0, 'min_avg_volume': 2_000_000},
+    'Oversold': {'min_avg_volume': 300_000, 'metric_ranges': {'RSI 14': [None, 30.0]}},
+    'Overbought': {'min_avg_volume': 300_000, 'metric_ranges': {'RSI 14': [70.0, None]}},
+    'Volume surge': {'min_volume': 1_000_000, 'metric_ranges': {'Rel Volume': [3.0, None]}},
+}
+
+# load-modify-save of the screens file, one session at a time so none loses another's change
+_screens_lock = threading.Lock()
+
+# the saved screens, the default ones when none were saved
+def load_screens(path=None):
+    path = path or SCREENS_FILE
+    try:
+        with open(path) as screens_file:
+            return json.load(screens_file)
+    except FileNotFoundError:
+        return {name: dict(filters) for name, filters in DEFAULT_SCREENS.items()}
+
+# writes to a unique temporary file that is then renamed, a reader never sees a half written file
+def save_screens(screens, path=None):
+    path = path or SCREENS_FILE
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as screens_file:
+            json.dump(screens, screens_file, indent=2)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+# adds (or replaces) one screen in the saved screens
+def save_screen(name, filters, path=None):
+    with _screens_lock:
+        screens = load_screens(path)
+        screens[name] = filters
+        save_screens(screens, path)
+        return screens
+
+def delete_screen(name, path=None):
+    with _screens_lock:
+        screens = load_screens(path)
+        screens.pop(name, None)
+        save_screens(screens, path)
+        return screens
+
+# the conditions a stock has to meet to pass a screen, the same ones ScreeningIndex.screen checks:
+# ('min', column, low), ('max', column, high), ('valid', column) for a range without bounds (the stock needs a
+# value) and ('sectors', sectors). column is a RANGE_COLUMNS name or a summary column
+def screen_predicates(filters):
+    filters = {**DEFAULT_FILTERS, **filters}
+    ranges = {
+        'price': (filters['price_min'], filters['price_max']),
+        'abs_gap_pct': (filters['gap_pct_threshold'], None),
+        'volume': (filters['min_volume'], None),
+        'avg_volume': (filters['min_avg_volume'], None),
+        'atr': (filters['min_atr'], None),
+        **{column: tuple(limits) for column, limits in (filters.get('metric_ranges') or {}).items()},
+    }
+    predicates = set()
+    for column, (low, high) in ranges.items():
+        if low is not None:
+            predicates.add(('min', column, float(low)))
+        if high is not None:
+            predicates.add(('max', column, float(high)))
+        if low is None and high is None:
+            predicates.add(('valid', column))
+    if filters.get('selected_sectors'):
+        predicates.add(('sectors', frozenset(filters['selected_sectors'])))
+    return predicates
+
+# summary columns a screen needs that the summary does not have
+def missing_columns(filters, summary):
+    return sorted({
+        predicate[1] for predicate in screen_predicates(filters)
+        if predicate[0] != 'sectors' and predicate[1] not in RANGE_COLUMNS and predicate[1] not in summary.columns
+    })
+
+# rows passing one predicate, as a packed bitmask (one bit per summary row)
+def predicate_bits(index, predicate):
+    if predicate[0] == 'sectors':
+        mask = np.zeros(len(index), dtype=bool)
+        for sector in predicate[1]:
+            if sector in index.sector_masks:
+                mask |= index.sector_masks[sector]
+        return np.packbits(mask)
+
+    values = index.column(predicate[1]).values
+    if predicate[0] == 'valid':
+        return np.packbits(~np.isnan(values))
+    # NaN fails either comparison
+    with np.errstate(invalid='ignore'):
+        return np.packbits(values >= predicate[2] if predicate[0] == 'min' else values <= predicate[2])
+
+# evaluates many screens in one pass over a ScreeningIndex and returns the ticker x screen membership matrix
+# (a bool frame indexed by ticker, one column per screen, rows in summary order). every distinct predicate is
+# computed once whatever number of screens use it, each screen is then the AND of its predicates' bitmasks.
+# the predicates are applied most shared first, so screens starting with the same predicates share those ANDs too
+def evaluate_screens(index, screens):
+    predicates = {name: screen_predicates(filters) for name, filters in screens.items()}
+    uses = {}
+    for predicate_set in predicates.values():
+        for predicate in predicate_set:
+            uses[predicate] = uses.get(predicate, 0) + 1
+    bits = {predicate: predicate_bits(index, predicate) for predicate in uses}
+
+    n_rows = len(index)
+    every_row = np.packbits(np.ones(n_rows, dtype=bool))
+    conjunctions = {(): every_row}
+    screen_bits = np.empty((len(screens), len(every_row)), dtype=np.uint8)
+    for j, name in enumerate(screens):
+        chain = sorted(predicates[name], key=lambda predicate: (-uses[predicate], repr(predicate)))
+        prefix = ()
+        for predicate in chain:
+            key = prefix + (predicate,)
+            if key not in conjunctions:
+                conjunctions[key] = conjunctions[prefix] & bits[predicate]
+            prefix = key
+        screen_bits[j] = conjunctions[prefix]
+
+    membership = np.unpackbits(screen_bits, axis=1, count=n_rows).T.astype(bool)
+    return pd.DataFrame(membership, index=pd.Index(index.summary['Ticker'], name='Ticker'), columns=list(screens))
+
+# positions of the rows of one screen in a membership matrix, highest absolute gap first like ScreeningIndex.screen
+def screen_rows(index, membership, name):
+    rows = np.flatnonzero(membership[name].to_numpy())
+    return rows[np.argsort(index.rank_by_gap[rows], kind='stable')]
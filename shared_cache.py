@@ -0,0 +1,143 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# how long a loaded result is served to other sessions, by bar interval: intraday results go stale with the
+# next bar, daily and longer ones only change a few times a day
+RESULT_TTL_SECONDS = {
+    '15m': 60,
+    '30m': 120,
+    '1h': 300,
+    '1d': 900,
+    '5d': 1800,
+    '1wk': 3600,
+    '1mo': 3600,
+    '3mo': 3600,
+}
+DEFAULT_TTL_SECONDS = 300
+
+# memory the shared results may take before the least recently used ones are evicted
+DEFAULT_MAX_MB = int(os.environ.get('SCREENER_SHARED_CACHE_MB', 512))
+
+class _Entry:
+    def __init__(self, value, nbytes, expires_at):
+        self.value = value
+        self.nbytes = nbytes
+        self.expires_at = expires_at
+
+# process wide cache of load results, shared by every streamlit session (they all run in this process). entries
+# expire after the ttl of their interval and the least recently used ones are evicted past max_bytes. concurrent
+# requests for the same key are single flighted: one session loads, the others wait for its result
+class SharedResultCache:
+    def __init__(self, max_bytes=DEFAULT_MAX_MB * 1024 * 1024, ttl_seconds=None, clock=time.monotonic):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds or RESULT_TTL_SECONDS
+        self.clock = clock
+
+        self._entries = OrderedDict()
+        self._in_flight = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'coalesced': 0, 'evictions': 0, 'expirations': 0}
+
+    # cached value for key or None, counts as a use for the LRU order
+    def get(self, key):
+        with self._lock:
+            return self._get(key)
+
+    def _get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= self.clock():
+            self._remove(key)
+            self._stats['expirations'] += 1
+            return None
+        self._entries.move_to_end(key)
+        return entry.value
+
+    def put(self, key, value, interval, nbytes):
+        with self._lock:
+            self._put(key, value, interval, nbytes)
+
+    def _put(self, key, value, interval, nbytes):
+        if key in self._entries:
+            self._remove(key)
+        if nbytes > self.max_bytes:
+            return
+        ttl = self.ttl_seconds.get(interval, DEFAULT_TTL_SECONDS)
+        self._entries[key] = _Entry(value, nbytes, self.clock() + ttl)
+        self._bytes += nbytes
+        while self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self._stats['evictions'] += 1
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry.nbytes
+
+    # the cached value for key, or load() run once for every caller asking for key at the same time. load runs
+    # in the calling thread (so it can draw its own progress), a None result is not cached and the callers that
+    # waited for it try again themselves. size_of(value) gives the bytes a value takes
+    def get_or_load(self, key, interval, load, size_of, on_wait=None):
+        while True:
+            with self._lock:
+                value = self._get(key)
+                if value is not None:
+                    self._stats['hits'] += 1
+                    return value
+                loading = self._in_flight.get(key)
+                if loading is None:
+                    loading = self._in_flight[key] = threading.Event()
+                    self._stats['misses'] += 1
+                    break
+                self._stats['coalesced'] += 1
+
+            # someone else is loading the same key, wait for them and check the cache again
+            if on_wait:
+                on_wait()
+            loading.wait()
+
+        try:
+            value = load()
+            if value is not None:
+                self.put(key, value, interval, size_of(value))
+            return value
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            loading.set()
+
+    def invalidate(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    # counters for tuning the ttls and the memory cap
+    def stats(self):
+        with self._lock:
+            lookups = self._stats['hits'] + self._stats['misses']
+            return {
+                **self._stats,
+                'hit_rate': self._stats['hits'] / lookups if lookups else 0.0,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'loading': len(self._in_flight),
+            }
+
+# cache key of a load, the order the indices were picked in does not matter
+def load_key(selected_indices, period, interval):
+    return (tuple(sorted(index_name.upper() for index_name in selected_indices)), period, interval)
+
+_shared_cache = SharedResultCache()
+
+def get_shared_cache():
+    return _shared_cache
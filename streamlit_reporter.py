@@ -0,0 +1,37 @@
+import streamlit as st
+from reporting import Reporter, Progress, ThrottledProgress
+
+# progress bar redraws per second, updates in between are coalesced
+PROGRESS_RATE = 10.0
+
+# shows the messages of the data and analysis layers in the current streamlit session
+class StreamlitReporter(Reporter):
+    def info(self, message):
+        st.info(message)
+
+    def success(self, message):
+        st.success(message)
+
+    def warning(self, message):
+        st.warning(message)
+
+    def error(self, message):
+        st.error(message)
+
+    def progress(self):
+        return ThrottledProgress(StreamlitProgress(), max_rate=PROGRESS_RATE)
+
+# progress bar with a status line under it, both removed on close
+class StreamlitProgress(Progress):
+    def __init__(self):
+        self.progress_bar = st.progress(0)
+        self.status_text = st.empty()
+
+    def update(self, fraction, text=None):
+        self.progress_bar.progress(min(max(fraction, 0.0), 1.0))
+        if text is not None:
+            self.status_text.text(text)
+
+    def close(self):
+        self.progress_bar.empty()
+        self.status_text.empty()
@@ -0,0 +1,38 @@
+import os
+import numpy as np
+import pytest
+from streamlit.testing.v1 import AppTest
+import data_store
+import ohlcv_cache
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'screener.py')
+
+# the app on generated bars, with its cache and spill files in a temporary directory
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.setenv('SCREENER_DATA_PROVIDER', 'synthetic')
+    monkeypatch.setenv('SCREENER_SCREENS_FILE', str(tmp_path / 'screens.json'))
+    monkeypatch.setenv('SCREENER_METRICS_FILE', '')
+    monkeypatch.setattr(ohlcv_cache, 'CACHE_DIR', str(tmp_path / 'ohlcv'))
+    monkeypatch.setattr(data_store.get_data_store(), 'spill_dir', str(tmp_path / 'spill'))
+    app = AppTest.from_file(APP, default_timeout=120).run()
+    app.button[0].click().run()
+    assert not app.exception
+    return app
+
+def results_table(app):
+    return next(table.value for table in app.dataframe if 'Gap (%)' in table.value.columns)
+
+# without a sort column every stock is listed highest absolute gap first, not in ticker order
+def test_all_stocks_page_in_gap_order(app):
+    assert app.session_state.filtered_rows is None
+    gaps = np.abs(results_table(app)['Gap (%)'].to_numpy())
+    assert len(gaps) > 1
+    assert (np.diff(gaps) <= 0).all()
+
+def test_screened_page_in_gap_order(app):
+    app.number_input(key='filter_price_min').set_value(50.0).run()
+    assert app.session_state.filters_applied
+    table = results_table(app)
+    assert (table['Price ($)'] >= 50.0).all()
+    assert (np.diff(np.abs(table['Gap (%)'].to_numpy())) <= 0).all()
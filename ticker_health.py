@@ -0,0 +1,107 @@
+import os
+import tempfile
+import threading
+import time
+import numpy as np
+import pandas as pd
+import ohlcv_cache
+
+# full period downloads in a row that came back without bars before a ticker is skipped (delisted, renamed or
+# not trading), and downloads in a row that still failed after their retries
+EMPTY_LIMIT = int(os.environ.get('SCREENER_EMPTY_LIMIT', 3))
+ERROR_LIMIT = 5
+
+# how long a skipped ticker stays skipped. it is then requested once more, each further strike doubles the time
+# up to the max
+NEGATIVE_CACHE_SECONDS = float(os.environ.get('SCREENER_NEGATIVE_CACHE_DAYS', 7)) * 86400
+MAX_NEGATIVE_CACHE_SECONDS = 30 * 86400
+
+HEALTH_COLUMNS = ['empty', 'errors', 'last_ok', 'last_checked', 'skip_until']
+
+# per ticker record of what its downloads returned, kept next to the OHLCV cache: consecutive empty results
+# (only full period downloads of loads where other tickers had bars count, a refresh that brings no new bars
+# is normal) and consecutive failures, when it last returned bars and until when it is skipped
+class TickerHealth:
+    def __init__(self, path, empty_limit=EMPTY_LIMIT, error_limit=ERROR_LIMIT,
+                 negative_seconds=NEGATIVE_CACHE_SECONDS, clock=time.time):
+        self.path = path
+        self.empty_limit = empty_limit
+        self.error_limit = error_limit
+        self.negative_seconds = negative_seconds
+        self.clock = clock
+        self._records = self._read()
+        self._changed = False
+        self._lock = threading.Lock()
+
+    def _read(self):
+        try:
+            frame = pd.read_parquet(self.path)
+        except (OSError, ValueError):
+            return {}
+        return {ticker: list(values) for ticker, values in zip(frame.index, frame[HEALTH_COLUMNS].to_numpy(dtype=object).tolist())}
+
+    # the tickers (of the given ones) that are in the negative cache now
+    def skipped(self, tickers):
+        now = self.clock()
+        with self._lock:
+            return [ticker for ticker in tickers if ticker in self._records and self._records[ticker][4] > now]
+
+    # notes the outcome of one download: returned tickers got bars, empty ones none (pass them only for full
+    # period downloads) and failed ones still failed after their retries
+    def record(self, returned=(), empty=(), failed=()):
+        now = self.clock()
+        with self._lock:
+            for ticker in returned:
+                self._records[ticker] = [0, 0, now, now, 0.0]
+            for ticker in empty:
+                self._strike(ticker, 0, now)
+            for ticker in failed:
+                self._strike(ticker, 1, now)
+            self._changed = True
+
+    def _strike(self, ticker, field, now):
+        record = self._records.setdefault(ticker, [0, 0, np.nan, now, 0.0])
+        record[field] += 1
+        record[3] = now
+        limit = self.empty_limit if field == 0 else self.error_limit
+        if record[field] >= limit:
+            strikes = record[field] - limit
+            record[4] = now + min(self.negative_seconds * 2 ** strikes, MAX_NEGATIVE_CACHE_SECONDS)
+
+    # the records as a frame (indexed by ticker), for inspection and the benchmarks
+    def frame(self):
+        with self._lock:
+            return self._frame()
+
+    def _frame(self):
+        frame = pd.DataFrame.from_dict(self._records, orient='index', columns=HEALTH_COLUMNS).rename_axis('Ticker')
+        return frame.astype({'empty': 'int64', 'errors': 'int64', 'last_ok': 'float64', 'last_checked': 'float64',
+                             'skip_until': 'float64'})
+
+    # writes the records when they changed since the last save, under the lock so loads finishing together
+    # save one after the other. the temporary file is unique too, for other processes using the same cache
+    def save(self):
+        with self._lock:
+            if not self._changed:
+                return
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(self.path), suffix='.tmp')
+            os.close(fd)
+            try:
+                self._frame().to_parquet(temp_path)
+                os.replace(temp_path, self.path)
+            except BaseException:
+                os.remove(temp_path)
+                raise
+            self._changed = False
+
+_health = {}
+_health_lock = threading.Lock()
+
+# the ticker health of the OHLCV cache directory in use (read from disk on first use)
+def get_ticker_health():
+    path = os.path.join(ohlcv_cache.CACHE_DIR, 'ticker_health.parquet')
+    with _health_lock:
+        if path not in _health:
+            _health[path] = TickerHealth(path)
+        return _health[path]
@@ -0,0 +1,151 @@
+import os
+import threading
+import numpy as np
+import pandas as pd
+
+UNIVERSE_CACHE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'universe.npz')
+
+# compiled view of the ticker CSV files: every symbol gets an integer id (its position in the arrays), company
+# names and sector codes are arrays indexed by id, and index membership is a bitset per symbol (bit i set when
+# the symbol is listed in the i-th index). unions of indices and sector lookups are then array operations
+class UniverseIndex:
+    def __init__(self, index_names, symbols, company_names, sector_codes, sectors, membership):
+        self.index_names = list(index_names)    # [index name], bit i of membership is index_names[i]
+        self.symbols = symbols                  # symbol of every id (object array)
+        self.company_names = company_names      # company name of every id (object array)
+        self.sector_codes = sector_codes        # code into sectors of every id (int16)
+        self.sectors = list(sectors)            # sector table, code 0 is 'N/A'
+        self.membership = membership            # index bitset of every id (uint8)
+        self.symbol_ids = {symbol: symbol_id for symbol_id, symbol in enumerate(symbols)}
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def index_bits(self, index_names):
+        bits = 0
+        for index_name in index_names:
+            bits |= 1 << self.index_names.index(index_name.upper())
+        return bits
+
+    # ids of the symbols listed in any of the indices, in id order (so duplicates are already gone)
+    def ids(self, index_names):
+        return np.flatnonzero(self.membership & self.index_bits(index_names))
+
+    def tickers(self, index_names):
+        return self.symbols[self.ids(index_names)].tolist()
+
+    # ids of the given symbols, -1 for symbols that are not in any index
+    def ids_of(self, tickers):
+        return np.array([self.symbol_ids.get(ticker, -1) for ticker in tickers], dtype=np.int64)
+
+    # company info lookup table for the given ids, same layout as create_company_info_table
+    def company_info(self, ids):
+        return pd.DataFrame(
+            {
+                'Company Name': self.company_names[ids],
+                'Sector': pd.Categorical.from_codes(self.sector_codes[ids], categories=self.sectors),
+            },
+            index=pd.Index(self.symbols[ids], name='Ticker', dtype='object'),
+        )
+
+    # {ticker: {'Company Name', 'Sector'}} for the given ids, the shape load_index_tickers used to build
+    def info_dict(self, ids):
+        names = self.company_names[ids].tolist()
+        sectors = np.asarray(self.sectors, dtype=object)[self.sector_codes[ids]].tolist()
+        return {
+            symbol: {'Company Name': name, 'Sector': sector}
+            for symbol, name, sector in zip(self.symbols[ids].tolist(), names, sectors)
+        }
+
+    def save(self, path, fingerprint):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.tmp.npz"
+        np.savez(
+            temp_path,
+            index_names=np.array(self.index_names, dtype=str),
+            symbols=self.symbols.astype(str),
+            company_names=self.company_names.astype(str),
+            sector_codes=self.sector_codes,
+            sectors=np.array(self.sectors, dtype=str),
+            membership=self.membership,
+            fingerprint=np.array(fingerprint, dtype=str),
+        )
+        os.replace(temp_path, path)
+
+    # the saved index, or None when it is missing, unreadable or was built from other files than fingerprint
+    @classmethod
+    def load(cls, path, fingerprint):
+        try:
+            with np.load(path) as saved:
+                if saved['fingerprint'].tolist() != fingerprint:
+                    return None
+                return cls(
+                    saved['index_names'].tolist(),
+                    saved['symbols'].astype(object),
+                    saved['company_names'].astype(object),
+                    saved['sector_codes'],
+                    saved['sectors'].tolist(),
+                    saved['membership'],
+                )
+        except Exception:
+            return None
+
+# compiles the index from {index name: csv path} (Symbol, Company Name and Sector columns). symbols get ids in
+# order of first appearance, a symbol listed by several indices keeps the company info of the first one
+def build_universe(index_files):
+    frames = []
+    for bit, (index_name, file_path) in enumerate(index_files.items()):
+        listing = pd.read_csv(file_path, usecols=['Symbol', 'Company Name', 'Sector'], dtype=str)
+        listing = listing[listing['Symbol'].notna()]
+        frames.append(listing.assign(bits=np.uint8(1 << bit)))
+    listings = pd.concat(frames, ignore_index=True)
+
+    symbol_ids, symbols = pd.factorize(listings['Symbol'])
+    membership = np.zeros(len(symbols), dtype=np.uint8)
+    np.bitwise_or.at(membership, symbol_ids, listings['bits'].to_numpy(dtype=np.uint8))
+
+    first = listings.drop_duplicates('Symbol')
+    sector_ids, sectors = pd.factorize(first['Sector'])
+    return UniverseIndex(
+        [index_name.upper() for index_name in index_files],
+        np.asarray(symbols, dtype=object),
+        first['Company Name'].fillna('N/A').to_numpy(dtype=object),
+        (sector_ids + 1).astype(np.int16),    # missing sectors factorize to -1, i.e. 'N/A'
+        ['N/A'] + list(sectors),
+        membership,
+    )
+
+# size and modification time of every file, the saved index is rebuilt when any of them changes
+def files_fingerprint(index_files):
+    fingerprint = []
+    for index_name, file_path in index_files.items():
+        stat = os.stat(file_path)
+        fingerprint.append(f"{index_name}:{os.path.abspath(file_path)}:{stat.st_size}:{stat.st_mtime_ns}")
+    return fingerprint
+
+_universe = None
+_universe_fingerprint = None
+_lock = threading.Lock()
+
+# the compiled universe for the index files, kept in memory and saved to cache_path. it is only rebuilt
+# (and saved again) when one of the csv files changed since it was compiled
+def load_universe(index_files, cache_path=None):
+    global _universe, _universe_fingerprint
+    cache_path = cache_path or UNIVERSE_CACHE
+    fingerprint = files_fingerprint(index_files)
+
+    with _lock:
+        if _universe is not None and _universe_fingerprint == fingerprint:
+            return _universe
+
+        universe = UniverseIndex.load(cache_path, fingerprint)
+        if universe is None:
+            universe = build_universe(index_files)
+            try:
+                universe.save(cache_path, fingerprint)
+            except OSError:
+                pass
+
+        _universe = universe
+        _universe_fingerprint = fingerprint
+        return universe
@@ -1,17 +1,107 @@
 import pandas as pd
 import numpy as np
 
+PRICE_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Adj Close']
+
+PERIOD_MINUTES = {
+    '1d': 1440,    
+    '3d': 4320,    
+    '5d': 7200,    
+    '1wk': 10080,  
+    '2wk': 20160,  
+    '1mo': 43200,  
+    '2mo': 86400,  
+    '3mo': 129600  
+}
+
+PERIOD_DAYS = {period: minutes // 1440 for period, minutes in PERIOD_MINUTES.items()}
+
+INTERVAL_MINUTES = {
+    '15m': 15,
+    '30m': 30,
+    '1h': 60,
+    '1d': 1440,
+    '5d': 7200,
+    '1wk': 10080,
+    '1mo': 43200,
+    '3mo': 129600
+}
+
 # batch generator used for splitting the tickers into batches
 def get_batches(tickers, batch_size=500):
     for i in range(0, len(tickers), batch_size):
         yield tickers[i:i + batch_size]
 
-# average true range calculation 
-def calculate_atr(data, period=14):
+# shrinks the combined OHLCV frame: ticker as a categorical, float32 prices when that loses nothing
+# (yahoo serves prices with float32 precision, so the raw OHLC columns normally qualify) and the
+# smallest unsigned integer type for volume
+def compact_ohlcv(df):
+    df = df.copy()
+    df['Ticker'] = df['Ticker'].astype('category')
+
+    for column in PRICE_COLUMNS:
+        if column not in df.columns or df[column].dtype != 'float64':
+            continue
+        as_float32 = df[column].astype('float32')
+        if np.array_equal(as_float32.to_numpy(dtype='float64'), df[column].to_numpy(), equal_nan=True):
+            df[column] = as_float32
+
+    if 'Volume' in df.columns:
+        volume = df['Volume']
+        if volume.notna().all() and (volume >= 0).all() and (volume % 1 == 0).all():
+            df['Volume'] = pd.to_numeric(volume.astype('int64'), downcast='unsigned')
+
+    return df
+
+# company name and sector lookup (one row per ticker), joined onto the summary instead of being stored on every bar
+def create_company_info_table(company_info_dict):
+    company_info = pd.DataFrame(
+        [(info.get('Company Name', 'N/A'), info.get('Sector', 'N/A')) for info in company_info_dict.values()],
+        index=pd.Index(list(company_info_dict.keys()), dtype='object'),
+        columns=['Company Name', 'Sector'],
+    )
+    company_info.index.name = 'Ticker'
+    company_info['Sector'] = company_info['Sector'].astype('category')
+    return company_info
+
+# total memory used by a frame in bytes (including the python strings held in object columns)
+def memory_footprint(df):
+    if df is None:
+        return 0
+    return int(df.memory_usage(deep=True).sum())
+
+# formats a byte count for display, e.g. 1536 -> '1.5 KB'
+def format_bytes(num_bytes):
+    for unit in ['B', 'KB', 'MB']:
+        if num_bytes < 1024:
+            return f"{num_bytes:.1f} {unit}"
+        num_bytes /= 1024
+    return f"{num_bytes:.1f} GB"
+
+# human readable age, e.g. 45s, 12m, 3h 5m
+def format_age(seconds):
+    seconds = max(0, int(seconds))
+    if seconds < 60:
+        return f"{seconds}s"
+    if seconds < 3600:
+        return f"{seconds // 60}m"
+    return f"{seconds // 3600}h {seconds % 3600 // 60}m"
+
+# true range of every bar, prev_close can be passed in when the data holds more than one ticker
+# (first bar of a ticker has no previous close so it falls back to high - low, same as before)
+def calculate_true_range(data, prev_close=None):
+    if prev_close is None:
+        prev_close = data['Close'].shift()
     high_low = data['High'] - data['Low']
-    high_close = np.abs(data['High'] - data['Close'].shift())
-    low_close = np.abs(data['Low'] - data['Close'].shift())
-    tr = pd.concat([high_low, high_close, low_close], axis=1).max(axis=1)
+    high_close = np.abs(data['High'] - prev_close)
+    low_close = np.abs(data['Low'] - prev_close)
+    return np.fmax(high_low, np.fmax(high_close, low_close))
+
+# average true range calculation, for a PricePanel (see panel.py) it is computed for every ticker at once
+def calculate_atr(data, period=14):
+    if not isinstance(data, pd.DataFrame):
+        return data.rolling_mean(data.true_range(), period)
+    tr = calculate_true_range(data)
     atr = tr.rolling(window=period).mean()
     return atr
 
@@ -28,33 +118,37 @@ def apply_gap_styling(df):
 
 # validates the period and interval input provided in the intial configuration screen
 def validate_period_interval(period, interval):
-    period_minutes = {
-        '1d': 1440,    
-        '3d': 4320,    
-        '5d': 7200,    
-        '1wk': 10080,  
-        '2wk': 20160,  
-        '1mo': 43200,  
-        '2mo': 86400,  
-        '3mo': 129600  
-    }
-    
-    interval_minutes = {
-
-        '15m': 15,
-        '30m': 30,
-        '1h': 60,
-        '1d': 1440,
-        '5d': 7200,
-        '1wk': 10080,
-        '1mo': 43200,
-        '3mo': 129600
-    }
-    
-    period_val = period_minutes.get(period, 0)
-    interval_val = interval_minutes.get(interval, 0)
+    period_val = PERIOD_MINUTES.get(period, 0)
+    interval_val = INTERVAL_MINUTES.get(interval, 0)
     
     if interval_val > period_val:
         return False, f"Interval ({interval}) cannot be greater than period ({period})"
     
     return True, ""
+
+# calendar offset covered by a period, e.g. '2wk' -> 2 weeks, '3mo' -> 3 months
+def period_offset(period):
+    count = int(''.join(char for char in period if char.isdigit()))
+    if period.endswith('mo'):
+        return pd.DateOffset(months=count)
+    if period.endswith('wk'):
+        return pd.DateOffset(weeks=count)
+    return pd.DateOffset(days=count)
+
+# converts bar timestamps to naive UTC so bars from different exchanges / downloads line up
+def to_naive_utc(timestamps):
+    timestamps = pd.to_datetime(timestamps)
+    if timestamps.dt.tz is not None:
+        timestamps = timestamps.dt.tz_convert('UTC').dt.tz_localize(None)
+    return timestamps
+
+# keeps only the bars that fall in the requested period, counted back from now. day periods count
+# trading days like yahoo does ('5d' is the last 5 sessions of each ticker), longer ones are calendar based
+def trim_to_period(bars, period, now):
+    if bars.empty:
+        return bars
+    if period.endswith('d'):
+        days = bars['Date'].dt.normalize()
+        session_rank = days.groupby(bars['Ticker'], observed=True).rank(method='dense', ascending=False)
+        return bars[session_rank <= PERIOD_DAYS[period]]
+    return bars[bars['Date'] >= now - period_offset(period)]
@@ -1,10 +1,54 @@
+import numpy as np
 import plotly.graph_objects as go
 
-# creates a chart for showcasing the positive and negative gaps  
-def create_gap_chart(df, title="Gap Distribution"):
+# how the gap chart is drawn: one bar per stock up to GAP_CHART_BAR_LIMIT stocks, the GAP_CHART_TOP_N biggest gaps
+# each way plus one averaged bar for the rest up to GAP_CHART_TOP_LIMIT, a histogram beyond. the figure sent to
+# the browser then stays under a hundred bars however many stocks are shown. 'webgl' draws every stock as a point
+# of the sorted gap curve instead (its size grows with the stocks, WebGL keeps the page responsive)
+GAP_CHART_MODES = ['auto', 'bars', 'top', 'histogram', 'webgl']
+GAP_CHART_BAR_LIMIT = 150
+GAP_CHART_TOP_LIMIT = 2000
+GAP_CHART_TOP_N = 25
+GAP_HISTOGRAM_BINS = 60
+
+GAP_UP_COLOR = '#2a9d8f'
+GAP_DOWN_COLOR = '#e74c3c'
+REST_COLOR = '#95a5a6'
+
+# the mode 'auto' picks for a number of stocks, any other mode is kept
+def gap_chart_mode(row_count, mode='auto'):
+    if mode != 'auto':
+        return mode
+    if row_count <= GAP_CHART_BAR_LIMIT:
+        return 'bars'
+    if row_count <= GAP_CHART_TOP_LIMIT:
+        return 'top'
+    return 'histogram'
+
+# creates a chart for showcasing the positive and negative gaps (see GAP_CHART_MODES for how)
+def create_gap_chart(df, title="Gap Distribution", mode='auto', top_n=GAP_CHART_TOP_N):
     if df.empty:
         return None
-        
+
+    mode = gap_chart_mode(len(df), mode)
+    if mode == 'top':
+        fig = _top_gaps_chart(df, top_n)
+    elif mode == 'histogram':
+        fig = _gap_histogram(df)
+    elif mode == 'webgl':
+        fig = _gap_curve(df)
+    else:
+        fig = _gap_bars(df)
+
+    fig.update_layout(
+        title=title,
+        height=400,
+        showlegend=True
+    )
+    return fig
+
+# one bar per stock
+def _gap_bars(df):
     fig = go.Figure()
     
     positive_gaps = df[df['Gap (%)'] > 0]
@@ -15,7 +59,7 @@ def create_gap_chart(df, title="Gap Distribution"):
             x=positive_gaps['Ticker'],
             y=positive_gaps['Gap (%)'],
             name='Gap Up',
-            marker_color='#2a9d8f',
+            marker_color=GAP_UP_COLOR,
             hovertemplate='<b>%{x}</b><br>Gap: %{y:.2f}%<extra></extra>'
         ))
     
@@ -24,19 +68,133 @@ def create_gap_chart(df, title="Gap Distribution"):
             x=negative_gaps['Ticker'],
             y=negative_gaps['Gap (%)'],
             name='Gap Down',
-            marker_color='#e74c3c',
+            marker_color=GAP_DOWN_COLOR,
             hovertemplate='<b>%{x}</b><br>Gap: %{y:.2f}%<extra></extra>'
         ))
     
     fig.update_layout(
-        title=title,
         xaxis_title='Ticker',
         yaxis_title='Gap (%)',
-        hovermode='x unified',
-        height=400,
-        showlegend=True
+        hovermode='x unified'
+    )
+    return fig
+
+# the top_n biggest gaps up and down as bars, the other stocks of each side as one bar at their average gap
+def _top_gaps_chart(df, top_n):
+    fig = go.Figure()
+    positive_gaps = df[df['Gap (%)'] > 0]
+    negative_gaps = df[df['Gap (%)'] < 0]
+    top_up = positive_gaps.nlargest(top_n, 'Gap (%)')
+    top_down = negative_gaps.nsmallest(top_n, 'Gap (%)')
+    categories = list(top_up['Ticker'])
+
+    if not top_up.empty:
+        fig.add_trace(go.Bar(
+            x=top_up['Ticker'],
+            y=top_up['Gap (%)'],
+            name='Gap Up',
+            marker_color=GAP_UP_COLOR,
+            hovertemplate='<b>%{x}</b><br>Gap: %{y:.2f}%<extra></extra>'
+        ))
+
+    # the rest of each side, averaged
+    rest_x, rest_y, rest_counts = [], [], []
+    for side, top in [(positive_gaps, top_up), (negative_gaps, top_down)]:
+        rest = side['Gap (%)'].drop(top.index)
+        if not rest.empty:
+            label = f"Other {len(rest)} {'up' if rest.iloc[0] > 0 else 'down'}"
+            rest_x.append(label)
+            rest_y.append(rest.mean())
+            rest_counts.append(len(rest))
+            categories.append(label)
+    if rest_x:
+        fig.add_trace(go.Bar(
+            x=rest_x,
+            y=rest_y,
+            customdata=rest_counts,
+            name='Rest (average)',
+            marker_color=REST_COLOR,
+            hovertemplate='<b>%{x}</b><br>%{customdata} stocks, average gap: %{y:.2f}%<extra></extra>'
+        ))
+
+    if not top_down.empty:
+        fig.add_trace(go.Bar(
+            x=top_down['Ticker'][::-1],
+            y=top_down['Gap (%)'][::-1],
+            name='Gap Down',
+            marker_color=GAP_DOWN_COLOR,
+            hovertemplate='<b>%{x}</b><br>Gap: %{y:.2f}%<extra></extra>'
+        ))
+    categories += list(top_down['Ticker'][::-1])
+
+    fig.update_layout(
+        xaxis_title='Ticker',
+        yaxis_title='Gap (%)',
+        hovermode='x unified'
+    )
+    fig.update_xaxes(categoryorder='array', categoryarray=categories)
+    return fig
+
+# how many stocks gapped by how much, binned here so only the bin counts are sent. bins are cut at 0 and span the
+# 1st to 99th percentile, the stocks beyond go into the outermost bins. stocks without a gap are left out like
+# in the other modes
+def _gap_histogram(df, bins=GAP_HISTOGRAM_BINS):
+    gaps = df['Gap (%)'].to_numpy(dtype='float64')
+    gaps = gaps[np.isfinite(gaps) & (gaps != 0)]
+    fig = go.Figure()
+    if len(gaps) == 0:
+        return fig
+
+    low, high = np.percentile(gaps, [1, 99])
+    low, high = min(low, 0.0), max(high, 0.0)
+    width = (high - low) / bins or 1.0
+    edges = np.arange(np.floor(low / width), np.ceil(high / width) + 1) * width
+    counts, _ = np.histogram(np.clip(gaps, edges[0], edges[-1]), bins=edges)
+    centers = (edges[:-1] + edges[1:]) / 2
+    ranges = np.column_stack([edges[:-1], edges[1:]])
+
+    for name, side, color in [('Gap Up', centers > 0, GAP_UP_COLOR), ('Gap Down', centers < 0, GAP_DOWN_COLOR)]:
+        keep = side & (counts > 0)
+        if keep.any():
+            fig.add_trace(go.Bar(
+                x=centers[keep],
+                y=counts[keep],
+                width=width,
+                customdata=ranges[keep],
+                name=name,
+                marker_color=color,
+                hovertemplate='%{customdata[0]:.2f}% to %{customdata[1]:.2f}%<br>%{y} stocks<extra></extra>'
+            ))
+
+    fig.update_layout(
+        xaxis_title='Gap (%)',
+        yaxis_title='Stocks',
+        bargap=0.05
+    )
+    return fig
+
+# every stock as a point of the gap curve (sorted from the biggest gap up to the biggest gap down), WebGL drawn
+def _gap_curve(df):
+    ordered = df[df['Gap (%)'] != 0].sort_values('Gap (%)', ascending=False)
+    rank = np.arange(len(ordered))
+    is_up = (ordered['Gap (%)'] > 0).to_numpy()
+    fig = go.Figure()
+    for name, side, color in [('Gap Up', is_up, GAP_UP_COLOR), ('Gap Down', ~is_up, GAP_DOWN_COLOR)]:
+        if side.any():
+            fig.add_trace(go.Scattergl(
+                x=rank[side],
+                y=ordered['Gap (%)'].to_numpy()[side],
+                text=ordered['Ticker'].to_numpy()[side],
+                mode='markers',
+                marker=dict(color=color, size=4),
+                name=name,
+                hovertemplate='<b>%{text}</b><br>Gap: %{y:.2f}%<extra></extra>'
+            ))
+    fig.update_layout(
+        xaxis_title='Stocks (by gap)',
+        yaxis_title='Gap (%)',
+        hovermode='closest'
     )
-    
     return fig
 
 # creates the tables for the top movers (highest gainers and highest losers)
@@ -61,7 +219,7 @@ def create_top_movers_tables(df):
     return gainers_display, losers_display
 
 # creates a chart to showcase the anomalies 
-def create_anomaly_chart(anomaly_df):
+def create_anomaly_chart(anomaly_df, threshold=2.5):
     if anomaly_df is None or anomaly_df.empty:
         return None
     
@@ -85,7 +243,7 @@ def create_anomaly_chart(anomaly_df):
                          '<extra></extra>'
         ))
     
-    fig.add_hline(y=2.5, line_dash="dash", line_color="red", annotation_text="Anomaly Threshold")
+    fig.add_hline(y=threshold, line_dash="dash", line_color="red", annotation_text="Anomaly Threshold")
     
     fig.update_layout(
         xaxis_title='Ticker',